@@ -1,23 +1,84 @@
+import json
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import Optional
 from prompts.planner import SYSTEM_PROMPT
+from planner_cache import PlannerCache
+from tracing import span
 
-load_dotenv()
+def extract_json_plan(response: str) -> str:
+    """Pull the JSON plan out of a model response that may wrap it in markdown fences or prose"""
+    json_plan = response
+    if "```json" in json_plan:
+        json_start = json_plan.find("```json") + 7
+        json_end = json_plan.find("```", json_start)
+        json_plan = json_plan[json_start:json_end].strip()
+    elif "```" in json_plan:
+        json_start = json_plan.find("```") + 3
+        json_end = json_plan.find("```", json_start)
+        if json_end == -1:
+            json_end = len(json_plan)
+        json_plan = json_plan[json_start:json_end].strip()
+    
+    if not json_plan.startswith('{'):
+        start_idx = json_plan.find('{')
+        if start_idx != -1:
+            json_plan = json_plan[start_idx:]
+    return json_plan
 
 class Agent:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, client=None, cache: Optional[PlannerCache] = None):
+        # Any object with the OpenAI chat.completions.create interface works, e.g. a stub for offline tests
+        self._client = client
+        self.cache = cache
+    
+    @property
+    def client(self):
+        """The OpenAI client, created on first use: importing openai costs more than the rest of startup"""
+        if self._client is None:
+            from dotenv import load_dotenv
+            from openai import OpenAI
+            load_dotenv()
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
     
     def process_message(self, message: str) -> str:
-        response = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": message}
-            ]
-        )
-        return response.choices[0].message.content
+        with span('plan') as stage:
+            if self.cache is not None:
+                cached = self.cache.get(message)
+                stage.set(cache_hit=cached is not None)
+                if cached is not None:
+                    return cached
+            
+            with span('plan:llm', model="gpt-4o") as call:
+                response = self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": message}
+                    ]
+                )
+                usage = getattr(response, 'usage', None)
+                if usage is not None:
+                    call.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            content = response.choices[0].message.content
+            
+            # Only responses that parse are cached; a bad one would otherwise be handed back on every retry
+            if self.cache is not None and self._parses(content):
+                self.cache.put(message, content)
+            return content
+    
+    @staticmethod
+    def _parses(content: str) -> bool:
+        try:
+            json.loads(extract_json_plan(content))
+        except (TypeError, ValueError):
+            return False
+        return True
+    
+    def forget(self, message: str):
+        """Drop a cached plan, e.g. when it turned out not to be valid JSON"""
+        if self.cache is not None:
+            self.cache.forget(message)
 
 if __name__ == "__main__":
     agent = Agent()
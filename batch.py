@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+
+class StubPlanner:
+    """Offline stand-in for Agent: answers with the plan given alongside each query in the batch file"""
+
+    DEFAULT_PLAN = {
+        "query_type": "hcp",
+        "filters": {},
+        "claims_filters": None,
+        "projection": ["npi", "name", "specialties", "states", "num_publications"],
+        "order_by": ["num_publications DESC"],
+        "limit": 20,
+        "plan_notes": "Stub plan",
+    }
+
+    def __init__(self, plans: Optional[Dict[str, Dict[str, Any]]] = None, latency: float = 0.0):
+        self.plans = plans or {}
+        self.latency = latency
+
+    def process_message(self, message: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return json.dumps(self.plans.get(message, self.DEFAULT_PLAN))
+
+
+class ResultWriter:
+    """Appends one record per query to JSONL, or to Parquet in row groups as results arrive"""
+
+    def __init__(self, path: str, parquet_batch: int = 256):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.parquet_batch = parquet_batch
+        self._pending: List[Dict[str, Any]] = []
+        self._parquet_writer = None
+        self._file = None if self.parquet else open(path, 'w')
+
+    def write(self, record: Dict[str, Any]):
+        if not self.parquet:
+            self._file.write(json.dumps(record, default=str) + '\n')
+            self._file.flush()
+            return
+        self._pending.append(record)
+        if len(self._pending) >= self.parquet_batch:
+            self._flush_parquet()
+
+    def _flush_parquet(self):
+        if not self._pending:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {
+            'index': [r['index'] for r in self._pending],
+            'query': [r['query'] for r in self._pending],
+            'plan': [json.dumps(r['plan']) if r['plan'] is not None else None for r in self._pending],
+            'row_count': [r['row_count'] for r in self._pending],
+            'rows': [json.dumps(r['rows'], default=str) for r in self._pending],
+            'error': [r['error'] for r in self._pending],
+            'attempts': [r['attempts'] for r in self._pending],
+            'plan_seconds': [r['plan_seconds'] for r in self._pending],
+            'execute_seconds': [r['execute_seconds'] for r in self._pending],
+            'trace': [json.dumps(r['trace']) if r.get('trace') is not None else None for r in self._pending],
+        }
+        table = pa.table(columns, schema=pa.schema([
+            ('index', pa.int64()), ('query', pa.string()), ('plan', pa.string()),
+            ('row_count', pa.int64()), ('rows', pa.string()), ('error', pa.string()),
+            ('attempts', pa.int64()), ('plan_seconds', pa.float64()), ('execute_seconds', pa.float64()),
+            ('trace', pa.string()),
+        ]))
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table)
+        self._pending = []
+
+    def close(self):
+        if self.parquet:
+            self._flush_parquet()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+        else:
+            self._file.close()
+
+
+async def run_batch(queries: List[str], planner, executor, writer: ResultWriter,
+                    concurrency: int = 8, workers: int = 4, retries: int = 3,
+                    backoff: float = 0.5, max_rows: int = 100, trace_path: Optional[str] = None) -> Dict[str, Any]:
+    """Plan every query concurrently and execute each plan as soon as it arrives.
+
+    Planner calls run on `concurrency` threads, retried with jittered exponential backoff.
+    Plan execution runs on a separate pool of `workers` threads, so plans that are ready
+    execute while others are still being generated. Records are written as they complete.
+    Each record carries its query's trace; summary['stages'] aggregates them per stage,
+    and `trace_path` receives all of them as one Chrome trace.
+    """
+    from agent import extract_json_plan
+    from tracing import Trace, chrome_trace, summarize
+
+    loop = asyncio.get_running_loop()
+    planner_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='planner')
+    execute_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='execute')
+    semaphore = asyncio.Semaphore(concurrency)
+    summary = {'queries': len(queries), 'succeeded': 0, 'failed': 0, 'retries': 0}
+    traces = [Trace(query) for query in queries]
+
+    async def plan_query(query: str, trace: Trace):
+        for attempt in range(1, retries + 2):
+            try:
+                async with semaphore:
+                    response = await loop.run_in_executor(planner_pool, trace.run, planner.process_message, query)
+                try:
+                    return json.loads(extract_json_plan(response)), attempt
+                except json.JSONDecodeError:
+                    # Retry with a fresh answer rather than the same text from the planner cache
+                    if hasattr(planner, 'forget'):
+                        planner.forget(query)
+                    raise
+            except Exception:
+                if attempt > retries:
+                    raise
+                summary['retries'] += 1
+                await asyncio.sleep(backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    async def handle(index: int, query: str):
+        record = {'index': index, 'query': query, 'plan': None, 'row_count': None, 'rows': [],
+                  'error': None, 'attempts': 0, 'plan_seconds': None, 'execute_seconds': None, 'trace': None}
+        trace = traces[index]
+        try:
+            started = time.perf_counter()
+            plan, record['attempts'] = await plan_query(query, trace)
+            record['plan'] = plan
+            record['plan_seconds'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            result_df = await loop.run_in_executor(execute_pool, trace.run, executor.execute_plan, plan)
+            record['execute_seconds'] = time.perf_counter() - started
+            record['row_count'] = len(result_df)
+            record['rows'] = result_df.head(max_rows).to_dict(orient='records')
+            summary['succeeded'] += 1
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            summary['failed'] += 1
+        record['trace'] = trace.to_dict()
+        writer.write(record)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(handle(i, q) for i, q in enumerate(queries)))
+    finally:
+        planner_pool.shutdown()
+        execute_pool.shutdown()
+    summary['seconds'] = time.perf_counter() - started
+    summary['queries_per_second'] = len(queries) / summary['seconds'] if summary['seconds'] else 0.0
+    summary['stages'] = summarize(traces)
+    if trace_path:
+        chrome_trace(traces, trace_path)
+    return summary
+
+
+def load_queries(path: str):
+    """Read a JSONL batch: each line is a JSON string or an object with "query" (and optionally "plan")"""
+    queries, plans = [], {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                queries.append(item)
+                continue
+            queries.append(item['query'])
+            if item.get('plan'):
+                plans[item['query']] = item['plan']
+    return queries, plans
+
+
+def run_batch_cli(argv: List[str]):
+    parser = argparse.ArgumentParser(prog='main.py batch', description='Plan and execute a batch of queries')
+    parser.add_argument('queries', help='JSONL file of queries')
+    parser.add_argument('--out', default='batch_results.jsonl', help='output path (.jsonl or .parquet)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent planner calls')
+    parser.add_argument('--workers', type=int, default=4, help='plan execution threads')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--stub', action='store_true', help='use the plans in the batch file instead of the LLM')
+    parser.add_argument('--providers', default='data/providers.csv')
+    parser.add_argument('--claims', default='data/Mounjaro Claim Sample.csv')
+    parser.add_argument('--trace', help='write every query\'s stages to this Chrome trace JSON')
+    args = parser.parse_args(argv)
+
+    from executor import PlanExecutor
+
+    queries, plans = load_queries(args.queries)
+    if args.stub:
+        planner = StubPlanner(plans)
+    else:
+        from agent import Agent
+        from planner_cache import PlannerCache
+        planner = Agent(cache=PlannerCache())
+
+    executor = PlanExecutor(args.providers, args.claims)
+    writer = ResultWriter(args.out)
+    try:
+        summary = asyncio.run(run_batch(queries, planner, executor, writer, args.concurrency,
+                                        args.workers, args.retries, trace_path=args.trace))
+    finally:
+        writer.close()
+
+    print(f"✅ {summary['succeeded']}/{summary['queries']} queries succeeded "
+          f"({summary['failed']} failed, {summary['retries']} retries) in {summary['seconds']:.2f}s "
+          f"- {summary['queries_per_second']:.1f} queries/s → {args.out}")
+    if not summary['stages'].empty:
+        print("\n⏱️ Time by stage across the batch:")
+        print(summary['stages'].head(10).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    if args.trace:
+        print(f"🧵 Chrome trace → {args.trace}")
@@ -0,0 +1,78 @@
+"""Fixed plan catalogue for the benchmark.
+
+Names are stable keys for comparing runs across commits: change a plan and it needs a
+new name. Filter values all occur in the sample files, so they also select rows in
+synthetic data resampled from them.
+"""
+
+CLAIM_COLUMNS = ["RX_CLAIM_NBR", "PATIENT_ID", "SERVICE_DATE_DD", "NDC_PREFERRED_BRAND_NM",
+                 "PAYER_PAYER_NM", "TOTAL_PAID_AMT", "PRESCRIBER_NPI_NBR"]
+DOCTOR_COLUMNS = ["npi", "name", "specialties", "states", "num_publications"]
+
+PLANS = [
+    {"name": "hcp_top_publications", "plan": {
+        "query_type": "hcp", "filters": {},
+        "projection": DOCTOR_COLUMNS, "order_by": ["num_publications DESC"], "limit": 20,
+    }},
+    {"name": "hcp_specialty_state", "plan": {
+        "query_type": "hcp",
+        "filters": {"specialty_any": ["internal medicine"], "state_any": ["CALIFORNIA", "TEXAS"]},
+        "projection": DOCTOR_COLUMNS, "order_by": ["name ASC"], "limit": 50,
+    }},
+    {"name": "hcp_name_contains", "plan": {
+        "query_type": "hcp", "filters": {"name_contains": ["PATEL"]},
+        "projection": ["npi", "name", "specialties"], "order_by": ["name ASC"], "limit": 100,
+    }},
+    {"name": "hcp_ranges_flags", "plan": {
+        "query_type": "hcp", "filters": {"publications_min": 50, "has_linkedin": True},
+        "projection": ["npi", "name", "num_publications", "num_clinical_trials"],
+        "order_by": ["num_clinical_trials DESC", "num_publications DESC"], "limit": 100,
+    }},
+    {"name": "hcp_system_org_all", "plan": {
+        "query_type": "hcp",
+        "filters": {"system_any": ["HCA HEALTHCARE", "ASCENSION HEALTH"], "org_type_any": ["General Acute Care Hospital"]},
+        "projection": ["npi", "name", "system_names", "org_type"], "order_by": [], "limit": None,
+    }},
+    {"name": "claims_only_payer_top_paid", "plan": {
+        "query_type": "claims_only", "filters": {}, "claims_filters": {"payer_any": ["CVS Health"]},
+        "projection": CLAIM_COLUMNS, "order_by": ["TOTAL_PAID_AMT DESC"], "limit": 100,
+    }},
+    {"name": "claims_only_recent_drug", "plan": {
+        "query_type": "claims_only", "filters": {},
+        "claims_filters": {"drug_any": ["Mounjaro", "Tirzepatide"], "date_range_months": 3},
+        "projection": CLAIM_COLUMNS, "order_by": ["SERVICE_DATE_DD DESC"], "limit": 1000,
+    }},
+    {"name": "claims_only_pharmacy_all", "plan": {
+        "query_type": "claims_only", "filters": {}, "claims_filters": {"pharmacy_any": ["KROGER"]},
+        "projection": CLAIM_COLUMNS, "order_by": [], "limit": None,
+    }},
+    {"name": "claims_by_doctor_name", "plan": {
+        "query_type": "claims_by_doctor", "filters": {"name_contains": ["PATEL"]}, "claims_filters": {},
+        "projection": CLAIM_COLUMNS, "order_by": ["SERVICE_DATE_DD DESC"], "limit": 200,
+    }},
+    {"name": "claims_by_doctor_specialty_recent", "plan": {
+        "query_type": "claims_by_doctor", "filters": {"specialty_any": ["surgery"]},
+        "claims_filters": {"date_range_months": 6},
+        "projection": CLAIM_COLUMNS, "order_by": ["SERVICE_DATE_DD DESC"], "limit": 200,
+    }},
+    {"name": "hcp_with_claims_state_payer", "plan": {
+        "query_type": "hcp_with_claims", "filters": {"state_any": ["FLORIDA"]},
+        "claims_filters": {"payer_any": ["CVS Health"]},
+        "projection": DOCTOR_COLUMNS, "order_by": ["name ASC"], "limit": 100,
+    }},
+    {"name": "hcp_with_claims_drug", "plan": {
+        "query_type": "hcp_with_claims", "filters": {}, "claims_filters": {"drug_any": ["Mounjaro"]},
+        "projection": DOCTOR_COLUMNS, "order_by": ["num_publications DESC"], "limit": 100,
+    }},
+    {"name": "metrics_top_prescribers", "plan": {
+        "query_type": "hcp_with_claims_metrics", "filters": {}, "claims_filters": {},
+        "projection": ["npi", "name", "total_prescriptions", "unique_patients", "total_paid_amt"],
+        "order_by": ["total_prescriptions DESC"], "limit": 10,
+    }},
+    {"name": "metrics_filtered", "plan": {
+        "query_type": "hcp_with_claims_metrics", "filters": {"specialty_any": ["internal medicine"]},
+        "claims_filters": {"payer_any": ["CVS Health"], "date_range_months": 6},
+        "projection": ["npi", "name", "states", "unique_patients", "total_prescriptions", "total_days_supply"],
+        "order_by": ["unique_patients DESC", "total_prescriptions DESC"], "limit": 25,
+    }},
+]
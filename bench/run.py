@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from bench.plans import PLANS
+from quiet import quietly
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = {'providers_path': 'data/providers.csv', 'claims_path': 'data/Mounjaro Claim Sample.csv'}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _measure_load(providers_path: str, claims_path: str, snapshot_dir: Optional[str]) -> Dict[str, float]:
+    """Load the executor in this (fresh) process; runs in a child so each load gets its own peak RSS"""
+    from executor import PlanExecutor
+
+    started = time.perf_counter()
+    executor = quietly(PlanExecutor, providers_path, claims_path, snapshot_dir=snapshot_dir)
+    return {
+        'seconds': time.perf_counter() - started,
+        'peak_rss_mb': peak_rss_mb(),
+        'providers': len(executor.hcp_df),
+        'claims': len(executor.claims_df),
+    }
+
+
+def _load_in_child(providers_path: str, claims_path: str, snapshot_dir: Optional[str]) -> Dict[str, float]:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(_measure_load, providers_path, claims_path, snapshot_dir).result()
+
+
+def _latency(executor, plan: Dict[str, Any], repeat: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        quietly(executor.execute_plan, plan)
+    seconds = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(quietly(executor.execute_plan, plan))
+        seconds.append(time.perf_counter() - started)
+    ms = np.array(seconds) * 1000
+    return {
+        'rows': rows,
+        'min_ms': float(ms.min()),
+        'median_ms': float(np.median(ms)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'mean_ms': float(ms.mean()),
+    }
+
+
+def _throughput(executor, plans: List[Dict[str, Any]], threads: int, duration: float) -> Dict[str, Any]:
+    """Run the catalogue round-robin from `threads` threads for `duration` seconds"""
+    lock = threading.Lock()
+    completed = [0]
+    deadline = time.perf_counter() + duration
+
+    def worker(offset: int):
+        i = offset
+        while time.perf_counter() < deadline:
+            executor.execute_plan(plans[i % len(plans)]['plan'])
+            i += 1
+            with lock:
+                completed[0] += 1
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    seconds = time.perf_counter() - started
+    return {'threads': threads, 'seconds': seconds, 'plans': completed[0], 'plans_per_second': completed[0] / seconds}
+
+
+def _git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout
+        return {'commit': commit, 'dirty': bool(status.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def run_benchmark(dataset: Dict[str, Any], plans: List[Dict[str, Any]] = PLANS, repeat: int = 5, warmup: int = 1,
+                  threads: int = 4, duration: float = 10.0) -> Dict[str, Any]:
+    """Load times, per-plan latency, peak RSS and throughput for one dataset.
+
+    Loads run in fresh child processes: once from CSV (which also writes a snapshot to a
+    temporary directory) and once from that snapshot. Plans then run in this process
+    on an executor loaded from the snapshot, without a result cache.
+    """
+    from executor import PlanExecutor
+
+    providers_path, claims_path = dataset['providers_path'], dataset['claims_path']
+    snapshot_dir = tempfile.mkdtemp(prefix='bench-snapshots-')
+    try:
+        print("⏳ Loading from CSV...")
+        csv_load = _load_in_child(providers_path, claims_path, snapshot_dir)
+        print(f"   {csv_load['seconds']:.2f}s, peak RSS {csv_load['peak_rss_mb']:.0f} MB")
+        print("⏳ Loading from snapshot...")
+        snapshot_load = _load_in_child(providers_path, claims_path, snapshot_dir)
+        print(f"   {snapshot_load['seconds']:.2f}s, peak RSS {snapshot_load['peak_rss_mb']:.0f} MB")
+
+        executor = quietly(PlanExecutor, providers_path, claims_path, snapshot_dir=snapshot_dir)
+        results = {}
+        for entry in plans:
+            results[entry['name']] = _latency(executor, entry['plan'], repeat, warmup)
+            print(f"   {entry['name']:<36} {results[entry['name']]['median_ms']:>9.2f} ms  ({results[entry['name']]['rows']} rows)")
+
+        throughput = _throughput(executor, plans, threads, duration) if duration > 0 else None
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            **_git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': repeat,
+            'warmup': warmup,
+        },
+        'dataset': {**dataset, 'providers': csv_load['providers'], 'claims': csv_load['claims']},
+        'load': {'csv': csv_load, 'snapshot': snapshot_load},
+        'plans': results,
+        'throughput': throughput,
+        'query_peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    meta, dataset = report['meta'], report['dataset']
+    dirty = ' (dirty)' if meta.get('dirty') else ''
+    print(f"\n📊 Benchmark at {meta.get('commit')}{dirty}: {dataset['providers']:,} providers, {dataset['claims']:,} claims")
+    for name, load in report['load'].items():
+        print(f"   load from {name:<9} {load['seconds']:>9.2f} s   peak RSS {load['peak_rss_mb']:>8.0f} MB")
+    print(f"   {'plan':<36} {'rows':>8} {'median ms':>10} {'p95 ms':>10}")
+    for name, result in report['plans'].items():
+        print(f"   {name:<36} {result['rows']:>8} {result['median_ms']:>10.2f} {result['p95_ms']:>10.2f}")
+    if report.get('throughput'):
+        throughput = report['throughput']
+        print(f"🚀 {throughput['plans_per_second']:.1f} plans/s on {throughput['threads']} threads")
+    print(f"🧠 Peak RSS while querying: {report['query_peak_rss_mb']:.0f} MB")
+
+
+def compare_reports(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.10) -> List[str]:
+    """Print head vs base for every shared metric; returns the metrics that got worse by more than threshold"""
+    metrics = []
+    for name in base['load']:
+        if name in head['load']:
+            metrics.append((f"load {name} s", base['load'][name]['seconds'], head['load'][name]['seconds'], False))
+            metrics.append((f"load {name} peak MB", base['load'][name]['peak_rss_mb'], head['load'][name]['peak_rss_mb'], False))
+    for name in base['plans']:
+        if name in head['plans']:
+            metrics.append((f"{name} median ms", base['plans'][name]['median_ms'], head['plans'][name]['median_ms'], False))
+    if base.get('throughput') and head.get('throughput'):
+        metrics.append(("plans/s", base['throughput']['plans_per_second'], head['throughput']['plans_per_second'], True))
+    metrics.append(("query peak MB", base['query_peak_rss_mb'], head['query_peak_rss_mb'], False))
+
+    if base['dataset'].get('claims') != head['dataset'].get('claims') or base['dataset'].get('providers') != head['dataset'].get('providers'):
+        print("⚠️ The two runs used datasets of different sizes")
+
+    regressions = []
+    print(f"{'metric':<48} {base['meta'].get('commit') or 'base':>12} {head['meta'].get('commit') or 'head':>12} {'change':>8}")
+    for name, before, after, higher_is_better in metrics:
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = ' ⚠️' if worse > threshold else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<48} {before:>12.2f} {after:>12.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def synthetic_dataset(providers: int, claims: int, seed: int = 0, months: int = 12,
+                      end_month: Optional[str] = None, joined_fraction: float = 0.5) -> Dict[str, Any]:
+    """Generate (or reuse) bench/data/p<providers>-c<claims>-s<seed>"""
+    from bench.synthetic import SyntheticDataGenerator
+
+    out_dir = os.path.join(BENCH_DIR, 'data', f"p{providers}-c{claims}-s{seed}")
+    manifest = SyntheticDataGenerator(SAMPLE['providers_path'], SAMPLE['claims_path'], seed).generate(
+        out_dir, providers, claims, months=months, end_month=end_month, joined_fraction=joined_fraction
+    )
+    if manifest['params']['end_month'] != datetime.now().strftime('%Y-%m'):
+        print(f"⚠️ Dataset ends in {manifest['params']['end_month']}; date_range_months plans select fewer claims as it ages")
+    return {'name': os.path.basename(out_dir), 'providers_path': manifest['providers_path'],
+            'claims_path': manifest['claims_path'], 'params': manifest['params']}
+
+
+def _add_dataset_args(parser: argparse.ArgumentParser):
+    parser.add_argument('--sample', action='store_true', help='benchmark data/ as it is instead of synthetic data')
+    parser.add_argument('--providers', type=int, default=100_000)
+    parser.add_argument('--claims', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--months', type=int, default=12, help='months of service dates in synthetic claims')
+    parser.add_argument('--end-month', help='last service month, YYYY-MM (default: this month)')
+    parser.add_argument('--joined-fraction', type=float, default=0.5, help='share of claims written by synthetic providers')
+
+
+def _dataset(args) -> Dict[str, Any]:
+    if args.sample:
+        return {'name': 'sample', **SAMPLE}
+    return synthetic_dataset(args.providers, args.claims, args.seed, args.months, args.end_month, args.joined_fraction)
+
+
+def run_bench_cli(argv: List[str]):
+    parser = argparse.ArgumentParser(prog='main.py bench', description='Executor benchmarks on sample or synthetic data')
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help='generate data if needed, then benchmark it')
+    _add_dataset_args(run)
+    run.add_argument('--repeat', type=int, default=5, help='timed runs per plan')
+    run.add_argument('--warmup', type=int, default=1, help='untimed runs per plan first')
+    run.add_argument('--threads', type=int, default=4, help='threads for the throughput run')
+    run.add_argument('--duration', type=float, default=10.0, help='seconds of throughput run (0 to skip)')
+    run.add_argument('--out', help='results JSON (default: bench/results/<commit>-<dataset>.json)')
+
+    generate = commands.add_parser('generate', help='only write synthetic data')
+    _add_dataset_args(generate)
+
+    compare = commands.add_parser('compare', help='compare two results files')
+    compare.add_argument('base')
+    compare.add_argument('head')
+    compare.add_argument('--threshold', type=float, default=0.10, help='relative change flagged as a regression')
+
+    args = parser.parse_args(argv or ['run'])
+
+    if args.command == 'generate':
+        _dataset(args)
+    elif args.command == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.head) as f:
+            head = json.load(f)
+        regressions = compare_reports(base, head, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regressions over {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+    else:
+        dataset = _dataset(args)
+        report = run_benchmark(dataset, PLANS, args.repeat, args.warmup, args.threads, args.duration)
+        print_report(report)
+        out = args.out
+        if not out:
+            meta = report['meta']
+            label = f"{meta['commit'] or 'unknown'}{'-dirty' if meta['dirty'] else ''}-{dataset['name']}"
+            out = os.path.join(BENCH_DIR, 'results', f"{label}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"💾 Saved results to {out}")
@@ -0,0 +1,195 @@
+import json
+import os
+import time
+from datetime import date
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+GENERATOR_VERSION = 1
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+def _mix(values: np.ndarray, salt: int) -> np.ndarray:
+    """splitmix64 of uint64 values; a fixed, well-spread hash so ids are reproducible from row numbers"""
+    with np.errstate(over='ignore'):
+        z = values.astype(np.uint64) + np.uint64((0x9E3779B97F4A7C15 * (salt + 1)) & 0xFFFFFFFFFFFFFFFF)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _hex_ids(values: np.ndarray, words: int, salt: int, dashes=()) -> np.ndarray:
+    """Lowercase hex strings of `words` x 64 hashed bits per value, with '-' inserted at `dashes`"""
+    hashed = np.stack([_mix(values, salt * 16 + word) for word in range(words)], axis=1)
+    octets = hashed.astype('>u8').view(np.uint8).reshape(len(values), words * 8)
+    chars = np.empty((len(values), words * 16), dtype=np.uint8)
+    chars[:, 0::2] = HEX_DIGITS[octets >> 4]
+    chars[:, 1::2] = HEX_DIGITS[octets & 15]
+    if dashes:
+        chars = np.insert(chars, list(dashes), ord('-'), axis=1)
+    return np.ascontiguousarray(chars).view(f'S{chars.shape[1]}').ravel().astype(str)
+
+
+def _uuids(values: np.ndarray, salt: int) -> np.ndarray:
+    return _hex_ids(values, 2, salt, dashes=(8, 12, 16, 20))
+
+
+def _month_start(value: str) -> np.datetime64:
+    return np.datetime64(value[:7], 'M')
+
+
+class SyntheticDataGenerator:
+    """Providers and claims at any scale, resampled from the sample files.
+
+    Every synthetic row copies a random source row, so columns keep their schema, value
+    distributions, missing-value rates and within-row correlations (a claim's payer
+    and plan channel, a provider's cities and states). Identity columns are then
+    replaced: providers get unique NPIs and names recombined from the source's first
+    and last names; claims get unique claim numbers, a patient pool with the source's
+    claims-per-patient ratio, service dates spread over `months` months, and a
+    prescriber. The sample's prescribers never appear in providers.csv, so a share
+    `joined_fraction` of claims is written by synthetic providers (weighted by the
+    source's claims-per-prescriber counts) and the rest by prescribers outside it.
+
+    Rows are written in chunks, so memory stays flat whatever the size; ids are hashes
+    of row numbers, so the same parameters always produce the same files.
+    """
+
+    def __init__(self, providers_path: str = "data/providers.csv",
+                 claims_path: str = "data/Mounjaro Claim Sample.csv", seed: int = 0):
+        self.seed = seed
+        self.providers = pd.read_csv(providers_path)
+        self.claims = pd.read_csv(claims_path, dtype=str, keep_default_na=False)
+
+        prescribers = self.claims['PRESCRIBER_NPI_NBR'].replace('', np.nan).dropna()
+        patients = self.claims['PATIENT_ID'].replace('', np.nan).dropna()
+        self.prescribers_per_claim = prescribers.nunique() / max(len(self.claims), 1)
+        self.patients_per_claim = patients.nunique() / max(len(self.claims), 1)
+        self.claims_per_prescriber = prescribers.value_counts().to_numpy()
+        self.prescriber_names = self.claims['PRESCRIBER_NPI_NM'].replace('', np.nan).dropna().unique()
+
+        self.anchor = _month_start(self.claims['RX_ANCHOR_DD'].iloc[0])
+        self.dates = {
+            col: pd.to_datetime(self.claims[col], errors='coerce').to_numpy().astype('datetime64[D]')
+            for col in ('RX_ANCHOR_DD', 'SERVICE_DATE_DD', 'DATE_PRESCRIPTION_WRITTEN_DD')
+        }
+        self.transaction_dates = pd.to_datetime(self.claims['TRANSACTION_DT'].str[:10], errors='coerce').to_numpy().astype('datetime64[D]')
+        self.transaction_times = self.claims['TRANSACTION_DT'].str[10:].to_numpy(dtype=str)
+
+    def generate(self, out_dir: str, num_providers: int, num_claims: int, months: int = 12,
+                 end_month: Optional[str] = None, joined_fraction: float = 0.5,
+                 chunk_size: int = 250_000) -> Dict[str, Any]:
+        """Write providers.csv, claims.csv and manifest.json to out_dir; returns the manifest"""
+        end_month = end_month or date.today().strftime('%Y-%m')
+        params = {
+            'generator_version': GENERATOR_VERSION, 'providers': num_providers, 'claims': num_claims,
+            'seed': self.seed, 'months': months, 'end_month': end_month, 'joined_fraction': joined_fraction,
+        }
+        manifest_path = os.path.join(out_dir, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('params') == params:
+                print(f"♻️ Reusing synthetic data in {out_dir}")
+                return manifest
+
+        os.makedirs(out_dir, exist_ok=True)
+        started = time.perf_counter()
+        providers_path = os.path.join(out_dir, 'providers.csv')
+        claims_path = os.path.join(out_dir, 'claims.csv')
+
+        rng = np.random.default_rng(self.seed)
+        provider_npis = self._npis(np.arange(num_providers))
+        provider_names = self._write_providers(providers_path, provider_npis, rng, chunk_size)
+        print(f"🏥 Wrote {num_providers:,} providers in {time.perf_counter() - started:.1f}s")
+
+        weights = rng.choice(self.claims_per_prescriber, size=num_providers).astype(np.float64)
+        provider_cdf = np.cumsum(weights / weights.sum())
+        external = max(int(num_claims * self.prescribers_per_claim * (1 - joined_fraction)), 1)
+        patients = max(int(num_claims * self.patients_per_claim), 1)
+
+        for start in range(0, num_claims, chunk_size):
+            count = min(chunk_size, num_claims - start)
+            chunk = self._claims_chunk(rng, start, count, num_providers, provider_npis, provider_names,
+                                       provider_cdf, external, patients, months, _month_start(end_month),
+                                       joined_fraction)
+            chunk.to_csv(claims_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+            print(f"💊 Wrote {start + count:,}/{num_claims:,} claims ({time.perf_counter() - started:.1f}s)")
+
+        manifest = {
+            'params': params,
+            'providers_path': providers_path,
+            'claims_path': claims_path,
+            'seconds': time.perf_counter() - started,
+            'bytes': {name: os.path.getsize(path) for name, path in (('providers', providers_path), ('claims', claims_path))},
+        }
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def _npis(self, ids: np.ndarray) -> np.ndarray:
+        """Distinct 10-digit NPIs for up to 100M ids, each at a hashed offset inside its own slot"""
+        slot = 80
+        return 1_000_000_000 + ids.astype(np.int64) * slot + (_mix(ids, self.seed) % np.uint64(slot)).astype(np.int64)
+
+    def _write_providers(self, path: str, npis: np.ndarray, rng: np.random.Generator, chunk_size: int) -> np.ndarray:
+        source = self.providers
+        names = np.empty(len(npis), dtype=object)
+        for start in range(0, len(npis), chunk_size):
+            count = min(chunk_size, len(npis) - start)
+            chunk = source.iloc[rng.integers(0, len(source), count)].reset_index(drop=True)
+            # First names keep their gender; middle and last names are drawn independently
+            people = rng.integers(0, len(source), count)
+            chunk['first_name'] = source['first_name'].to_numpy()[people]
+            chunk['gender'] = source['gender'].to_numpy()[people]
+            chunk['middle_name'] = source['middle_name'].to_numpy()[rng.integers(0, len(source), count)]
+            chunk['last_name'] = source['last_name'].to_numpy()[rng.integers(0, len(source), count)]
+            chunk['type_1_npi'] = npis[start:start + count]
+            chunk['docnexus_url'] = 'https://platform.docnexus.ai/providers/' + chunk['type_1_npi'].astype(str)
+            names[start:start + count] = (chunk['first_name'] + ' ' + chunk['last_name']).str.upper().to_numpy()
+            chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+        return names
+
+    def _claims_chunk(self, rng: np.random.Generator, start: int, count: int, num_providers: int,
+                      provider_npis: np.ndarray, provider_names: np.ndarray, provider_cdf: np.ndarray,
+                      external: int, patients: int, months: int, end_month: np.datetime64,
+                      joined_fraction: float) -> pd.DataFrame:
+        source_rows = rng.integers(0, len(self.claims), count)
+        chunk = self.claims.iloc[source_rows].reset_index(drop=True)
+        row_ids = np.arange(start, start + count, dtype=np.uint64)
+
+        chunk['RX_CLAIM_NBR'] = _hex_ids(row_ids, 4, salt=1)
+        dispense = _hex_ids(row_ids, 4, salt=2)
+        chunk['DISPENSE_NBR'] = dispense
+        chunk['RESUBMITTED_RX_CLAIM_NBR'] = dispense
+        chunk['PATIENT_ID'] = _uuids(rng.integers(0, patients, count).astype(np.uint64), salt=3)
+
+        joined = rng.random(count) < joined_fraction
+        providers = np.minimum(np.searchsorted(provider_cdf, rng.random(joined.sum())), num_providers - 1)
+        others = rng.integers(0, external, (~joined).sum()).astype(np.int64)
+        npis = np.empty(count, dtype=np.int64)
+        names = np.empty(count, dtype=object)
+        npis[joined] = provider_npis[providers]
+        names[joined] = provider_names[providers]
+        npis[~joined] = self._npis(num_providers + others)
+        names[~joined] = self.prescriber_names[others % len(self.prescriber_names)]
+        chunk['PRESCRIBER_NPI_NBR'] = npis.astype(str)
+        chunk['PRESCRIBER_NPI_NM'] = names
+
+        # Move each claim to a random month, keeping its dates' offsets from the anchor month
+        month = end_month - rng.integers(0, months, count)
+        shift = (month.astype('datetime64[D]') - self.anchor.astype('datetime64[D]')).astype(np.int64)
+        for col, values in self.dates.items():
+            chunk[col] = self._date_strings(values[source_rows] + shift)
+        chunk['TRANSACTION_DT'] = np.char.add(
+            self._date_strings(self.transaction_dates[source_rows] + shift), self.transaction_times[source_rows]
+        )
+        return chunk
+
+    @staticmethod
+    def _date_strings(values: np.ndarray) -> np.ndarray:
+        strings = np.datetime_as_string(values, unit='D')
+        strings[np.isnat(values)] = ''
+        return strings
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from typing import Callable
+from growable import SortedRuns
+
+
+class ClaimNumberIndex:
+    """Membership test for claim numbers, used to drop claims that are already loaded.
+
+    Keeps 64-bit hashes of the numbers sorted alongside their row positions (16 bytes a
+    row, instead of one Python string per claim). Hash hits are confirmed against the
+    numbers stored at those rows, fetched with one `numbers_at` call per lookup, so a
+    collision never drops a new claim.
+    """
+
+    def __init__(self, numbers: pd.Series, numbers_at: Callable[[np.ndarray], pd.Series]):
+        self.numbers_at = numbers_at
+        self.size = len(numbers)
+        self.hashes = SortedRuns(self._hash(numbers), np.arange(len(numbers), dtype=np.int64))
+
+    @staticmethod
+    def _hash(numbers: pd.Series) -> np.ndarray:
+        return pd.util.hash_array(numbers.to_numpy(dtype=object), categorize=False)
+
+    def contains(self, numbers: pd.Series) -> np.ndarray:
+        """Whether each number is already indexed; missing numbers never are"""
+        values = numbers.to_numpy(dtype=object)
+        hits, rows = self.hashes.equal_range(self._hash(numbers))
+        found = np.zeros(len(values), dtype=bool)
+        if len(hits):
+            stored = np.asarray(self.numbers_at(rows), dtype=object)
+            found[hits[stored == values[hits]]] = True
+        return found & ~pd.isna(values)
+
+    def extend(self, numbers: pd.Series):
+        """Index numbers of rows appended after the current end of the table"""
+        self.hashes.insert(self._hash(numbers), np.arange(self.size, self.size + len(numbers), dtype=np.int64))
+        self.size += len(numbers)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+from growable import GrowableArray
+
+
+class CategoricalMatcher:
+    """Case-insensitive substring matching evaluated once per distinct value of a column"""
+
+    def __init__(self, values: pd.Series):
+        codes, uniques = pd.factorize(values)
+        # Missing values get code -1, which indexes the trailing always-False slot of a match table
+        self._codes = GrowableArray(codes)
+        self.lowered = [str(value).lower() for value in uniques]
+        self._uniques = pd.Index(np.asarray(uniques, dtype=object))
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self._codes.values
+
+    def extend(self, values: pd.Series):
+        """Append codes for new rows; values not seen before get the next free codes"""
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Index(np.asarray(uniques, dtype=object))
+        mapped = self._uniques.get_indexer(uniques)
+        unseen = mapped < 0
+        mapped[unseen] = len(self._uniques) + np.arange(unseen.sum())
+        if unseen.any():
+            self._uniques = self._uniques.append(uniques[unseen])
+        self.lowered.extend(str(value).lower() for value in uniques[unseen])
+        # Code -1 (missing) picks the trailing -1
+        self._codes.append(np.append(mapped, -1)[codes])
+
+    def match_table(self, patterns: Iterable[str]) -> np.ndarray:
+        patterns = [p.lower() for p in patterns]
+        table = np.zeros(len(self.lowered) + 1, dtype=bool)
+        for code, value in enumerate(self.lowered):
+            table[code] = any(p in value for p in patterns)
+        return table
+
+    def mask(self, patterns: Iterable[str], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        return self.match_table(patterns)[codes]
+
+
+class ClaimsMatcher:
+    """Per-column categorical matchers backing the substring claims_filters"""
+
+    COLUMNS = ['PHARMACY_NPI_NM', 'PAYER_PAYER_NM', 'NDC_GENERIC_NM', 'NDC_PREFERRED_BRAND_NM', 'NDC_DESC']
+
+    def __init__(self, claims_df: pd.DataFrame, columns: Optional[List[str]] = None):
+        self.size = len(claims_df)
+        self.matchers: Dict[str, CategoricalMatcher] = {
+            col: CategoricalMatcher(claims_df[col])
+            for col in (self.COLUMNS if columns is None else columns) if col in claims_df.columns
+        }
+
+    def extend(self, new_claims: pd.DataFrame):
+        for col, matcher in self.matchers.items():
+            matcher.extend(new_claims[col])
+        self.size += len(new_claims)
+
+    def mask_any(self, columns: Iterable[str], patterns: Iterable[str],
+                 rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Whether any of the columns contains any of the patterns, for every row or just `rows`"""
+        patterns = list(patterns)
+        mask = np.zeros(self.size if rows is None else len(rows), dtype=bool)
+        for col in columns:
+            if col in self.matchers:
+                mask |= self.matchers[col].mask(patterns, rows)
+        return mask
@@ -0,0 +1,289 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from claims_match import ClaimsMatcher
+from snapshot import SnapshotStore
+
+# Bump whenever the layout or the preprocessing of the stored claims changes
+COLUMNAR_VERSION = 2
+ROW_GROUP_SIZE = 65_536
+# Position of each claim in the preprocessed file, so results keep the labels and order of a full scan
+ROW_COLUMN = '__row'
+NPI_COLUMN = 'PRESCRIBER_NPI_NBR'
+DATE_COLUMN = 'SERVICE_DATE_DD'
+# Row groups with more distinct values than this in a substring-matched column are never skipped on it
+DICTIONARY_LIMIT = 1024
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 of uint64 values"""
+    with np.errstate(over='ignore'):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _npi_keys(values: Iterable) -> np.ndarray:
+    # Preprocessed NPIs are integer strings; anything else cannot equal one of them
+    numbers = pd.to_numeric(pd.Series(pd.unique(np.asarray(list(values), dtype=object)), dtype=object), errors='coerce')
+    return numbers.dropna().astype(np.int64).to_numpy().view(np.uint64)
+
+
+def _bloom_positions(keys: np.ndarray, bits: int) -> np.ndarray:
+    """Bit positions of every key (one row each) in a filter of `bits` bits, a power of two"""
+    hashed = _mix(keys)
+    first, step = hashed & np.uint64(0xFFFFFFFF), (hashed >> np.uint64(32)) | np.uint64(1)
+    with np.errstate(over='ignore'):
+        positions = first[:, None] + np.arange(BLOOM_HASHES, dtype=np.uint64) * step[:, None]
+    return positions & np.uint64(bits - 1)
+
+
+def _bloom_build(keys: np.ndarray) -> np.ndarray:
+    bits = 64
+    while bits < BLOOM_BITS_PER_KEY * len(keys):
+        bits *= 2
+    words = np.zeros(bits // 64, dtype=np.uint64)
+    positions = _bloom_positions(keys, bits).ravel()
+    np.bitwise_or.at(words, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+    return words
+
+
+def _bloom_may_contain(words: np.ndarray, keys: np.ndarray) -> bool:
+    """False only if none of the keys was added to the filter"""
+    if not len(words) or not len(keys):
+        return False
+    positions = _bloom_positions(keys, len(words) * 64)
+    hits = (words[positions >> np.uint64(6)] >> (positions & np.uint64(63))) & np.uint64(1)
+    return bool(hits.all(axis=1).any())
+
+
+def _months(df: pd.DataFrame) -> np.ndarray:
+    """Partition name per row: the service month as YYYY-MM, or 'none' without a service date"""
+    if DATE_COLUMN not in df.columns:
+        return np.full(len(df), 'none', dtype=object)
+    months = df[DATE_COLUMN].to_numpy(dtype='datetime64[ns]').astype('datetime64[M]')
+    names = np.datetime_as_string(months, unit='M').astype(object)
+    names[np.isnat(months)] = 'none'
+    return names
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    # A column that was numeric in some chunks of the CSV and text in others cannot be one Parquet
+    # column; it is stored as text, the way it appears in the file
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+class ColumnarStore(SnapshotStore):
+    """Claims converted to Parquet partitioned by service month, with a manifest for skipping row groups.
+
+    A store lives in <root>/<key>/ (keyed like a snapshot, by source file hash):
+    claims/month=YYYY-MM/part-0.parquet holds one month's claims clustered by prescriber
+    NPI, cut into row groups of ROW_GROUP_SIZE. manifest.json records, per row group, its
+    first row, the compressed bytes of each column, min/max service date and NPI, and the
+    codes of the distinct values of every substring-matched column; npi_bloom.npy holds
+    a bloom filter of the NPIs in each row group. A query reads only the row groups whose
+    statistics say some row could match.
+    """
+
+    version = COLUMNAR_VERSION
+
+    def __init__(self, root: str = ".columnar"):
+        super().__init__(root)
+
+    def build(self, key: str, path: str, preprocess: Callable[[pd.DataFrame], pd.DataFrame],
+              concat: Callable[[List[pd.DataFrame]], pd.DataFrame], chunksize: int = 100_000,
+              dtypes: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+        """Convert a claims CSV chunk by chunk; returns the manifest, or None if the store could not be written.
+
+        `dtypes` (see streaming.scan_csv_dtypes) gives every chunk the column types of the whole file.
+        """
+        directory = os.path.join(self.root, key)
+        staging = f"{directory}.tmp{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            manifest = self._write(staging, path, preprocess, concat, chunksize, dtypes)
+            shutil.rmtree(os.path.join(staging, 'pieces'))
+        except Exception as e:
+            print(f"⚠️ Could not build columnar store: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+        self._prune(keep=key, sources=manifest['sources'])
+        return manifest
+
+    def _write(self, staging: str, path: str, preprocess: Callable[[pd.DataFrame], pd.DataFrame],
+               concat: Callable[[List[pd.DataFrame]], pd.DataFrame], chunksize: int,
+               dtypes: Optional[Dict[str, Any]] = None) -> Dict:
+        # Pass 1: split each preprocessed chunk by month into pickled pieces, which keep any dtype
+        os.makedirs(os.path.join(staging, 'pieces'))
+        columns = list(pd.read_csv(path, nrows=0).columns)
+        pieces: Dict[str, List[str]] = {}
+        offset = 0
+        count = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype=dtypes):
+            chunk = preprocess(chunk.reset_index(drop=True))
+            chunk[ROW_COLUMN] = np.arange(offset, offset + len(chunk), dtype=np.int64)
+            offset += len(chunk)
+            for month, piece in chunk.groupby(_months(chunk), sort=False):
+                piece_path = os.path.join(staging, 'pieces', f"{count}.pkl")
+                piece.to_pickle(piece_path)
+                pieces.setdefault(month, []).append(piece_path)
+                count += 1
+
+        # Pass 2: one month at a time, cluster by NPI and write row groups with their statistics
+        manifest = {
+            'version': self.version,
+            'sources': [os.path.abspath(path)],
+            'columns': columns,
+            'rows': offset,
+            'partitions': {},
+            'row_groups': [],
+            'dictionaries': {},
+        }
+        dictionaries = {col: {} for col in ClaimsMatcher.COLUMNS if col in columns}
+        blooms = []
+        bloom_words = 0
+        for month in sorted(pieces):
+            df = concat([pd.read_pickle(piece_path) for piece_path in pieces[month]])
+            if NPI_COLUMN in df.columns:
+                df = df.sort_values([NPI_COLUMN, ROW_COLUMN], kind='stable', ignore_index=True)
+            df = _arrow_safe(df.reset_index(drop=True))
+
+            relative = os.path.join('claims', f"month={month}", 'part-0.parquet')
+            os.makedirs(os.path.dirname(os.path.join(staging, relative)))
+            df.to_parquet(os.path.join(staging, relative), index=False, row_group_size=ROW_GROUP_SIZE)
+            manifest['partitions'][month] = {
+                'path': relative,
+                'list_columns': [],
+                'object_columns': [col for col in columns if col in df.columns and df[col].dtype == object],
+            }
+
+            metadata = pq.ParquetFile(os.path.join(staging, relative)).metadata
+            start = 0
+            for group in range(metadata.num_row_groups):
+                row_group = metadata.row_group(group)
+                part = df.iloc[start:start + row_group.num_rows]
+                start += row_group.num_rows
+                entry = self._row_group_stats(part, dictionaries)
+                entry.update({
+                    'partition': month,
+                    'row_group': group,
+                    'bytes': {row_group.column(i).path_in_schema: row_group.column(i).total_compressed_size
+                              for i in range(row_group.num_columns)},
+                })
+                if NPI_COLUMN in part.columns:
+                    words = _bloom_build(_npi_keys(part[NPI_COLUMN]))
+                    entry['bloom'] = [bloom_words, len(words)]
+                    blooms.append(words)
+                    bloom_words += len(words)
+                manifest['row_groups'].append(entry)
+
+        manifest['dictionaries'] = {col: list(values) for col, values in dictionaries.items()}
+        np.save(os.path.join(staging, 'npi_bloom.npy'),
+                np.concatenate(blooms) if blooms else np.empty(0, dtype=np.uint64))
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        return manifest
+
+    @staticmethod
+    def _row_group_stats(part: pd.DataFrame, dictionaries: Dict[str, Dict[str, int]]) -> Dict:
+        entry = {'rows': len(part), 'first_row': int(part[ROW_COLUMN].min()), 'min': {}, 'max': {}, 'values': {}}
+        if DATE_COLUMN in part.columns:
+            dates = part[DATE_COLUMN].to_numpy(dtype='datetime64[ns]')
+            dates = dates[~np.isnat(dates)].view(np.int64)
+            entry['min'][DATE_COLUMN] = int(dates.min()) if len(dates) else None
+            entry['max'][DATE_COLUMN] = int(dates.max()) if len(dates) else None
+        if NPI_COLUMN in part.columns:
+            entry['min'][NPI_COLUMN] = str(part[NPI_COLUMN].min())
+            entry['max'][NPI_COLUMN] = str(part[NPI_COLUMN].max())
+        for col, dictionary in dictionaries.items():
+            # Matching compares str(value), so the dictionary holds values as text
+            uniques = pd.unique(part[col].dropna().to_numpy())
+            if len(uniques) > DICTIONARY_LIMIT:
+                entry['values'][col] = None
+            else:
+                entry['values'][col] = [dictionary.setdefault(str(value), len(dictionary)) for value in uniques]
+        return entry
+
+    def prune(self, key: str, manifest: Dict, date_window: Optional[Tuple[datetime, datetime]] = None,
+              npis: Optional[Sequence[str]] = None,
+              matches: Sequence[Tuple[Sequence[str], Sequence[str]]] = ()) -> List[Dict]:
+        """Row groups that may hold a matching claim, by first row.
+
+        date_window is (start, end) of the service dates wanted; npis the prescribers joined
+        on; matches one (columns, patterns) pair per substring filter, where a claim must
+        contain one of the patterns in one of the columns.
+        """
+        groups = manifest['row_groups']
+        keep = np.ones(len(groups), dtype=bool)
+        columns = manifest['columns']
+
+        if date_window is not None and DATE_COLUMN in columns:
+            start, end = (np.datetime64(bound, 'ns').astype(np.int64) for bound in date_window)
+            # Row groups without any service date never fall inside a window
+            lows = np.array([group['min'][DATE_COLUMN] for group in groups], dtype=object)
+            highs = np.array([group['max'][DATE_COLUMN] for group in groups], dtype=object)
+            dated = np.array([low is not None for low in lows], dtype=bool)
+            keep &= dated
+            keep[dated] &= (highs[dated].astype(np.int64) >= start) & (lows[dated].astype(np.int64) <= end)
+
+        if npis is not None and NPI_COLUMN in columns:
+            wanted = np.sort(np.asarray(list(npis), dtype=str))
+            lows = np.array([group['min'][NPI_COLUMN] for group in groups], dtype=str)
+            highs = np.array([group['max'][NPI_COLUMN] for group in groups], dtype=str)
+            keep &= np.searchsorted(wanted, lows, 'left') < np.searchsorted(wanted, highs, 'right')
+            keys = _npi_keys(wanted)
+            blooms = np.load(os.path.join(self.root, key, 'npi_bloom.npy'), mmap_mode='r')
+            for i in np.flatnonzero(keep):
+                start, words = groups[i]['bloom']
+                keep[i] = _bloom_may_contain(np.asarray(blooms[start:start + words]), keys)
+
+        for match_columns, patterns in matches:
+            present = [col for col in match_columns if col in columns]
+            if not present:
+                # The executor skips a filter on columns the table does not have
+                continue
+            patterns = [str(pattern).lower() for pattern in patterns]
+            tables = {}
+            for col in present:
+                values = manifest['dictionaries'].get(col, [])
+                tables[col] = np.array([any(p in value.lower() for p in patterns) for value in values] + [False])
+            for i in np.flatnonzero(keep):
+                codes = groups[i]['values']
+                keep[i] = any(codes.get(col) is None or tables[col][codes[col]].any() for col in present)
+
+        kept = [groups[i] for i in np.flatnonzero(keep)]
+        return sorted(kept, key=lambda group: group['first_row'])
+
+    def read_row_group(self, key: str, manifest: Dict, group: Dict, columns: List[str]) -> pd.DataFrame:
+        """Columns of one row group in file row order, labelled by row position in the preprocessed claims"""
+        partition = manifest['partitions'][group['partition']]
+        parquet = pq.ParquetFile(os.path.join(self.root, key, partition['path']), memory_map=True)
+        table = parquet.read_row_group(group['row_group'], columns=list(columns) + [ROW_COLUMN])
+        df = self._restore(table.to_pandas(ignore_metadata=True), partition)
+        rows = df.pop(ROW_COLUMN).to_numpy()
+        order = np.argsort(rows, kind='stable')
+        df = df[list(columns)].take(order)
+        df.index = pd.Index(rows[order])
+        return df
+
+    @staticmethod
+    def bytes_of(groups: Iterable[Dict], columns: Optional[Iterable[str]] = None) -> int:
+        """Compressed bytes of the given columns (all of them when None) in these row groups"""
+        wanted = None if columns is None else set(columns) | {ROW_COLUMN}
+        return sum(size for group in groups for col, size in group['bytes'].items() if wanted is None or col in wanted)
@@ -0,0 +1,281 @@
+import json
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Dict, List, Set, Tuple
+from growable import GrowableArray
+from prompts.planner import DATA_DICTIONARY_CLAIMS
+
+# Columns the executor itself reads, on top of those the planner can see in the data dictionary
+EXECUTOR_CLAIMS_COLUMNS = [
+    'PRESCRIBER_NPI_NBR', 'SERVICE_DATE_DD',
+    'PHARMACY_NPI_NM', 'PAYER_PAYER_NM', 'NDC_GENERIC_NM', 'NDC_PREFERRED_BRAND_NM', 'NDC_DESC',
+]
+CATEGORICAL_MAX_RATIO = 0.5
+HEX_HASH_PATTERN = r'[0-9a-f]{64}'
+UUID_PATTERN = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+# Fixed-width encodings: byte width -> (pattern, text length, positions of the '-' separators)
+FIXED_ENCODINGS = {
+    32: (HEX_HASH_PATTERN, 64, []),
+    16: (UUID_PATTERN, 36, [8, 13, 18, 23]),
+}
+PATTERN_SAMPLE_ROWS = 256
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+HEX_BYTES = np.zeros(256, dtype=bool)
+HEX_BYTES[HEX_DIGITS] = True
+HEX_VALUES = np.zeros(256, dtype=np.uint8)
+HEX_VALUES[HEX_DIGITS] = np.arange(16, dtype=np.uint8)
+
+
+def referenced_claims_columns() -> Set[str]:
+    """Claims columns a plan can touch; everything else may stay on disk until projected"""
+    dictionary = {column['name'] for column in json.loads(DATA_DICTIONARY_CLAIMS)}
+    return dictionary | set(EXECUTOR_CLAIMS_COLUMNS)
+
+
+def _text_bytes(values: np.ndarray, length: int) -> np.ndarray:
+    """ASCII strings as a (rows, length + 1) byte matrix; the last byte is set only for longer strings"""
+    chars = values.astype(f'S{length + 1}')
+    return chars.view(np.uint8).reshape(len(values), length + 1)
+
+
+def _fixed_bytes(values: pd.Series, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(packed S<width> bytes, missing mask) of hex or UUID text; missing values pack as zeros"""
+    _, length, dashes = FIXED_ENCODINGS[width]
+    missing = values.isna().to_numpy()
+    filled = np.where(missing, '0' * length, values.to_numpy(dtype=object))
+    digits = HEX_VALUES[np.delete(_text_bytes(filled, length)[:, :length], dashes, axis=1)]
+    packed = np.ascontiguousarray((digits[:, 0::2] << 4) | digits[:, 1::2]).view(f'S{width}').ravel()
+    return packed, missing
+
+
+def _pack_fixed(values: pd.Series, width: int) -> pd.Series:
+    packed, missing = _fixed_bytes(values, width)
+    array = pa.array(packed, type=pa.binary(width), mask=missing)
+    return pd.Series(pd.arrays.ArrowExtensionArray(array), index=values.index, name=values.name)
+
+
+def _all_match(series: pd.Series, width: int) -> bool:
+    """Whether every present value is text in the fixed-width encoding's shape.
+
+    A sample of the first present values rules most columns out cheaply: lengths first,
+    then the pattern. Columns that pass are checked in full on their bytes, not by regex.
+    """
+    pattern, length, dashes = FIXED_ENCODINGS[width]
+    sample = series.iloc[:PATTERN_SAMPLE_ROWS].dropna()
+    if not len(sample):
+        sample = series.dropna().iloc[:PATTERN_SAMPLE_ROWS]
+    if not len(sample) or not all(isinstance(x, str) and len(x) == length for x in sample):
+        return False
+    if not sample.str.fullmatch(pattern).all():
+        return False
+
+    present = series.dropna()
+    if pd.api.types.infer_dtype(present, skipna=False) != 'string':
+        return False
+    try:
+        chars = _text_bytes(present.to_numpy(), length)
+    except UnicodeEncodeError:
+        return False
+    valid = HEX_BYTES[chars[:, :length]]
+    valid[:, dashes] = chars[:, dashes] == ord('-')
+    return bool(valid.all() and not chars[:, length].any())
+
+
+def _encode_column(name: str, series: pd.Series) -> Tuple[pd.Series, str]:
+    if name == 'PRESCRIBER_NPI_NBR' and series.dtype == object:
+        return series.astype(np.int64), 'int64 npi'
+
+    if series.dtype == object:
+        if _all_match(series, 32):
+            return _pack_fixed(series, 32), 'binary(32) hash'
+        if _all_match(series, 16):
+            return _pack_fixed(series, 16), 'binary(16) uuid'
+        # One sorted factorize both counts the distinct values and builds the categorical
+        codes, categories = pd.factorize(series, sort=True)
+        if len(categories) <= CATEGORICAL_MAX_RATIO * max(len(series), 1):
+            return pd.Series(pd.Categorical.from_codes(codes, categories), index=series.index, name=series.name), 'category'
+        return series, 'object'
+
+    if series.dtype == np.int64 and len(series):
+        narrowed = pd.to_numeric(series, downcast='integer')
+        if narrowed.dtype != series.dtype:
+            return narrowed, str(narrowed.dtype)
+
+    return series, str(series.dtype)
+
+
+def _deep_bytes(series: pd.Series, encoded: pd.Series) -> int:
+    """Deep size of a column before encoding; a column made categorical is summed per distinct value"""
+    if series.dtype == object and isinstance(encoded.dtype, pd.CategoricalDtype):
+        sizes = np.array([sys.getsizeof(value) for value in encoded.cat.categories] + [sys.getsizeof(np.nan)])
+        return int(series.to_numpy().nbytes + sizes[encoded.cat.codes.to_numpy()].sum())
+    return int(series.memory_usage(index=False, deep=True))
+
+
+def compact_claims(claims_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Re-encode a preprocessed claims table compactly and report bytes per column before and after.
+
+    Low-cardinality strings become categoricals, 64-char hex hashes and UUIDs become
+    fixed-width binary, prescriber NPIs become int64 and int64 columns are narrowed.
+    decode_claims_column() turns every encoding back into the original values.
+    """
+    columns, encodings, before, after = {}, {}, [], []
+    for name in claims_df.columns:
+        series = claims_df[name]
+        columns[name], encodings[name] = _encode_column(name, series)
+        # Deep sizes walk every string, so a column left as it was is measured once
+        before.append(_deep_bytes(series, columns[name]))
+        after.append(before[-1] if columns[name] is series else int(columns[name].memory_usage(index=False, deep=True)))
+    compacted = pd.DataFrame(columns, index=claims_df.index)
+
+    report = pd.DataFrame({
+        'column': list(claims_df.columns),
+        'encoding': [encodings[name] for name in claims_df.columns],
+        'before_bytes': before,
+        'after_bytes': after,
+    })
+    return compacted, report
+
+
+def _codes_dtype(categories: int) -> np.dtype:
+    """The codes dtype pandas gives a categorical with this many categories"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _fixed_arrays(array: pa.Array, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(the bytes of each row as S<width>, missing mask) of a fixed-size binary array, without copying the bytes"""
+    data = np.frombuffer(array.buffers()[1], dtype=f'S{width}', count=array.offset + len(array))[array.offset:]
+    return data, array.is_null().to_numpy(zero_copy_only=False)
+
+
+def _decode_fixed(packed: np.ndarray, missing: np.ndarray, width: int) -> np.ndarray:
+    """Fixed-width bytes back to their lowercase hex (or UUID) text, as an object array with NaN where missing"""
+    _, length, dashes = FIXED_ENCODINGS[width]
+    octets = packed.view(np.uint8).reshape(len(packed), width)
+    chars = np.empty((len(packed), 2 * width), dtype=np.uint8)
+    chars[:, 0::2] = HEX_DIGITS[octets >> 4]
+    chars[:, 1::2] = HEX_DIGITS[octets & 15]
+    if dashes:
+        # Each '-' goes before the digit it precedes in the text, counting the separators already placed
+        chars = np.insert(chars, [at - placed for placed, at in enumerate(dashes)], ord('-'), axis=1)
+    text = np.ascontiguousarray(chars).view(f'S{length}').ravel().astype(f'U{length}').astype(object)
+    text[missing] = np.nan
+    return text
+
+
+class CompactColumn:
+    """One compact claims column that rows are appended to, keeping its encoding.
+
+    Values live in buffers with spare capacity (see GrowableArray): codes plus categories
+    for categoricals, bytes plus a missing mask for fixed-width binary, the values
+    themselves for numpy dtypes. An append encodes the new rows like the column and
+    copies only them, unless they need a wider encoding; series() wraps the rows so far
+    without copying. Other dtypes fall back to concatenating.
+    """
+
+    def __init__(self, name: str, series: pd.Series):
+        self.name = name
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            self.kind = 'category'
+            self.categories = dtype.categories
+            self.values = GrowableArray(series.cat.codes.to_numpy())
+        elif isinstance(dtype, pd.ArrowDtype) and pa.types.is_fixed_size_binary(dtype.pyarrow_dtype):
+            self.kind = 'binary'
+            self.width = dtype.pyarrow_dtype.byte_width
+            data, missing = _fixed_arrays(series.array.__arrow_array__().combine_chunks(), self.width)
+            self.values, self.missing = GrowableArray(data), GrowableArray(missing)
+        elif isinstance(dtype, np.dtype):
+            self.kind = 'numpy'
+            self.values = GrowableArray(series.to_numpy())
+        else:
+            self.kind = 'series'
+            self.series_values = series.reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return len(self.series_values) if self.kind == 'series' else len(self.values)
+
+    def extend(self, series: pd.Series):
+        """Append new (preprocessed, not yet encoded) values"""
+        series = series.reset_index(drop=True)
+        if self.kind == 'category':
+            added = pd.Index(series.dropna().unique()).difference(self.categories)
+            if len(added):
+                self.categories = self.categories.append(added)
+            codes = self.categories.get_indexer(series)
+            self.values.append(codes.astype(np.promote_types(self.values.dtype, _codes_dtype(len(self.categories)))))
+        elif self.kind == 'binary':
+            if series.isna().all() or _all_match(series, self.width):
+                data, missing = _fixed_bytes(series, self.width)
+                self.values.append(data)
+                self.missing.append(missing)
+            else:
+                # Values that do not fit the encoding: the column goes back to text, once
+                self.kind = 'numpy'
+                self.values = GrowableArray(_decode_fixed(self.values.values, self.missing.values, self.width))
+                self.values.append(series.to_numpy(dtype=object))
+        elif self.kind == 'numpy':
+            if self.name == 'PRESCRIBER_NPI_NBR' and self.values.dtype.kind == 'i':
+                series = series.astype(np.int64)
+            elif self.values.dtype.kind == 'i' and pd.api.types.is_integer_dtype(series.dtype) and len(series):
+                series = pd.to_numeric(series, downcast='integer')
+            self.values.append(series.to_numpy())
+        else:
+            self.series_values = pd.concat([self.series_values, series], ignore_index=True)
+
+    def series(self) -> pd.Series:
+        if self.kind == 'category':
+            dtype = pd.CategoricalDtype(self.categories)
+            values = pd.Categorical.from_codes(self.values.values, dtype=dtype, validate=False)
+        elif self.kind == 'binary':
+            n = len(self.values)
+            missing = self.missing.values
+            validity = pa.py_buffer(np.packbits(~missing, bitorder='little')) if missing.any() else None
+            array = pa.FixedSizeBinaryArray.from_buffers(pa.binary(self.width), n, [validity, pa.py_buffer(self.values.values)])
+            values = pd.arrays.ArrowExtensionArray(array)
+        elif self.kind == 'numpy':
+            # With the dtype given, object columns are taken as they are rather than scanned for dates
+            return pd.Series(self.values.values, name=self.name, dtype=self.values.dtype, copy=False)
+        else:
+            return self.series_values.rename(self.name)
+        return pd.Series(values, name=self.name, copy=False)
+
+
+def extend_compact(claims_df: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
+    """Append preprocessed rows to a compact claims table, encoding them like its columns"""
+    columns = {}
+    for name in claims_df.columns:
+        column = CompactColumn(name, claims_df[name])
+        column.extend(new_df[name])
+        columns[name] = column.series()
+    return pd.DataFrame(columns, copy=False)
+
+
+def decode_claims_column(name: str, series: pd.Series) -> pd.Series:
+    """Inverse of the compact encodings, applied only to the rows being returned"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return series.astype(object)
+    if isinstance(dtype, pd.ArrowDtype) and pa.types.is_fixed_size_binary(dtype.pyarrow_dtype):
+        width = dtype.pyarrow_dtype.byte_width
+        text = _decode_fixed(*_fixed_arrays(series.array.__arrow_array__().combine_chunks(), width), width)
+        return pd.Series(text, index=series.index, name=series.name, dtype=object)
+    if name == 'PRESCRIBER_NPI_NBR' and pd.api.types.is_integer_dtype(dtype):
+        return series.astype(str)
+    if pd.api.types.is_integer_dtype(dtype) and dtype != np.int64:
+        return series.astype(np.int64)
+    return series
+
+
+def memory_summary(report: pd.DataFrame, resident: List[str]) -> Dict[str, int]:
+    resident_after = report.loc[report['column'].isin(resident), 'after_bytes'].sum()
+    return {
+        'before_bytes': int(report['before_bytes'].sum()),
+        'after_bytes': int(report['after_bytes'].sum()),
+        'resident_bytes': int(resident_after),
+    }
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from growable import SortedRuns
+
+MISSING = np.iinfo(np.int64).min
+
+
+class DateIndex:
+    """Claims positions sorted by a date column, with a month directory over the sorted order.
+
+    The table itself keeps its original row order; a date window becomes two binary searches
+    (first over the month directory, then inside the boundary months) and one slice of the
+    sorted positions. Missing dates sort first and never fall inside a window. Appended
+    rows are kept in smaller sorted runs (see SortedRuns) that are searched directly; the
+    directory covers the largest run and is rebuilt only when appends are merged into it.
+    """
+
+    def __init__(self, dates: pd.Series):
+        values = self._values(dates)
+        self.size = len(values)
+        self.runs = SortedRuns(values, np.arange(len(values), dtype=np.int64))
+        self.counts = self._month_counts(values)
+        self._build_months()
+
+    @staticmethod
+    def _values(dates: pd.Series) -> np.ndarray:
+        return dates.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    @staticmethod
+    def _month_counts(values: np.ndarray) -> pd.Series:
+        months = values[values != MISSING].astype('datetime64[ns]').astype('datetime64[M]')
+        return pd.Series(months).value_counts(sort=False).sort_index()
+
+    def _build_months(self):
+        sorted_values, _ = self.runs.runs[0]
+        present = sorted_values[sorted_values != MISSING]
+        if len(present):
+            months = present.astype('datetime64[ns]').astype('datetime64[M]')
+            self.months, first = np.unique(months, return_index=True)
+            self.month_offsets = np.append(first, len(present)) + (len(sorted_values) - len(present))
+        else:
+            self.months = np.empty(0, dtype='datetime64[M]')
+            self.month_offsets = np.array([len(sorted_values)])
+
+    def extend(self, dates: pd.Series):
+        """Index dates of rows appended after the current end of the table"""
+        values = self._values(dates)
+        positions = np.arange(self.size, self.size + len(values), dtype=np.int64)
+        self.size += len(values)
+        self.counts = self.counts.add(self._month_counts(values), fill_value=0).astype(np.int64)
+        if self.runs.insert(values, positions):
+            self._build_months()
+
+    def month_counts(self) -> pd.Series:
+        """Rows per calendar month, usable as a date histogram"""
+        return pd.Series(self.counts.to_numpy(), index=self.counts.index.to_numpy().astype('datetime64[ns]'))
+
+    def _bound(self, value: np.int64, side: str) -> int:
+        month = np.datetime64(int(value), 'ns').astype('datetime64[M]')
+        m = np.searchsorted(self.months, month)
+        if m >= len(self.months) or self.months[m] != month:
+            # The bound falls in a month with no rows: it sits on that month's boundary
+            return int(self.month_offsets[m]) if m < len(self.months) else int(self.month_offsets[-1])
+        lo, hi = self.month_offsets[m], self.month_offsets[m + 1]
+        sorted_values, _ = self.runs.runs[0]
+        return int(lo + np.searchsorted(sorted_values[lo:hi], value, side=side))
+
+    def rows_between(self, start: datetime, end: datetime) -> np.ndarray:
+        """Positions with start <= date <= end, in table order"""
+        start_value = np.datetime64(start, 'ns').astype(np.int64)
+        end_value = np.datetime64(end, 'ns').astype(np.int64)
+        if end_value < start_value or self.counts.empty:
+            return np.empty(0, dtype=np.int64)
+        (_, order), *appended = self.runs.runs
+        windows = [order[self._bound(start_value, 'left'):self._bound(end_value, 'right')]]
+        for sorted_values, positions in appended:
+            lo = np.searchsorted(sorted_values, start_value, side='left')
+            hi = np.searchsorted(sorted_values, end_value, side='right')
+            windows.append(positions[lo:hi])
+        return np.sort(np.concatenate(windows))
+
+    def restrict(self, rows: np.ndarray, start: datetime, end: datetime) -> np.ndarray:
+        window = self.rows_between(start, end)
+        if len(rows) == self.size:
+            return window
+        return np.intersect1d(rows, window, assume_unique=True)
@@ -1,44 +1,335 @@
+import numpy as np
 import pandas as pd
 import json
 import ast
-from typing import Dict, List, Any, Optional
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple, Union
+from provider_index import ProviderIndex
+from claims_match import ClaimsMatcher
+from ngram_index import NgramMatcher
+from snapshot import SnapshotStore
+from join_index import NpiJoinIndex
+from date_index import DateIndex
+from optimizer import PlanOptimizer
+from rollups import PrescriberRollup, METRICS, ROLLUP_COLUMNS
+from result_cache import PlanResultCache, plan_cache_key
+from list_columns import EAGER_LIST_COLUMNS, LAZY_LIST_COLUMNS, decode_list_column, parse_list_cells, parse_list_column
+from compact import CompactColumn, compact_claims, decode_claims_column, extend_compact, memory_summary, referenced_claims_columns
+from claim_numbers import ClaimNumberIndex
+from tracing import Trace, span
+from topk import top_k, top_k_frame
 
 class PlanExecutor:
-    def __init__(self, csv_path: str = "data/providers.csv", claims_path: str = "data/Mounjaro Claim Sample.csv"):
-        self.hcp_df = pd.read_csv(csv_path)
-        self.claims_df = pd.read_csv(claims_path)
-        self._preprocess_data()
+    INDEXED_FILTERS = [
+        ('specialty_any', 'specialties'),
+        ('state_any', 'states'),
+        ('hospital_any', 'hospital_names'),
+        ('system_any', 'system_names'),
+        ('org_type_any', 'org_type'),
+    ]
+    MATCHED_CLAIMS_FILTERS = [
+        ('pharmacy_any', ['PHARMACY_NPI_NM']),
+        ('payer_any', ['PAYER_PAYER_NM']),
+        ('drug_any', ['NDC_GENERIC_NM', 'NDC_PREFERRED_BRAND_NM', 'NDC_DESC']),
+    ]
+    RANGE_FILTERS = [
+        ('publications_min', 'num_publications', np.greater_equal),
+        ('publications_max', 'num_publications', np.less_equal),
+        ('clinical_trials_min', 'num_clinical_trials', np.greater_equal),
+        ('has_linkedin', 'has_linkedin', np.equal),
+        ('has_twitter', 'has_twitter', np.equal),
+    ]
+    
+    INDEXED = dict(INDEXED_FILTERS)
+    MATCHED_CLAIMS = dict(MATCHED_CLAIMS_FILTERS)
+    RANGES = {key: (column, op) for key, column, op in RANGE_FILTERS}
+    
+    def __init__(self, csv_path: str = "data/providers.csv", claims_path: Optional[str] = "data/Mounjaro Claim Sample.csv",
+                 snapshot_dir: Optional[str] = ".snapshots", result_cache: Optional[PlanResultCache] = None):
+        self.snapshot_store = SnapshotStore(snapshot_dir) if snapshot_dir else None
+        self.result_cache = result_cache
+        self.data_version = None
+        self.snapshot_key = None
+        source_paths = [path for path in (csv_path, claims_path) if path]
+        
+        # Columns left on disk at load time; a projection that asks for one reads it from the snapshot
+        self.lazy_provider_columns: List[str] = []
+        self.lazy_claims_columns: List[str] = []
+        # Provider JSON array columns no filter reads stay text until first materialized
+        self.unparsed_list_columns: List[str] = []
+        # Lazy columns once read and list columns once parsed, per table. They are kept beside the
+        # tables rather than assigned into them: adding a column mutates a frame other threads are reading
+        self._materialized: Dict[str, Dict[str, pd.Series]] = {'providers': {}, 'claims': {}}
+        self._lazy_lock = threading.Lock()
+        # Lazy columns of appended rows, which the snapshot does not have, one frame per append
+        self._appended_lazy: List[pd.DataFrame] = []
+        # Claims columns as appended to, resident or materialized; created by the first append
+        self._growing_claims: Dict[str, CompactColumn] = {}
+        self._claim_numbers: Optional[ClaimNumberIndex] = None
+        
+        # Load stages happen once per executor, so they get their own trace rather than a query's
+        self.load_trace = Trace('load')
+        tables = None
+        if self.snapshot_store:
+            self.snapshot_key = self.data_version = self.snapshot_store.key_for(source_paths)
+            manifest = self.snapshot_store.manifest(self.snapshot_key)
+            if manifest is not None:
+                self.provider_columns = manifest['tables']['providers']['columns']
+                self.claims_columns = manifest['tables']['claims']['columns']
+                with self.load_trace.span('load:snapshot') as stage:
+                    tables = self.snapshot_store.load(self.snapshot_key, {
+                        'providers': self._resident_provider_columns(),
+                        'claims': self._resident_claims_columns(),
+                    })
+                    stage.output(len(tables['claims']) if tables else 0)
+        
+        if tables is not None:
+            self.hcp_df = tables['providers']
+            self.claims_df = tables['claims']
+            self.claims_memory = tables.get('claims_memory')
+            self.lazy_provider_columns = [col for col in self.provider_columns if col not in self.hcp_df.columns]
+            self.lazy_claims_columns = [col for col in self.claims_columns if col not in self.claims_df.columns]
+        else:
+            with self.load_trace.span('load:csv') as stage:
+                self.hcp_df = pd.read_csv(csv_path)
+                # Types come from whole columns, as streaming reads them (see scan_csv_dtypes), not per parser block
+                self.claims_df = pd.read_csv(claims_path, low_memory=False) if claims_path else pd.DataFrame()
+                stage.output(len(self.claims_df))
+            with self.load_trace.span('preprocess', rows_in=len(self.claims_df)) as stage:
+                self._preprocess_data()
+                stage.output(self.claims_df)
+            self.provider_columns = list(self.hcp_df.columns)
+            self.claims_columns = list(self.claims_df.columns)
+            with self.load_trace.span('snapshot:save'):
+                saved = self.snapshot_store is not None and self.snapshot_store.save(
+                    self.snapshot_key,
+                    {'providers': self.hcp_df, 'claims': self.claims_df, 'claims_memory': self.claims_memory},
+                    source_paths,
+                )
+            if saved:
+                # Columns no filter, join or rollup reads are re-read from the snapshot if a projection asks for them
+                resident = self._resident_provider_columns()
+                self.lazy_provider_columns = [col for col in self.provider_columns if col not in resident]
+                self.hcp_df = self.hcp_df[resident]
+                resident = self._resident_claims_columns()
+                self.lazy_claims_columns = [col for col in self.claims_columns if col not in resident]
+                self.claims_df = self.claims_df[resident]
+        
+        if self.data_version is None:
+            self.data_version = uuid.uuid4().hex
+        self.unparsed_list_columns = [col for col in LAZY_LIST_COLUMNS if col in self.provider_columns]
+        
+        with self.load_trace.span('build_indexes'):
+            self._build_indexes()
     
     def _preprocess_data(self):
         self.hcp_df['name'] = self.hcp_df['first_name'] + ' ' + self.hcp_df['last_name']
         self.hcp_df['npi'] = self.hcp_df['type_1_npi'].astype(str)
         
-        array_columns = ['specialties', 'states', 'hospital_names', 'system_names']
-        for col in array_columns:
+        for col in EAGER_LIST_COLUMNS:
             if col in self.hcp_df.columns:
-                self.hcp_df[col] = self.hcp_df[col].apply(self._parse_array_string)
+                self.hcp_df[col] = parse_list_column(self.hcp_df[col])
         
-        if not self.claims_df.empty:
-            date_columns = ['SERVICE_DATE_DD', 'DATE_PRESCRIPTION_WRITTEN_DD']
-            for col in date_columns:
-                if col in self.claims_df.columns:
-                    self.claims_df[col] = pd.to_datetime(self.claims_df[col], errors='coerce')
-            
-            if 'PRESCRIBER_NPI_NBR' in self.claims_df.columns:
-                self.claims_df['PRESCRIBER_NPI_NBR'] = self.claims_df['PRESCRIBER_NPI_NBR'].fillna(0).astype(float).astype(int).astype(str)
-                self.claims_df = self.claims_df[self.claims_df['PRESCRIBER_NPI_NBR'] != '0']
+        self.claims_df, self.claims_memory = compact_claims(self._preprocess_claims(self.claims_df))
     
-    def _parse_array_string(self, value) -> List[str]:
-        if pd.isna(value) or value == '':
-            return []
-        try:
-            if isinstance(value, str):
-                return json.loads(value)
-            return value if isinstance(value, list) else []
-        except:
+    def _resident_provider_columns(self) -> List[str]:
+        referenced = {'name', 'npi'} | set(ProviderIndex.ARRAY_COLUMNS + ProviderIndex.SCALAR_COLUMNS) | \
+            {column for column, _ in self.RANGES.values()}
+        return [col for col in self.provider_columns if col in referenced]
+    
+    def _resident_claims_columns(self) -> List[str]:
+        referenced = referenced_claims_columns()
+        return [col for col in self.claims_columns if col in referenced]
+    
+    def _load_lazy_claims_columns(self, columns: List[str]):
+        with self._lazy_lock:
+            missing = [col for col in columns if col in self.lazy_claims_columns]
+            if not missing:
+                return
+            loaded = self.snapshot_store.read_columns(self.snapshot_key, 'claims', missing)
+            if self._appended_lazy:
+                loaded = extend_compact(loaded, pd.concat([appended[missing] for appended in self._appended_lazy], ignore_index=True))
+                self._appended_lazy = [appended.drop(columns=missing) for appended in self._appended_lazy]
+            for col in missing:
+                self._materialized['claims'][col] = pd.Series(loaded[col].array, index=self.claims_df.index, name=col)
+            self.lazy_claims_columns = [col for col in self.lazy_claims_columns if col not in missing]
+    
+    def _load_lazy_provider_columns(self, columns: List[str]):
+        with self._lazy_lock:
+            missing = [col for col in columns if col in self.lazy_provider_columns]
+            if not missing:
+                return
+            loaded = self.snapshot_store.read_columns(self.snapshot_key, 'providers', missing)
+            for col in missing:
+                self._materialized['providers'][col] = pd.Series(loaded[col].array, index=self.hcp_df.index, name=col)
+            self.lazy_provider_columns = [col for col in self.lazy_provider_columns if col not in missing]
+    
+    def _parse_list_columns(self, columns: List[str], rows: int):
+        """Parse whole lazy list columns once a take needs most of their rows; smaller takes parse just their cells"""
+        if 2 * rows < len(self.hcp_df):
+            return
+        with self._lazy_lock:
+            unparsed = [col for col in columns if col in self.unparsed_list_columns]
+            for col in unparsed:
+                self._materialized['providers'][col] = parse_list_column(self._stored_column('providers', col))
+            self.unparsed_list_columns = [col for col in self.unparsed_list_columns if col not in unparsed]
+    
+    def _stored_column(self, table: str, col: str) -> pd.Series:
+        """A column of a loaded table, whether resident since load or materialized since"""
+        materialized = self._materialized[table].get(col)
+        if materialized is not None:
+            return materialized
+        return (self.claims_df if table == 'claims' else self.hcp_df)[col]
+    
+    def memory_report(self) -> Optional[pd.DataFrame]:
+        """Bytes per claims column as plain pandas objects vs. compact encoding, and whether it is resident"""
+        if self.claims_memory is None:
+            return None
+        report = self.claims_memory.copy()
+        report['resident'] = report['column'].isin(list(self.claims_df.columns) + list(self._materialized['claims']))
+        return report
+    
+    def memory_text(self) -> str:
+        """memory_report as a table, followed by its totals"""
+        report = self.memory_report()
+        if report is None or report.empty:
+            return "No claims table is loaded"
+        totals = memory_summary(report, report.loc[report['resident'], 'column'].tolist())
+        mib = lambda size: f"{size / 2 ** 20:,.1f} MiB"
+        return '\n'.join([
+            report.to_string(index=False),
+            f"claims: {mib(totals['before_bytes'])} as plain pandas objects, {mib(totals['after_bytes'])} compact, "
+            f"{mib(totals['resident_bytes'])} resident",
+        ])
+    
+    @staticmethod
+    def _preprocess_claims(claims_df: pd.DataFrame) -> pd.DataFrame:
+        """Normalize a claims frame (the whole file, or one chunk of it when streaming)"""
+        if claims_df.empty:
+            return claims_df
+        
+        date_columns = ['SERVICE_DATE_DD', 'DATE_PRESCRIPTION_WRITTEN_DD']
+        for col in date_columns:
+            if col in claims_df.columns:
+                claims_df[col] = pd.to_datetime(claims_df[col], errors='coerce')
+        
+        if 'PRESCRIBER_NPI_NBR' in claims_df.columns:
+            claims_df['PRESCRIBER_NPI_NBR'] = claims_df['PRESCRIBER_NPI_NBR'].fillna(0).astype(float).astype(int).astype(str)
+            claims_df = claims_df[claims_df['PRESCRIBER_NPI_NBR'] != '0'].reset_index(drop=True)
+        
+        return claims_df
+    
+    def _build_indexes(self):
+        self.provider_index = ProviderIndex(self.hcp_df)
+        self.name_matcher = NgramMatcher(self.hcp_df['name'])
+        self.claims_matcher = ClaimsMatcher(self.claims_df)
+        self.date_index = None
+        if 'SERVICE_DATE_DD' in self.claims_df.columns:
+            self.date_index = DateIndex(self.claims_df['SERVICE_DATE_DD'])
+        self.join_index = None
+        if 'PRESCRIBER_NPI_NBR' in self.claims_df.columns:
+            self.join_index = NpiJoinIndex(self.hcp_df['npi'], self.claims_df['PRESCRIBER_NPI_NBR'])
+        self.rollup = None
+        if self.join_index is not None:
+            self.rollup = PrescriberRollup(self.claims_df, self.join_index.claims_codes, len(self.join_index.keys))
+        self.optimizer = PlanOptimizer(self)
+    
+    def append_claims(self, claims: Union[str, pd.DataFrame]) -> int:
+        """Merge new claims (a CSV path or a raw frame) into the loaded table and its indexes in place.
+        
+        Only the new rows are parsed, normalized and encoded, and the columns and indexes
+        grow by them without being rebuilt, so an append costs its batch rather than the
+        table (amortized). Rows whose RX_CLAIM_NBR is already loaded, or repeats earlier
+        in the batch, are dropped. The data version changes, so
+        cached results are invalidated. Appends must not run concurrently with queries.
+        Returns the number of claims added.
+        """
+        if not self.claims_columns:
+            raise ValueError("No claims table is loaded to append to")
+        
+        if isinstance(claims, str):
+            # Parse text columns as text: a batch where one happens to look numeric must not come back as floats
+            new_df = pd.read_csv(claims, dtype={col: str for col in self._text_claims_columns()})
+        else:
+            new_df = claims.copy()
+        new_df = self._preprocess_claims(new_df.reindex(columns=self.claims_columns).reset_index(drop=True))
+        received = len(new_df)
+        
+        if 'RX_CLAIM_NBR' in new_df.columns and received:
+            numbers = new_df['RX_CLAIM_NBR']
+            keep = (~numbers.duplicated() | numbers.isna()).to_numpy() & ~self._claim_number_index().contains(numbers)
+            new_df = new_df[keep].reset_index(drop=True)
+        
+        if new_df.empty:
+            print(f"📥 No new claims to append ({received} already loaded)")
+            return 0
+        
+        start = len(self.claims_df)
+        with self._lazy_lock:
+            # Columns grow in place past their current rows, so the append copies the new rows only
+            resident, materialized = list(self.claims_df.columns), list(self._materialized['claims'])
+            for col in resident + materialized:
+                if col not in self._growing_claims:
+                    self._growing_claims[col] = CompactColumn(col, self._stored_column('claims', col))
+                self._growing_claims[col].extend(new_df[col])
+            self.claims_df = pd.DataFrame({col: self._growing_claims[col].series() for col in resident}, copy=False)
+            self._materialized['claims'] = {col: self._growing_claims[col].series() for col in materialized}
+            if self.lazy_claims_columns:
+                self._appended_lazy.append(new_df[self.lazy_claims_columns])
+        self._extend_indexes(start)
+        
+        self.data_version = uuid.uuid4().hex
+        print(f"📥 Appended {len(new_df)} claims ({received - len(new_df)} duplicates skipped)")
+        return len(new_df)
+    
+    def _text_claims_columns(self) -> List[str]:
+        if self.claims_memory is None:
             return []
+        text = self.claims_memory['encoding'].isin(['category', 'object']) | self.claims_memory['encoding'].str.startswith('binary')
+        return self.claims_memory.loc[text, 'column'].tolist()
+    
+    def _claim_number_index(self) -> ClaimNumberIndex:
+        # Built on the first append; most executors never need it
+        if self._claim_numbers is None:
+            self._load_lazy_claims_columns(['RX_CLAIM_NBR'])
+            self._claim_numbers = ClaimNumberIndex(self._claim_numbers_at(self._all_rows(self.claims_df)), self._claim_numbers_at)
+        return self._claim_numbers
+    
+    def _claim_numbers_at(self, rows: np.ndarray) -> pd.Series:
+        return decode_claims_column('RX_CLAIM_NBR', self._stored_column('claims', 'RX_CLAIM_NBR').take(rows))
+    
+    def _extend_indexes(self, start: int):
+        """Bring the claims indexes up to date with rows appended from `start` on"""
+        new_rows = self.claims_df.iloc[start:]
+        self.claims_matcher.extend(new_rows)
+        if self.date_index is not None:
+            self.date_index.extend(new_rows['SERVICE_DATE_DD'])
+        if self.join_index is not None:
+            self.join_index.extend_claims(new_rows['PRESCRIBER_NPI_NBR'])
+            self.rollup.extend(new_rows, self.join_index.claims_codes, len(self.join_index.keys))
+        if self._claim_numbers is not None:
+            self._claim_numbers.extend(self._claim_numbers_at(np.arange(start, len(self.claims_df))))
+        self.optimizer.stats.extend_claims(self, start)
     
     def execute_plan(self, plan: Dict[str, Any]) -> pd.DataFrame:
+        """Run a plan; its stages are recorded into the caller's active trace, if any (see Trace.run)"""
+        with span('execute', query_type=plan.get('query_type', 'hcp')) as stage:
+            if self.result_cache is None:
+                return stage.output(self._execute_uncached(plan))
+            
+            key = plan_cache_key(plan)
+            with span('result_cache') as lookup:
+                result_df = self.result_cache.get(key, self.data_version)
+                lookup.set(hit=result_df is not None)
+            if result_df is None:
+                result_df = self._execute_uncached(plan)
+                self.result_cache.put(key, self.data_version, result_df)
+            # Hand out copies so callers cannot mutate what later hits will return
+            return stage.output(result_df.copy())
+    
+    def _execute_uncached(self, plan: Dict[str, Any]) -> pd.DataFrame:
         query_type = plan.get('query_type', 'hcp')
         
         if query_type == 'claims_by_doctor':
@@ -47,242 +338,445 @@ class PlanExecutor:
             return self._execute_claims_only(plan)
         elif query_type == 'hcp_with_claims':
             return self._execute_hcp_with_claims(plan)
+        elif query_type in ('hcp_with_claims_metrics', 'aggregate'):
+            return self._execute_hcp_with_claims_metrics(plan)
         else:
-            result_df = self.hcp_df.copy()
+            rows = self._all_rows(self.hcp_df)
             
             if plan.get('filters'):
-                result_df = self._apply_filters(result_df, plan['filters'])
-            
-            if plan.get('projection'):
-                result_df = self._apply_projection(result_df, plan['projection'])
+                rows = self._apply_filters(rows, plan['filters'])
             
-            if plan.get('order_by'):
-                result_df = self._apply_ordering(result_df, plan['order_by'])
-            
-            if plan.get('limit'):
-                result_df = result_df.head(plan['limit'])
-            
-            return result_df
+            return self._materialize(self.hcp_df, rows, plan)
     
     def _execute_claims_by_doctor(self, plan: Dict[str, Any]) -> pd.DataFrame:
-        print(f"🔍 Looking for doctor with filters: {plan.get('filters')}")
-        
-        hcp_df = self.hcp_df.copy()
-        
-        if plan.get('filters'):
-            hcp_df = self._apply_filters(hcp_df, plan['filters'])
+        predicates = self.optimizer.predicates(plan)
+        hcp_rows = self._resolve_doctors(plan, predicates['providers'])
+        if len(hcp_rows) == 0:
+            return pd.DataFrame()
         
-        print(f"📋 Found {len(hcp_df)} matching doctors in HCP data")
+        if self.join_index is not None and plan.get('claims_filters') and self.optimizer.join_side(plan, predicates) == 'claims':
+            # Filtering the whole claims table (e.g. one date-index slice) beats gathering these doctors' claims first
+            print(f"💊 Found {self.join_index.claims_count_for(hcp_rows)} claims for these doctors")
+            rows = self._apply_claims_filters(self._all_rows(self.claims_df), plan['claims_filters'],
+                                              predicates=predicates['claims'])
+            with span('join:claims_of_doctors', rows_in=len(rows)) as stage:
+                rows = stage.output(self.join_index.claims_of(rows, hcp_rows))
+            print(f"🔍 After claims filtering: {len(rows)} claims")
+            return self._materialize(self.claims_df, rows, plan)
         
-        if hcp_df.empty:
-            print("❌ No doctors found matching the criteria")
-            return pd.DataFrame()
+        rows = self._all_rows(self.claims_df)
+        if self.join_index is not None:
+            with span('join:claims_rows_for', rows_in=len(hcp_rows)) as stage:
+                rows = stage.output(self.join_index.claims_rows_for(hcp_rows))
         
-        if len(hcp_df) <= 5:
-            for _, doctor in hcp_df.iterrows():
-                print(f"   - {doctor['name']} (NPI: {doctor['npi']})")
+        print(f"💊 Found {len(rows)} claims for these doctors")
         
-        doctor_npis = hcp_df['npi'].tolist()
-        print(f"🔗 Looking for claims with NPIs: {doctor_npis}")
+        if plan.get('claims_filters'):
+            rows = self._apply_claims_filters(rows, plan['claims_filters'], predicates=predicates['claims'])
+            print(f"🔍 After claims filtering: {len(rows)} claims")
         
-        result_df = self.claims_df.copy()
-        if 'PRESCRIBER_NPI_NBR' in result_df.columns:
-            result_df = result_df[result_df['PRESCRIBER_NPI_NBR'].isin(doctor_npis)]
+        return self._materialize(self.claims_df, rows, plan)
+    
+    def _resolve_doctors(self, plan: Dict[str, Any], predicates: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+        """Provider rows a claims_by_doctor plan refers to"""
+        print(f"🔍 Looking for doctor with filters: {plan.get('filters')}")
         
-        print(f"💊 Found {len(result_df)} claims for these doctors")
+        hcp_rows = self._all_rows(self.hcp_df)
         
-        if plan.get('claims_filters'):
-            result_df = self._apply_claims_filters(result_df, plan['claims_filters'])
-            print(f"🔍 After claims filtering: {len(result_df)} claims")
+        if plan.get('filters'):
+            hcp_rows = self._apply_filters(hcp_rows, plan['filters'], predicates)
+        
+        print(f"📋 Found {len(hcp_rows)} matching doctors in HCP data")
+        
+        names = (plan.get('filters') or {}).get('name_contains')
+        approximate = bool((plan.get('filters') or {}).get('approximate_names'))
+        if len(hcp_rows) == 0 and names and approximate and not self.name_matcher.match_table(names).any():
+            # No provider name contains it, most likely a misspelling: retry with the closest names
+            filters = {key: value for key, value in plan['filters'].items() if key != 'name_contains'}
+            hcp_rows = self._all_rows(self.hcp_df)
+            hcp_rows = hcp_rows[self.name_matcher.closest_mask(names, hcp_rows)]
+            if len(hcp_rows) and filters:
+                rest = None if predicates is None else [p for p in predicates if p['filter'] != 'name_contains']
+                hcp_rows = self._apply_filters(hcp_rows, filters, rest)
+            print(f"🔤 No name contains {names}; {len(hcp_rows)} doctors with the closest names")
+        
+        if len(hcp_rows) == 0:
+            print("❌ No doctors found matching the criteria")
+            return hcp_rows
         
-        if plan.get('projection'):
-            result_df = self._apply_projection(result_df, plan['projection'])
-        if plan.get('order_by'):
-            result_df = self._apply_ordering(result_df, plan['order_by'])
-        if plan.get('limit'):
-            result_df = result_df.head(plan['limit'])
+        if len(hcp_rows) <= 5:
+            for _, doctor in self.hcp_df.iloc[hcp_rows][['name', 'npi']].iterrows():
+                print(f"   - {doctor['name']} (NPI: {doctor['npi']})")
         
-        return result_df
+        print(f"🔗 Looking for claims with NPIs: {self.hcp_df['npi'].to_numpy()[hcp_rows].tolist()}")
+        return hcp_rows
     
     def _execute_claims_only(self, plan: Dict[str, Any]) -> pd.DataFrame:
         """Execute claims-only query"""
-        result_df = self.claims_df.copy()
+        rows = self._all_rows(self.claims_df)
         
         if plan.get('claims_filters'):
-            result_df = self._apply_claims_filters(result_df, plan['claims_filters'])
-        
-        if plan.get('projection'):
-            result_df = self._apply_projection(result_df, plan['projection'])
-        if plan.get('order_by'):
-            result_df = self._apply_ordering(result_df, plan['order_by'])
-        if plan.get('limit'):
-            result_df = result_df.head(plan['limit'])
+            rows = self._apply_claims_filters(rows, plan['claims_filters'])
         
-        return result_df
+        return self._materialize(self.claims_df, rows, plan)
     
     def _execute_hcp_with_claims(self, plan: Dict[str, Any]) -> pd.DataFrame:
-        """Intelligently find claims first, then return matching doctors"""
+        """Join providers and claims from whichever side the optimizer expects to be cheaper"""
+        predicates = self.optimizer.predicates(plan)
+        if self.join_index is not None and self.optimizer.join_side(plan, predicates) == 'providers':
+            return self._execute_hcp_with_claims_from_providers(plan, predicates)
+        
         print(f"🔍 Looking for claims with filters: {plan.get('claims_filters')}")
         
-        claims_df = self.claims_df.copy()
+        claims_rows = self._all_rows(self.claims_df)
         if plan.get('claims_filters'):
-            claims_df = self._apply_claims_filters(claims_df, plan['claims_filters'])
+            claims_rows = self._apply_claims_filters(claims_rows, plan['claims_filters'], predicates=predicates['claims'])
         
-        print(f"💊 Found {len(claims_df)} matching claims")
+        print(f"💊 Found {len(claims_rows)} matching claims")
         
-        if claims_df.empty:
+        if len(claims_rows) == 0:
             print("❌ No claims found matching the criteria")
             return pd.DataFrame()
         
-        if 'PRESCRIBER_NPI_NBR' in claims_df.columns:
-            prescriber_npis = claims_df['PRESCRIBER_NPI_NBR'].unique()
-            print(f"🔗 Found {len(prescriber_npis)} unique prescriber NPIs")
+        if self.join_index is not None:
+            with span('join:prescriber_codes', rows_in=len(claims_rows)) as stage:
+                prescriber_codes = stage.output(self.join_index.prescriber_codes(claims_rows))
+            print(f"🔗 Found {len(prescriber_codes)} unique prescriber NPIs")
         else:
             print("❌ No prescriber NPI column in claims data")
             return pd.DataFrame()
         
-        result_df = self.hcp_df.copy()
-        result_df = result_df[result_df['npi'].isin(prescriber_npis)]
-        print(f"👨‍⚕️ Found {len(result_df)} doctors with matching claims")
+        with span('join:hcp_rows_for_codes', rows_in=len(prescriber_codes)) as stage:
+            rows = stage.output(self.join_index.hcp_rows_for_codes(prescriber_codes))
+        print(f"👨‍⚕️ Found {len(rows)} doctors with matching claims")
+        
+        if plan.get('filters'):
+            rows = self._apply_filters(rows, plan['filters'], predicates['providers'])
+            print(f"🔍 After HCP filtering: {len(rows)} doctors")
+        
+        return self._materialize(self.hcp_df, rows, plan)
+    
+    def _execute_hcp_with_claims_from_providers(self, plan: Dict[str, Any],
+                                                predicates: Dict[str, List[Dict[str, Any]]]) -> pd.DataFrame:
+        """Filter doctors first, then keep those with at least one matching claim"""
+        print(f"🔍 Looking for doctors with filters: {plan.get('filters')}")
         
+        rows = self._all_rows(self.hcp_df)
         if plan.get('filters'):
-            result_df = self._apply_filters(result_df, plan['filters'])
-            print(f"🔍 After HCP filtering: {len(result_df)} doctors")
+            rows = self._apply_filters(rows, plan['filters'], predicates['providers'])
+        
+        with span('join:claims_rows_for', rows_in=len(rows)) as stage:
+            claims_rows = stage.output(self.join_index.claims_rows_for(rows))
+        print(f"💊 Found {len(claims_rows)} claims for {len(rows)} doctors")
+        
+        if plan.get('claims_filters'):
+            claims_rows = self._apply_claims_filters(claims_rows, plan['claims_filters'], predicates=predicates['claims'])
+            print(f"🔍 After claims filtering: {len(claims_rows)} claims")
+        
+        with span('join:hcp_rows_with_codes', rows_in=len(rows)) as stage:
+            rows = stage.output(self.join_index.hcp_rows_with_codes(rows, self.join_index.prescriber_codes(claims_rows)))
+        print(f"👨‍⚕️ Found {len(rows)} doctors with matching claims")
+        
+        if len(rows) == 0:
+            # Claims-first returns a frame without columns when no claim at all matches; keep that shape
+            all_claims = self._all_rows(self.claims_df)
+            if plan.get('claims_filters'):
+                all_claims = self._apply_claims_filters(all_claims, plan['claims_filters'], predicates=predicates['claims'])
+            if len(all_claims) == 0:
+                print("❌ No claims found matching the criteria")
+                return pd.DataFrame()
+        
+        return self._materialize(self.hcp_df, rows, plan)
+    
+    def _execute_hcp_with_claims_metrics(self, plan: Dict[str, Any]) -> pd.DataFrame:
+        """Doctors with matching claims, plus per-prescriber volume, patients and paid amounts over those claims"""
+        if self.rollup is None:
+            print("❌ No prescriber NPI column in claims data")
+            return pd.DataFrame()
         
+        claims_filters = plan.get('claims_filters')
+        predicates = self.optimizer.predicates(plan)
+        if claims_filters and self.optimizer.join_side(plan, predicates) == 'claims':
+            claims_rows = self._apply_claims_filters(self._all_rows(self.claims_df), claims_filters,
+                                                     predicates=predicates['claims'])
+            with span('rollup', rows_in=len(claims_rows)):
+                metrics = self.rollup.metrics(claims_rows)
+            with span('join:hcp_rows_for_codes') as stage:
+                rows = stage.output(self.join_index.hcp_rows_for_codes(np.flatnonzero(metrics['total_prescriptions'])))
+            if plan.get('filters'):
+                rows = self._apply_filters(rows, plan['filters'], predicates['providers'])
+        else:
+            rows = self._all_rows(self.hcp_df)
+            if plan.get('filters'):
+                rows = self._apply_filters(rows, plan['filters'], predicates['providers'])
+            if claims_filters:
+                with span('join:claims_rows_for', rows_in=len(rows)) as stage:
+                    claims_rows = stage.output(self.join_index.claims_rows_for(rows))
+                claims_rows = self._apply_claims_filters(claims_rows, claims_filters, predicates=predicates['claims'])
+                with span('rollup', rows_in=len(claims_rows)):
+                    metrics = self.rollup.metrics(claims_rows)
+            else:
+                # Without claims filters the totals computed at load time apply as they are
+                metrics = self.rollup.totals
+        
+        return self._metrics_result(plan, rows, metrics, self.join_index.hcp_codes)
+    
+    def _metrics_result(self, plan: Dict[str, Any], rows: np.ndarray, metrics: Dict[str, np.ndarray],
+                        hcp_codes: np.ndarray) -> pd.DataFrame:
+        """Provider rows with at least one matching claim, with their metrics (indexed by each row's NPI code)"""
+        rows = rows[metrics['total_prescriptions'][hcp_codes[rows]] > 0]
+        print(f"👨‍⚕️ Found {len(rows)} doctors with matching claims")
+        
+        # Metric columns line up with provider rows through each provider's NPI code; they are
+        # handed to _materialize as extra columns rather than joined onto the whole provider table
+        with span('join:metrics'):
+            metric_columns = {name: metrics[name][hcp_codes] for name in METRICS}
+        
+        if not plan.get('order_by'):
+            plan = dict(plan, order_by=['total_prescriptions DESC'])
+        return self._materialize(self.hcp_df, rows, plan, metric_columns)
+    
+    def _plan_columns(self, plan: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Columns of each table a plan reads: filters, join keys, rollup inputs, order_by and projection"""
+        query_type = plan.get('query_type', 'hcp')
+        wanted = {'providers': [], 'claims': []}
+        
+        for filter_key, value in (plan.get('filters') or {}).items():
+            if value is None or (isinstance(value, list) and not value):
+                continue
+            if filter_key == 'name_contains':
+                wanted['providers'].append('name')
+            elif filter_key in self.INDEXED:
+                wanted['providers'].append(self.INDEXED[filter_key])
+            elif filter_key in self.RANGES:
+                wanted['providers'].append(self.RANGES[filter_key][0])
+        for filter_key, value in (plan.get('claims_filters') or {}).items():
+            if value is None or (isinstance(value, list) and not value):
+                continue
+            if filter_key == 'date_range_months':
+                wanted['claims'].append('SERVICE_DATE_DD')
+            elif filter_key in self.MATCHED_CLAIMS:
+                wanted['claims'].extend(self.MATCHED_CLAIMS[filter_key])
+        
+        if query_type != 'claims_only':
+            # Every other query type resolves doctors or joins them to claims by NPI
+            wanted['providers'].append('npi')
+        if query_type != 'hcp':
+            wanted['claims'].append('PRESCRIBER_NPI_NBR')
+        if query_type in ('hcp_with_claims_metrics', 'aggregate'):
+            wanted['claims'].extend(ROLLUP_COLUMNS)
+        
+        output = 'claims' if query_type in ('claims_by_doctor', 'claims_only') else 'providers'
+        schemas = {'providers': self.provider_columns, 'claims': self.claims_columns}
+        wanted[output].extend(plan.get('projection') or schemas[output])
+        wanted[output].extend(col for col, _ in self._sort_specs(plan.get('order_by') or []))
+        
+        wanted = {table: set(columns) for table, columns in wanted.items()}
+        return {table: [col for col in schemas[table] if col in wanted[table]] for table in schemas}
+    
+    def explain(self, plan: Dict[str, Any]) -> str:
+        """The optimizer's chosen join side, predicate order and row estimates for a plan, and the columns it reads"""
+        lines = [self.optimizer.explain(plan)]
+        lazy = {'providers': self.lazy_provider_columns, 'claims': self.lazy_claims_columns}
+        on_disk = False
+        for table, columns in self._plan_columns(plan).items():
+            if columns:
+                listed = ', '.join(f"{col}*" if col in lazy[table] else col for col in columns)
+                lines.append(f"  reads {table:<9} {listed}")
+                on_disk = on_disk or any(col in lazy[table] for col in columns)
+        if on_disk:
+            lines.append("  (* not resident, read from the snapshot when materialized)")
+        return '\n'.join(lines)
+    
+    @staticmethod
+    def _all_rows(df: pd.DataFrame) -> np.ndarray:
+        return np.arange(len(df), dtype=np.int64)
+    
+    def _apply_claims_filters(self, rows: np.ndarray, filters: Dict[str, Any],
+                              claims_df: Optional[pd.DataFrame] = None,
+                              claims_matcher: Optional[ClaimsMatcher] = None,
+                              now: Optional[datetime] = None,
+                              predicates: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+        """Narrow positional claims rows; nothing is copied out of the claims table.
+        
+        claims_df/claims_matcher default to the loaded table; streaming passes each chunk instead.
+        predicates are the optimizer's estimates for these filters, if the plan already has them.
+        """
+        date_index = None
+        full_table = False
+        if claims_df is None:
+            claims_df, claims_matcher, date_index = self.claims_df, self.claims_matcher, self.date_index
+            full_table = len(rows) == len(claims_df)
+        
+        order = self.optimizer.order_claims_filters(filters, len(rows), full_table, predicates)
+        return self._run_claims_filters(rows, order, filters, claims_df, claims_matcher, date_index, now)
+    
+    @classmethod
+    def _run_claims_filters(cls, rows: np.ndarray, order: List[str], filters: Dict[str, Any],
+                            claims_df: pd.DataFrame, claims_matcher: ClaimsMatcher,
+                            date_index: Optional[DateIndex], now: Optional[datetime]) -> np.ndarray:
+        """Apply the claims filters in the given order. claims_df is only read for its columns
+        and, when there is no date index, its service dates."""
+        for filter_key in order:
+            with span(f"claims_filter:{filter_key}", rows_in=len(rows)) as stage:
+                if filter_key == 'date_range_months':
+                    if 'SERVICE_DATE_DD' not in claims_df.columns:
+                        continue
+                    end_date = now or datetime.now()
+                    start_date = end_date - timedelta(days=filters['date_range_months'] * 30)
+                    
+                    if date_index is not None:
+                        rows = date_index.restrict(rows, start_date, end_date)
+                    else:
+                        dates = claims_df['SERVICE_DATE_DD'].to_numpy()[rows]
+                        rows = rows[(dates >= np.datetime64(start_date)) & (dates <= np.datetime64(end_date))]
+                else:
+                    present = [col for col in cls.MATCHED_CLAIMS[filter_key] if col in claims_df.columns]
+                    if present:
+                        rows = rows[claims_matcher.mask_any(present, filters[filter_key], rows)]
+                stage.output(rows)
+        
+        return rows
+    
+    def _apply_filters(self, rows: np.ndarray, filters: Dict[str, Any],
+                       predicates: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+        """Narrow positional provider rows; nothing is copied out of self.hcp_df"""
+        approximate = bool(filters.get('approximate_names'))
+        for filter_key in self.optimizer.order_provider_filters(filters, len(rows), predicates):
+            value = filters[filter_key]
+            with span(f"filter:{filter_key}", rows_in=len(rows)) as stage:
+                if filter_key == 'name_contains':
+                    rows = rows[self.name_matcher.mask(value, rows)]
+                elif filter_key in self.INDEXED:
+                    column = self.INDEXED[filter_key]
+                    resolved = self.provider_index.resolve(column, value, approximate)
+                    if approximate and sorted(resolved) != sorted(str(v).lower() for v in value):
+                        print(f"🔤 No exact {column} entry for some of {value}; matching {resolved[:5]}"
+                              f"{f' and {len(resolved) - 5} more' if len(resolved) > 5 else ''}")
+                    mask = self.provider_index.mask_any(column, resolved)
+                    rows = rows[mask[rows]]
+                else:
+                    column, op = self.RANGES[filter_key]
+                    rows = rows[op(self.hcp_df[column].to_numpy()[rows], value)]
+                stage.output(rows)
+        
+        return rows
+    
+    def _materialize(self, df: pd.DataFrame, rows: np.ndarray, plan: Dict[str, Any],
+                     extra: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+        """Order and limit positional rows on their sort keys, then copy out only the projected cells.
+        
+        `extra` holds computed columns (one value per row of df) that behave as if joined onto df.
+        Sort keys are read whether or not they are projected.
+        """
+        schema = self._columns_of(df) + list(extra or {})
+        columns = schema
         if plan.get('projection'):
-            result_df = self._apply_projection(result_df, plan['projection'])
+            columns = self._apply_projection(schema, plan['projection'])
+        
         if plan.get('order_by'):
-            result_df = self._apply_ordering(result_df, plan['order_by'])
+            specs = [(col, ascending) for col, ascending in self._sort_specs(plan['order_by']) if col in schema]
+            if specs:
+                with span('order', rows_in=len(rows), keys=[col for col, _ in specs]) as stage:
+                    rows = stage.output(self._order_rows(df, rows, specs, plan.get('limit'), extra))
+        
         if plan.get('limit'):
-            result_df = result_df.head(plan['limit'])
+            with span('limit', rows_in=len(rows)) as stage:
+                rows = stage.output(rows[:plan['limit']])
         
-        return result_df
+        with span('project', rows_in=len(rows), columns=len(columns)) as stage:
+            return stage.output(self._take(df, rows, columns, extra))
     
-    def _apply_claims_filters(self, df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
-        result_df = df.copy()
-        
-        if filters.get('pharmacy_any'):
-            if 'PHARMACY_NPI_NM' in result_df.columns:
-                mask = result_df['PHARMACY_NPI_NM'].apply(
-                    lambda x: any(pharm.lower() in str(x).lower() for pharm in filters['pharmacy_any']) if pd.notna(x) else False
-                )
-                result_df = result_df[mask]
-        
-        if filters.get('payer_any'):
-            if 'PAYER_PAYER_NM' in result_df.columns:
-                mask = result_df['PAYER_PAYER_NM'].apply(
-                    lambda x: any(payer.lower() in str(x).lower() for payer in filters['payer_any']) if pd.notna(x) else False
-                )
-                result_df = result_df[mask]
-        
-        if filters.get('drug_any'):
-            drug_columns = ['NDC_GENERIC_NM', 'NDC_PREFERRED_BRAND_NM', 'NDC_DESC']
-            mask = pd.Series(False, index=result_df.index)
-            for col in drug_columns:
-                if col in result_df.columns:
-                    col_mask = result_df[col].apply(
-                        lambda x: any(drug.lower() in str(x).lower() for drug in filters['drug_any']) if pd.notna(x) else False
-                    )
-                    mask |= col_mask
-            result_df = result_df[mask]
-        
-        if filters.get('date_range_months'):
-            from datetime import datetime, timedelta
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=filters['date_range_months'] * 30)
-            
-            if 'SERVICE_DATE_DD' in result_df.columns:
-                result_df = result_df[
-                    (result_df['SERVICE_DATE_DD'] >= start_date) & 
-                    (result_df['SERVICE_DATE_DD'] <= end_date)
-                ]
-        
-        return result_df
-    
-    def _apply_filters(self, df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
-        result_df = df.copy()
-        
-        if filters.get('name_contains'):
-            mask = result_df['name'].apply(
-                lambda x: any(name.lower() in str(x).lower() for name in filters['name_contains']) if pd.notna(x) else False
-            )
-            result_df = result_df[mask]
-        
-        if filters.get('specialty_any'):
-            mask = result_df['specialties'].apply(
-                lambda x: any(spec.lower() in [s.lower() for s in x] for spec in filters['specialty_any']) if isinstance(x, list) else False
-            )
-            result_df = result_df[mask]
-        
-        if filters.get('state_any'):
-            mask = result_df['states'].apply(
-                lambda x: any(state.lower() in [s.lower() for s in x] for state in filters['state_any']) if isinstance(x, list) else False
-            )
-            result_df = result_df[mask]
-        
-        if filters.get('hospital_any'):
-            mask = result_df['hospital_names'].apply(
-                lambda x: any(hosp.lower() in [h.lower() for h in x] for hosp in filters['hospital_any']) if isinstance(x, list) else False
-            )
-            result_df = result_df[mask]
-        
-        if filters.get('system_any'):
-            mask = result_df['system_names'].apply(
-                lambda x: any(sys.lower() in [s.lower() for s in x] for sys in filters['system_any']) if isinstance(x, list) else False
-            )
-            result_df = result_df[mask]
-        
-        if filters.get('org_type_any'):
-            mask = result_df['org_type'].apply(
-                lambda x: x.lower() in [ot.lower() for ot in filters['org_type_any']] if pd.notna(x) else False
-            )
-            result_df = result_df[mask]
-        
-        if filters.get('publications_min') is not None:
-            result_df = result_df[result_df['num_publications'] >= filters['publications_min']]
-        
-        if filters.get('publications_max') is not None:
-            result_df = result_df[result_df['num_publications'] <= filters['publications_max']]
-        
-        if filters.get('clinical_trials_min') is not None:
-            result_df = result_df[result_df['num_clinical_trials'] >= filters['clinical_trials_min']]
-        
-        if filters.get('has_linkedin') is not None:
-            result_df = result_df[result_df['has_linkedin'] == filters['has_linkedin']]
-        
-        if filters.get('has_twitter') is not None:
-            result_df = result_df[result_df['has_twitter'] == filters['has_twitter']]
-        
-        return result_df
-    
-    def _apply_projection(self, df: pd.DataFrame, projection: List[str]) -> pd.DataFrame:
+    def _columns_of(self, df: pd.DataFrame) -> List[str]:
+        # The loaded tables may be missing lazy columns that are still part of their schema
+        if df is self.claims_df:
+            return self.claims_columns
+        if df is self.hcp_df:
+            return self.provider_columns
+        return list(df.columns)
+    
+    def _take(self, df: pd.DataFrame, rows: np.ndarray, columns: List[str],
+              extra: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+        if not columns:
+            return pd.DataFrame(index=df.index[rows])
+        extra = extra or {}
+        stored = [col for col in columns if col not in extra]
+        if df is self.claims_df:
+            self._load_lazy_claims_columns(stored)
+            fetch = lambda col: decode_claims_column(col, self._stored_column('claims', col).take(rows))
+        elif df is self.hcp_df:
+            self._load_lazy_provider_columns(stored)
+            self._parse_list_columns(stored, len(rows))
+            fetch = lambda col: self._provider_column(col, rows)
+        else:
+            fetch = lambda col: df[col].take(rows)
+        return pd.concat([
+            pd.Series(extra[col][rows], index=df.index[rows], name=col) if col in extra else fetch(col)
+            for col in columns
+        ], axis=1)
+    
+    def _provider_column(self, col: str, rows: np.ndarray) -> pd.Series:
+        # Checked before the take; if another thread parses the column meanwhile, parse_list_cells passes lists through
+        unparsed = col in self.unparsed_list_columns
+        values = self._stored_column('providers', col).take(rows)
+        if unparsed:
+            return pd.Series(parse_list_cells(values), index=values.index, name=col, dtype=object)
+        return decode_list_column(values)
+    
+    @staticmethod
+    def _apply_projection(columns: List[str], projection: List[str]) -> List[str]:
         available_columns = []
         for col in projection:
-            if col in df.columns:
+            if col in columns:
                 available_columns.append(col)
-        return df[available_columns]
+        return available_columns
     
-    def _apply_ordering(self, df: pd.DataFrame, order_by: List[str]) -> pd.DataFrame:
-        sort_columns = []
-        sort_ascending = []
-        
+    @staticmethod
+    def _sort_specs(order_by: List[str]) -> List[Tuple[str, bool]]:
+        """(column, ascending) per order_by entry; repeating a column adds nothing to the order"""
+        specs = {}
         for order_spec in order_by:
             parts = order_spec.split()
-            column = parts[0]
-            direction = parts[1].upper() if len(parts) > 1 else 'ASC'
-            
-            if column in df.columns:
-                sort_columns.append(column)
-                sort_ascending.append(direction == 'ASC')
+            if parts and parts[0] not in specs:
+                specs[parts[0]] = (parts[1].upper() if len(parts) > 1 else 'ASC') == 'ASC'
+        return list(specs.items())
+    
+    def _order_rows(self, df: pd.DataFrame, rows: np.ndarray, specs: List[Tuple[str, bool]],
+                    limit: Optional[int] = None, extra: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """Positional rows in sort order, cut to the limit; secondary keys are only read for top-k candidates"""
+        def fetch(i: int, positions: Optional[np.ndarray]) -> pd.Series:
+            column = specs[i][0]
+            return self._take(df, rows if positions is None else rows[positions], [column], extra)[column]
+        
+        k = limit if isinstance(limit, int) and limit > 0 else None
+        try:
+            return rows[top_k(fetch, [ascending for _, ascending in specs], len(rows), k)]
+        except TypeError:
+            # Unhashable keys (list columns such as specialties) fall back to a full sort
+            keys = self._take(df, rows, [col for col, _ in specs], extra).set_axis(rows)
+            ordered = keys.sort_values(by=[col for col, _ in specs], ascending=[asc for _, asc in specs], kind='stable')
+            return ordered.index.to_numpy()
+    
+    def _apply_ordering(self, df: pd.DataFrame, order_by: List[str], limit: Optional[int] = None) -> pd.DataFrame:
+        """df in order_by order (ties keep their order), cut to the first `limit` rows when given"""
+        specs = [(col, ascending) for col, ascending in self._sort_specs(order_by) if col in df.columns]
+        if not specs:
+            return df if limit is None else df.head(limit)
         
-        if sort_columns:
-            return df.sort_values(by=sort_columns, ascending=sort_ascending)
-        return df
+        try:
+            return df.take(top_k_frame(df, [col for col, _ in specs], [asc for _, asc in specs], limit))
+        except TypeError:
+            ordered = df.sort_values(by=[col for col, _ in specs], ascending=[asc for _, asc in specs], kind='stable')
+            return ordered if limit is None else ordered.head(limit)
 
 
-def execute_json_plan(json_plan: str, csv_path: str = "data/providers.csv", claims_path: str = "data/Mounjaro Claim Sample.csv") -> pd.DataFrame:
+def execute_json_plan(json_plan: str, csv_path: str = "data/providers.csv", claims_path: str = "data/Mounjaro Claim Sample.csv",
+                      executor: Optional[PlanExecutor] = None) -> pd.DataFrame:
+    """Run one JSON plan. Long-lived callers (the query server, a batch run) own a warm executor
+    and pass it in; without one, the files are loaded for this call."""
     plan = json.loads(json_plan)
-    executor = PlanExecutor(csv_path, claims_path)
+    if executor is None:
+        executor = PlanExecutor(csv_path, claims_path)
     return executor.execute_plan(plan)
 
 
@@ -0,0 +1,96 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+GROWTH = 1.5
+
+
+class GrowableArray:
+    """A 1-D array with spare capacity at the end, for columns and codes that only ever grow.
+
+    Appends write the new values after the current ones, so they cost the batch; only
+    when the buffer is full is it copied, into one GROWTH times larger. `values` is a view
+    of the used part: views handed out earlier keep seeing the rows they had.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self._buffer = np.asarray(values)
+        self._size = len(self._buffer)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._buffer.dtype
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    def append(self, values: np.ndarray):
+        values = np.asarray(values)
+        dtype = np.promote_types(self._buffer.dtype, values.dtype)
+        size = self._size + len(values)
+        if size > len(self._buffer) or dtype != self._buffer.dtype:
+            buffer = np.empty(max(size, int(len(self._buffer) * GROWTH)), dtype=dtype)
+            buffer[:self._size] = self._buffer[:self._size]
+            self._buffer = buffer
+        self._buffer[self._size:size] = values
+        self._size = size
+
+
+class SortedRuns:
+    """Values kept sorted, optionally with a payload (row positions), as a few sorted runs.
+
+    Each append becomes a run of its own, and a run is merged into the one before it while
+    it is at least half that one's size, so run sizes shrink geometrically: there are
+    O(log n) runs and an append costs its batch, amortized, rather than the whole array.
+    Runs are oldest first and ties keep insertion order within and across runs.
+    """
+
+    def __init__(self, values: np.ndarray, payload: Optional[np.ndarray] = None):
+        self.runs: List[Tuple[np.ndarray, Optional[np.ndarray]]] = []
+        self.insert(values, payload)
+
+    def __len__(self) -> int:
+        return sum(len(values) for values, _ in self.runs)
+
+    def insert(self, values: np.ndarray, payload: Optional[np.ndarray] = None) -> bool:
+        """Add values; returns whether the first (largest) run changed, so callers can rebuild what they derive from it"""
+        values = np.asarray(values)
+        order = np.argsort(values, kind='stable')
+        self.runs.append((values[order], None if payload is None else np.asarray(payload)[order]))
+        while len(self.runs) > 1 and 2 * len(self.runs[-1][0]) >= len(self.runs[-2][0]):
+            (older, older_payload), (newer, newer_payload) = self.runs[-2:]
+            values = np.concatenate([older, newer])
+            # Stable, so equal values keep the older run's first; timsort merges the two runs in linear time
+            order = np.argsort(values, kind='stable')
+            payload = None if older_payload is None else np.concatenate([older_payload, newer_payload])[order]
+            self.runs[-2:] = [(values[order], payload)]
+        return len(self.runs) == 1
+
+    def contains(self, values: np.ndarray) -> np.ndarray:
+        """Whether each of `values` is stored"""
+        found = np.zeros(len(values), dtype=bool)
+        for sorted_values, _ in self.runs:
+            if len(sorted_values):
+                at = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+                found |= sorted_values[at] == values
+        return found
+
+    def equal_range(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(index into `values`, payload) for every stored value equal to one of `values`"""
+        hits, payloads = [], []
+        for sorted_values, payload in self.runs:
+            lo = np.searchsorted(sorted_values, values, side='left')
+            hi = np.searchsorted(sorted_values, values, side='right')
+            counts = hi - lo
+            if not counts.any():
+                continue
+            # Concatenated aranges over [lo, hi) for every value, without a Python loop
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            hits.append(np.repeat(np.arange(len(values)), counts))
+            payloads.append(payload[np.arange(counts.sum(), dtype=np.int64) + starts])
+        if not hits:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(hits), np.concatenate(payloads)
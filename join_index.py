@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from growable import GrowableArray
+
+
+class NpiJoinIndex:
+    """Provider <-> claims join on integer-encoded NPIs.
+
+    Both sides share one code space of NPI values, sorted at load time; NPIs first seen in
+    appended claims get the next free codes. Each side keeps its row positions grouped by
+    code with an offsets array, so the rows for a set of codes are a handful of contiguous
+    slices. Appended claims rows stay ungrouped, and are scanned by code, until they amount
+    to APPENDED_MAX_RATIO of the grouped ones; then all claims rows are grouped again.
+    """
+
+    APPENDED_MAX_RATIO = 0.125
+
+    def __init__(self, hcp_npis: pd.Series, claims_npis: pd.Series):
+        hcp_values = self._to_int(hcp_npis)
+        claims_values = self._to_int(claims_npis)
+
+        self.keys = np.unique(np.concatenate([hcp_values[hcp_values >= 0], claims_values[claims_values >= 0]]))
+        self._sorted_keys, self._sorted_codes = self.keys, np.arange(len(self.keys))
+        self.hcp_codes = self._encode(hcp_values)
+        self._claims_codes = GrowableArray(self._encode(claims_values))
+        self.hcp_order, self.hcp_offsets = self._group(self.hcp_codes)
+        self._group_claims()
+
+    @property
+    def claims_codes(self) -> np.ndarray:
+        return self._claims_codes.values
+
+    @staticmethod
+    def _to_int(npis: pd.Series) -> np.ndarray:
+        if pd.api.types.is_integer_dtype(npis.dtype):
+            values = npis.to_numpy(dtype=np.int64)
+            return np.where(values > 0, values, -1)
+        # Only canonical digit strings join, as with the string equality this replaces; anything else gets -1
+        npis = npis.astype(str)
+        digits = npis.where(npis.str.fullmatch(r'[1-9]\d*'))
+        return pd.to_numeric(digits, errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+
+    def _encode(self, values: np.ndarray) -> np.ndarray:
+        if not len(self._sorted_keys):
+            return np.full(len(values), -1, dtype=np.int64)
+        at = np.minimum(np.searchsorted(self._sorted_keys, values), len(self._sorted_keys) - 1)
+        known = (values >= 0) & (self._sorted_keys[at] == values)
+        return np.where(known, self._sorted_codes[at], -1)
+
+    def _group_claims(self):
+        self.claims_order, self.claims_offsets = self._group(self.claims_codes)
+        self._grouped_claims = len(self.claims_codes)
+
+    def extend_claims(self, claims_npis: pd.Series):
+        """Add codes for claims rows appended after the current ones; new NPIs get the next free codes"""
+        values = self._to_int(claims_npis)
+        codes = self._encode(values)
+        fresh = np.unique(values[(values >= 0) & (codes < 0)])
+        if len(fresh):
+            codes = np.arange(len(self.keys), len(self.keys) + len(fresh))
+            self.keys = np.concatenate([self.keys, fresh])
+            at = np.searchsorted(self._sorted_keys, fresh)
+            self._sorted_keys = np.insert(self._sorted_keys, at, fresh)
+            self._sorted_codes = np.insert(self._sorted_codes, at, codes)
+            # No provider has a new NPI, and no grouped claim either
+            self.hcp_offsets = np.append(self.hcp_offsets, np.repeat(self.hcp_offsets[-1], len(fresh)))
+            self.claims_offsets = np.append(self.claims_offsets, np.repeat(self.claims_offsets[-1], len(fresh)))
+            codes = self._encode(values)
+
+        self._claims_codes.append(codes)
+        if len(self.claims_codes) - self._grouped_claims > self.APPENDED_MAX_RATIO * self._grouped_claims:
+            self._group_claims()
+
+    def _offsets(self, codes: np.ndarray, order: np.ndarray) -> np.ndarray:
+        return np.searchsorted(codes[order], np.arange(len(self.keys) + 1))
+
+    def _group(self, codes: np.ndarray):
+        order = np.argsort(codes, kind='stable')
+        return order, self._offsets(codes, order)
+
+    def _appended_claims(self, codes: np.ndarray) -> np.ndarray:
+        """Positions of ungrouped claims rows whose code is one of `codes`, in table order"""
+        appended = self.claims_codes[self._grouped_claims:]
+        return self._grouped_claims + np.flatnonzero(np.isin(appended, codes[codes >= 0]))
+
+    def claims_per_code(self) -> np.ndarray:
+        """Number of claims rows per code"""
+        appended = self.claims_codes[self._grouped_claims:]
+        return np.diff(self.claims_offsets) + np.bincount(appended[appended >= 0], minlength=len(self.keys))
+
+    @staticmethod
+    def _gather(order: np.ndarray, offsets: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return np.empty(0, dtype=np.int64)
+        starts, ends = offsets[codes], offsets[codes + 1]
+        lengths = ends - starts
+        # Concatenated aranges over [start, end) for every code, without a Python loop
+        shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        positions = order[np.arange(lengths.sum(), dtype=np.int64) + shifts]
+        # Positions come back in base table order, as a boolean isin over the table would give them
+        return np.sort(positions)
+
+    def claims_rows_for(self, hcp_rows: np.ndarray) -> np.ndarray:
+        """Claims positions whose prescriber is one of the given provider rows"""
+        codes = np.unique(self.hcp_codes[hcp_rows])
+        # Ungrouped rows all come after the grouped ones, so the two stay in table order
+        return np.concatenate([self._gather(self.claims_order, self.claims_offsets, codes), self._appended_claims(codes)])
+
+    def prescriber_codes(self, claims_rows: np.ndarray) -> np.ndarray:
+        """Distinct prescriber codes over the given claims rows"""
+        codes = np.unique(self.claims_codes[claims_rows])
+        return codes[codes >= 0]
+
+    def hcp_rows_for_codes(self, codes: np.ndarray) -> np.ndarray:
+        return self._gather(self.hcp_order, self.hcp_offsets, codes)
+
+    def hcp_rows_with_codes(self, hcp_rows: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """The given provider rows whose NPI is one of `codes`"""
+        return hcp_rows[np.isin(self.hcp_codes[hcp_rows], codes[codes >= 0])]
+
+    def claims_count_for(self, hcp_rows: np.ndarray) -> int:
+        codes = np.unique(self.hcp_codes[hcp_rows])
+        codes = codes[codes >= 0]
+        grouped = int((self.claims_offsets[codes + 1] - self.claims_offsets[codes]).sum())
+        return grouped + len(self._appended_claims(codes))
+
+    def claims_of(self, claims_rows: np.ndarray, hcp_rows: np.ndarray) -> np.ndarray:
+        """The given claims rows whose prescriber is one of the given provider rows"""
+        codes = np.unique(self.hcp_codes[hcp_rows])
+        return claims_rows[np.isin(self.claims_codes[claims_rows], codes[codes >= 0])]
@@ -0,0 +1,123 @@
+import io
+import json
+from itertools import chain
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
+
+# JSON array columns of the provider table: parsed at load time, or on first access
+EAGER_LIST_COLUMNS = ['specialties', 'states', 'hospital_names', 'system_names']
+LAZY_LIST_COLUMNS = ['conditions', 'affiliations', 'city_states']
+
+
+def parse_list_cell(value) -> List[Any]:
+    """One JSON array cell as a list; missing, empty and unparseable cells are empty lists"""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or value == '':
+        return []
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def parse_list_cells(values: pd.Series) -> List[List[Any]]:
+    """Every cell of a column of JSON arrays as a list, parsed in one json.loads call where possible"""
+    lists = None
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        cells = values.fillna('[]').replace('', '[]')
+        try:
+            lists = json.loads(f"[{','.join(cells)}]")
+        except ValueError:
+            pass
+    if lists is None or len(lists) != len(values) or not all(isinstance(cell, list) for cell in lists):
+        # Some cell is not a well-formed array on its own (or text joined across cells): go cell by cell
+        lists = [parse_list_cell(cell) for cell in values]
+    return lists
+
+
+def parse_list_column(values: pd.Series) -> pd.Series:
+    """Parse a column of JSON array strings into an Arrow list<dictionary<int32, string>> column.
+
+    Each row is a slice of one shared buffer of string codes (offsets + values), and each
+    distinct string is stored once. Arrays of strings are parsed by Arrow's JSON reader
+    straight into that layout, without a Python object per string; anything it cannot
+    take goes through json.loads. Lists holding anything but strings (objects, numbers)
+    stay a column of Python lists.
+    """
+    array = _read_string_lists(values)
+    if array is None:
+        lists = parse_list_cells(values)
+        items = list(chain.from_iterable(lists))
+        if items and pd.api.types.infer_dtype(items, skipna=False) != 'string':
+            return pd.Series(lists, index=values.index, name=values.name, dtype=object)
+        array = pa.array(lists, type=pa.list_(pa.string()))
+
+    offsets = np.zeros(len(array) + 1, dtype=np.int32)
+    np.cumsum(pc.list_value_length(array).to_numpy(zero_copy_only=False), out=offsets[1:])
+    array = pa.ListArray.from_arrays(pa.array(offsets), pc.dictionary_encode(pc.list_flatten(array)))
+    return pd.Series(pd.arrays.ArrowExtensionArray(array), index=values.index, name=values.name)
+
+
+def _read_string_lists(values: pd.Series) -> Optional[pa.ListArray]:
+    """A column of JSON arrays of strings as one Arrow list<string> array, or None if it is anything else"""
+    if not len(values) or pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        return None
+    cells = values.fillna('[]').replace('', '[]')
+    sample = next((cell for cell in cells if cell != '[]'), '[]')
+    try:
+        if not all(isinstance(item, str) for item in json.loads(sample)):
+            return None
+        text = '\n'.join(f'{{"v":{cell}}}' for cell in cells).encode()
+        table = pa_json.read_json(io.BytesIO(text), parse_options=pa_json.ParseOptions(newlines_in_values=False))
+    except (ValueError, TypeError, pa.ArrowInvalid):
+        return None
+    column = table.column('v').combine_chunks() if table.num_rows == len(values) else None
+    if column is None or column.null_count or not pa.types.is_list(column.type):
+        return None
+    if pa.types.is_null(column.type.value_type):
+        return column.cast(pa.list_(pa.string()))
+    return column if pa.types.is_string(column.type.value_type) else None
+
+
+def is_list_column(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.ArrowDtype) and pa.types.is_list(series.dtype.pyarrow_dtype)
+
+
+def _arrow_array(series: pd.Series) -> pa.Array:
+    # Columns read back from Parquet may be split into several chunks
+    array = pa.array(series.array)
+    return array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array
+
+
+def decode_list_column(series: pd.Series) -> pd.Series:
+    """Python lists for an Arrow list column, as results show them; other columns as they are"""
+    if not is_list_column(series):
+        return series
+    return pd.Series(_arrow_array(series).to_pylist(), index=series.index, name=series.name, dtype=object)
+
+
+def list_items(series: pd.Series) -> Tuple[np.ndarray, pd.Series]:
+    """(row position, item) for every item of a list column, in row order"""
+    if not is_list_column(series):
+        items = series.reset_index(drop=True)
+        items = items[items.map(lambda x: isinstance(x, list))].explode().dropna()
+        return items.index.to_numpy(dtype=np.int64), items.reset_index(drop=True)
+
+    array = _arrow_array(series)
+    positions = pc.list_parent_indices(array).to_numpy().astype(np.int64)
+    flat = pc.list_flatten(array)
+    valid = flat.is_valid().to_numpy(zero_copy_only=False)
+    if pa.types.is_dictionary(flat.type):
+        # Take from the dictionary by code, so every distinct string is converted once
+        codes = flat.indices.to_numpy(zero_copy_only=False)[valid]
+        items = pd.Series(flat.dictionary.to_numpy(zero_copy_only=False), dtype=object).take(codes)
+    else:
+        items = pd.Series(flat.to_numpy(zero_copy_only=False), dtype=object)[valid]
+    return positions[valid], items.reset_index(drop=True)
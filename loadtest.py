@@ -0,0 +1,120 @@
+import argparse
+import http.client
+import itertools
+import json
+import socket
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 60.0):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def connect(target: str, timeout: float = 60.0) -> http.client.HTTPConnection:
+    """Connection to "http://host:port" or "unix:/path/to.sock" """
+    if target.startswith('unix:'):
+        return UnixHTTPConnection(target[len('unix:'):], timeout)
+    host = target.split('://', 1)[-1].rstrip('/')
+    return http.client.HTTPConnection(host, timeout=timeout)
+
+
+def run_load(target: str, requests: List[Tuple[str, Dict[str, Any]]], total: int = 1000,
+             concurrency: int = 16) -> Dict[str, Any]:
+    """Send `total` requests (cycling through `requests`) from `concurrency` keep-alive clients.
+
+    Latency is measured per request from send to fully read response, including 503s and
+    504s, which are counted separately by status.
+    """
+    work = itertools.cycle(requests)
+    lock = threading.Lock()
+    remaining = [total]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    def client():
+        connection = connect(target)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+                path, body = next(work)
+            data = json.dumps(body).encode()
+            started = time.perf_counter()
+            try:
+                connection.request('POST', path, body=data, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = connect(target)
+                status = 'error'
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'seconds': seconds,
+        'throughput': len(latencies) / seconds if seconds else 0.0,
+        'statuses': dict(statuses),
+        'p50_ms': float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        'p90_ms': float(np.percentile(ms, 90)) if len(ms) else 0.0,
+        'p99_ms': float(np.percentile(ms, 99)) if len(ms) else 0.0,
+        'max_ms': float(ms.max()) if len(ms) else 0.0,
+    }
+
+
+def load_requests(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Requests from a batch file: lines with a plan go to /plan, bare queries to /query"""
+    from batch import load_queries
+
+    queries, plans = load_queries(path)
+    return [('/plan', {'plan': plans[q]}) if q in plans else ('/query', {'query': q}) for q in queries]
+
+
+def run_loadtest_cli(argv: List[str]):
+    parser = argparse.ArgumentParser(prog='main.py loadtest', description='Measure latency and throughput of a query server')
+    parser.add_argument('target', nargs='?', default='http://127.0.0.1:8765', help='http://host:port or unix:/path')
+    parser.add_argument('--queries', help='JSONL batch file (same format as main.py batch); default: the stub plan')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.queries:
+        requests = load_requests(args.queries)
+    else:
+        from batch import StubPlanner
+        requests = [('/plan', {'plan': StubPlanner.DEFAULT_PLAN})]
+
+    summary = run_load(args.target, requests, args.requests, args.concurrency)
+    statuses = ', '.join(f"{status}: {count}" for status, count in sorted(summary['statuses'].items(), key=str))
+    print(f"📈 {summary['requests']} requests in {summary['seconds']:.2f}s - {summary['throughput']:.1f} req/s")
+    print(f"⏱️  p50 {summary['p50_ms']:.1f} ms, p90 {summary['p90_ms']:.1f} ms, "
+          f"p99 {summary['p99_ms']:.1f} ms, max {summary['max_ms']:.1f} ms")
+    print(f"📬 Status codes: {statuses}")
+    return summary
@@ -1,16 +1,25 @@
 import json
 import sys
-from agent import Agent
-from executor import PlanExecutor
+import time
+from startup import StartupTimer, WarmStart
+
+STARTED = time.perf_counter()
+
+# The planner, executor and data are imported and loaded in the background (see startup.py),
+# so nothing heavy is imported here and the prompt comes up straight away
 
 def main():
     print("🎯 HCP TARGETING AGENT")
     print("=" * 50)
     print("Enter natural language queries to find healthcare providers.")
+    print("Prefix a query with 'explain' to see how it will be executed, or 'trace' to time each stage.")
+    print("Type 'append <claims.csv>' to load new claims without restarting, 'startup' for startup timings,")
+    print("'memory' for the claims table's bytes per column.")
     print("Type 'quit' to exit.\n")
     
-    agent = Agent()
-    executor = PlanExecutor("data/providers.csv", "data/Mounjaro Claim Sample.csv")
+    timer = StartupTimer(STARTED)
+    warm = WarmStart("data/providers.csv", "data/Mounjaro Claim Sample.csv", timer)
+    timer.mark('prompt ready')
     
     while True:
         user_input = input("🔍 Query: ").strip()
@@ -20,34 +29,48 @@ def main():
         
         if not user_input:
             continue
-            
+        
+        if user_input.lower() == 'startup':
+            print(f"\n🚀 Startup:\n{warm.report()}\n")
+            continue
+        
+        if user_input.lower() == 'memory':
+            print(f"\n🧮 Claims memory:\n{warm.get_executor().memory_text()}\n")
+            continue
+        
+        if user_input.lower().startswith('append '):
+            try:
+                warm.get_executor().append_claims(user_input[len('append '):].strip())
+            except Exception as e:
+                print(f"❌ Error: {e}")
+            continue
+        
+        explain = user_input.lower().startswith('explain ')
+        if explain:
+            user_input = user_input[len('explain '):].strip()
+        traced = user_input.lower().startswith('trace ')
+        if traced:
+            user_input = user_input[len('trace '):].strip()
+        
         try:
-            json_plan = agent.process_message(user_input)
-            
-            if "```json" in json_plan:
-                json_start = json_plan.find("```json") + 7
-                json_end = json_plan.find("```", json_start)
-                json_plan = json_plan[json_start:json_end].strip()
-            elif "```" in json_plan:
-                json_start = json_plan.find("```") + 3
-                json_end = json_plan.find("```", json_start)
-                if json_end == -1:
-                    json_end = len(json_plan)
-                json_plan = json_plan[json_start:json_end].strip()
-            
-            if not json_plan.startswith('{'):
-                start_idx = json_plan.find('{')
-                if start_idx != -1:
-                    json_plan = json_plan[start_idx:]
+            agent = warm.get_agent()
+            from agent import extract_json_plan
+            from tracing import Trace
+            trace = Trace(user_input)
+            json_plan = extract_json_plan(trace.run(agent.process_message, user_input))
             
             plan = json.loads(json_plan)
             
-            result_df = executor.execute_plan(plan)
+            executor = warm.get_executor()
+            if explain:
+                print(f"\n🧭 Execution plan:\n{executor.explain(plan)}\n")
+            
+            result_df = trace.run(executor.execute_plan, plan)
             print(f"\n📊 Results: {len(result_df)} doctors found")
             
             if not result_df.empty:
                 display_columns = []
-                for col in ['name', 'specialties', 'states', 'num_publications', 'total_prescriptions', 'unique_patients']:
+                for col in ['name', 'specialties', 'states', 'num_publications', 'total_prescriptions', 'unique_patients', 'total_paid_amt']:
                     if col in result_df.columns:
                         display_columns.append(col)
                 
@@ -65,9 +88,13 @@ def main():
             else:
                 print("No doctors found matching your criteria.")
             
+            if traced:
+                print(f"\n⏱️ Stages:\n{trace.report()}")
+            
             print("\n" + "=" * 60)
             
         except json.JSONDecodeError as e:
+            agent.forget(user_input)
             print(f"❌ Error: Could not parse the generated plan as JSON")
             print(f"Raw response: {json_plan[:200]}...")
         except Exception as e:
@@ -79,6 +106,8 @@ def run_test_queries():
     """Run a set of test queries to demonstrate capabilities"""
     print("🧪 Running test queries...")
     
+    from agent import Agent, extract_json_plan
+    from executor import PlanExecutor
     agent = Agent()
     executor = PlanExecutor("data/providers.csv", "data/Mounjaro Claim Sample.csv")
     
@@ -92,12 +121,7 @@ def run_test_queries():
     for i, query in enumerate(test_queries, 1):
         print(f"\nTest {i}: {query}")
         try:
-            json_plan = agent.process_message(query)
-            
-            if "```json" in json_plan:
-                json_start = json_plan.find("```json") + 7
-                json_end = json_plan.find("```", json_start)
-                json_plan = json_plan[json_start:json_end].strip()
+            json_plan = extract_json_plan(agent.process_message(query))
             
             plan = json.loads(json_plan)
             result_df = executor.execute_plan(plan)
@@ -110,5 +134,23 @@ def run_test_queries():
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == 'test':
         run_test_queries()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        from batch import run_batch_cli
+        run_batch_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        from server import run_server_cli
+        run_server_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'loadtest':
+        from loadtest import run_loadtest_cli
+        run_loadtest_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        from bench.run import run_bench_cli
+        run_bench_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'profile':
+        from profiler import run_profile_cli
+        run_profile_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'startup':
+        from startup import run_startup_cli
+        run_startup_cli(sys.argv[2:], origin=STARTED)
     else:
         main()
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Sequence, Tuple
+from claims_match import CategoricalMatcher
+
+# Share of a fuzzy query's trigrams a value must contain to count as similar
+FUZZY_MIN_SCORE = 0.5
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _gram_codes(data: np.ndarray) -> np.ndarray:
+    """Code of every byte trigram in a uint8 array"""
+    data = data.astype(np.int64)
+    return (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    # Sorting and dropping repeats is much faster than np.unique's hashing on millions of int64
+    values = np.sort(values)
+    return values[np.append(True, values[1:] != values[:-1])] if len(values) else values
+
+
+class NgramIndex:
+    """Trigram index over distinct strings: trigram -> sorted ids of the strings that contain it.
+
+    Strings are indexed lowercased as UTF-8 bytes, padded with a space at either end so that
+    word starts and ends carry weight in fuzzy lookups. A substring lookup intersects the
+    posting lists of the pattern's trigrams, rarest first, and verifies only the survivors;
+    a fuzzy lookup counts the query trigrams each string shares and ranks by that. Patterns
+    shorter than a trigram fall back to testing every string.
+    """
+
+    def __init__(self, values: Sequence[str] = ()):
+        self.values: List[str] = []
+        self.keys = _EMPTY             # distinct trigram codes, sorted
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.ids = np.empty(0, dtype=np.int32)
+        self.gram_counts = _EMPTY      # distinct trigrams per string
+        self.add(values)
+
+    def add(self, values: Iterable[str]):
+        """Index more strings; they get the next ids"""
+        start = len(self.values)
+        new = [str(value).lower() for value in values]
+        if not new:
+            return
+        self.values.extend(new)
+
+        encoded = [f" {value} ".encode() for value in new]
+        owners = np.repeat(np.arange(start, start + len(new), dtype=np.int64), [len(data) for data in encoded])
+        codes = _gram_codes(np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        # Trigrams that span two strings are not trigrams of either
+        within = owners[:-2] == owners[2:]
+        pairs = _sorted_unique((codes[within] << 32) | owners[:-2][within])
+        self.gram_counts = np.concatenate([self.gram_counts, np.bincount((pairs & 0xFFFFFFFF) - start, minlength=len(new))])
+
+        if len(self.ids):
+            existing = (np.repeat(self.keys, np.diff(self.offsets)) << 32) | self.ids
+            pairs = np.sort(np.concatenate([existing, pairs]))
+        grams = pairs >> 32
+        starts = np.flatnonzero(np.append(True, grams[1:] != grams[:-1]))
+        self.keys = grams[starts]
+        self.offsets = np.append(starts, len(pairs)).astype(np.int64)
+        self.ids = (pairs & 0xFFFFFFFF).astype(np.int32)
+
+    def _postings(self, code: int) -> np.ndarray:
+        i = np.searchsorted(self.keys, code)
+        if i == len(self.keys) or self.keys[i] != code:
+            return _EMPTY
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def contains(self, pattern: str) -> np.ndarray:
+        """Sorted ids of the strings containing pattern (case-insensitive)"""
+        pattern = str(pattern).lower()
+        data = np.frombuffer(pattern.encode(), dtype=np.uint8)
+        if len(data) < 3:
+            return np.array([i for i, value in enumerate(self.values) if pattern in value], dtype=np.int64)
+
+        postings = sorted((self._postings(code) for code in _sorted_unique(_gram_codes(data))), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        if len(data) == 3 and not pattern.startswith(' ') and not pattern.endswith(' '):
+            return candidates.astype(np.int64)
+        # Sharing every trigram does not make a substring ("abcab" vs "abcxbcab"), nor does matching
+        # the padding around a string, so check the survivors
+        return np.array([i for i in candidates.tolist() if pattern in self.values[i]], dtype=np.int64)
+
+    def similar(self, query: str, limit: int = 10, min_score: float = FUZZY_MIN_SCORE) -> List[Tuple[int, float]]:
+        """(id, score) of up to `limit` strings most like query, best first.
+
+        The score is the share of the query's trigrams a string contains, so typos cost a few
+        trigrams and a query naming part of a value can still score 1; ties go to the string
+        with fewer trigrams of its own, i.e. the closer overall match. A string that shares
+        `needed` of the query's g trigrams must share one of its g - needed + 1 rarest, so only
+        those posting lists are merged into candidates; the common ones are just probed.
+        """
+        data = np.frombuffer(f" {str(query).lower()} ".encode(), dtype=np.uint8)
+        postings = sorted((self._postings(code) for code in _sorted_unique(_gram_codes(data))), key=len)
+        if not postings:
+            return []
+        needed = max(1, int(np.ceil(min_score * len(postings))))
+        rare = postings[:len(postings) - needed + 1]
+        if sum(len(posting) for posting in rare) * len(postings) < len(self.values):
+            candidates = _sorted_unique(np.concatenate(rare))
+            shared = np.zeros(len(candidates), dtype=np.int64)
+            for posting in postings:
+                if len(posting):
+                    found = np.searchsorted(posting, candidates).clip(max=len(posting) - 1)
+                    shared += posting[found] == candidates
+        else:
+            # Common trigrams among the rare ones: one count over every posting is cheaper than probing
+            shared = np.bincount(np.concatenate(postings), minlength=len(self.values))
+            candidates = np.arange(len(self.values))
+        keep = shared >= needed
+        candidates, shared = candidates[keep], shared[keep]
+        if not len(candidates):
+            return []
+        scores = shared / len(postings)
+        dice = 2 * shared / (len(postings) + self.gram_counts[candidates])
+        best = np.lexsort((-dice, -scores))[:limit]
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+    def closest(self, query: str, min_score: float = FUZZY_MIN_SCORE) -> np.ndarray:
+        """Ids of the strings tied for the best fuzzy score"""
+        ranked = self.similar(query, limit=len(self.values), min_score=min_score)
+        if not ranked:
+            return _EMPTY
+        top = ranked[0][1]
+        return np.array([i for i, score in ranked if score == top], dtype=np.int64)
+
+
+class NgramMatcher(CategoricalMatcher):
+    """CategoricalMatcher whose substring match tables come from a trigram index instead of a scan"""
+
+    def __init__(self, values: pd.Series):
+        super().__init__(values)
+        self.index = NgramIndex(self.lowered)
+
+    def extend(self, values: pd.Series):
+        known = len(self.lowered)
+        super().extend(values)
+        self.index.add(self.lowered[known:])
+
+    def match_table(self, patterns: Iterable[str]) -> np.ndarray:
+        table = np.zeros(len(self.lowered) + 1, dtype=bool)
+        for pattern in patterns:
+            table[self.index.contains(pattern)] = True
+        return table
+
+    def closest_table(self, patterns: Iterable[str], min_score: float = FUZZY_MIN_SCORE) -> np.ndarray:
+        """Match table of the values closest to each pattern, for when no value contains it"""
+        table = np.zeros(len(self.lowered) + 1, dtype=bool)
+        for pattern in patterns:
+            table[self.index.closest(pattern, min_score)] = True
+        return table
+
+    def closest_mask(self, patterns: Iterable[str], rows=None, min_score: float = FUZZY_MIN_SCORE) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        return self.closest_table(patterns, min_score)[codes]
@@ -0,0 +1,369 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Selectivity used when a column has no statistics (or too many distinct values to scan per plan)
+DEFAULT_SUBSTRING_SELECTIVITY = 0.01
+DEFAULT_RANGE_SELECTIVITY = 0.3
+DEFAULT_DATE_SELECTIVITY = 0.5
+EXACT_MATCH_MAX_DISTINCT = 10_000
+
+# Rough per-row costs in "row operations", only their ratios matter
+INDEX_TABLE_COST = 0.1      # building the provider mask from posting lists, per provider row
+SUBSTRING_DISTINCT_COST = 5.0  # Python substring test per distinct value and pattern
+GATHER_COST = 1.0           # looking up a code or value for one candidate row
+SORT_COST = 1.0             # sorting / intersecting one position
+
+
+def _active(filters: Optional[Dict[str, Any]], key: str, scalar: bool) -> bool:
+    value = (filters or {}).get(key)
+    return value is not None if scalar else bool(value)
+
+
+class TableStats:
+    """Per-column statistics gathered from the executor's indexes at load time.
+
+    Provider side: posting-list sizes for the indexed columns, sorted values of the numeric
+    columns and value frequencies of the boolean ones. Claims side: value frequencies per
+    substring-matched column, a monthly histogram of service dates and the shape of the
+    prescriber join.
+    """
+
+    def __init__(self, executor):
+        self.hcp_rows = len(executor.hcp_df)
+        self.claims_rows = len(executor.claims_df)
+
+        index = executor.provider_index
+        self.posting_counts = {
+            col: {value: len(positions) for value, positions in postings.items()}
+            for col, postings in index.postings.items()
+        }
+        self.distinct_counts = {col: len(counts) for col, counts in self.posting_counts.items()}
+        self.provider_index = index
+        self.distinct_counts['name'] = len(executor.name_matcher.lowered)
+        # Providers per distinct name, so the trigram index can count name_contains matches exactly
+        self.name_matcher = executor.name_matcher
+        name_codes = self.name_matcher.codes
+        self.name_counts = np.bincount(name_codes[name_codes >= 0], minlength=len(self.name_matcher.lowered))
+
+        self.sorted_values: Dict[str, np.ndarray] = {}
+        self.value_frequencies: Dict[str, Dict[Any, float]] = {}
+        for _, column, op in executor.RANGE_FILTERS:
+            if column not in executor.hcp_df.columns:
+                continue
+            if op is np.equal:
+                self.value_frequencies[column] = executor.hcp_df[column].value_counts(normalize=True, dropna=True).to_dict()
+            else:
+                values = pd.to_numeric(executor.hcp_df[column], errors='coerce').to_numpy(dtype=float)
+                self.sorted_values[column] = np.sort(values[~np.isnan(values)])
+
+        self.claims_distinct: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        for col, matcher in executor.claims_matcher.matchers.items():
+            codes = matcher.codes[matcher.codes >= 0]
+            self.claims_distinct[col] = (matcher.lowered, np.bincount(codes, minlength=len(matcher.lowered)))
+            self.distinct_counts[col] = len(matcher.lowered)
+        self._claims_shape(executor)
+
+    def extend_claims(self, executor, start: int):
+        """Fold claims rows appended from `start` on into the claims statistics, without rescanning the rest"""
+        self.claims_rows = len(executor.claims_df)
+        for col, matcher in executor.claims_matcher.matchers.items():
+            _, counts = self.claims_distinct[col]
+            codes = matcher.codes[start:]
+            added = np.bincount(codes[codes >= 0], minlength=len(matcher.lowered))
+            added[:len(counts)] += counts
+            self.claims_distinct[col] = (matcher.lowered, added)
+            self.distinct_counts[col] = len(matcher.lowered)
+        self._claims_shape(executor)
+
+    def _claims_shape(self, executor):
+        """Date histogram and join shape, read off the date and join indexes rather than the claims"""
+        self.date_histogram: Optional[pd.Series] = None
+        if executor.date_index is not None:
+            self.date_histogram = executor.date_index.month_counts()
+
+        # Join shape: providers with claims, and claims per such provider. Without a join index
+        # (claims streamed rather than loaded, say) nothing past the provider filters can be estimated
+        self.claims_known = executor.join_index is not None
+        self.hcp_joined_fraction = 0.0
+        self.claims_per_provider = 0.0
+        join = executor.join_index
+        if join is not None and self.hcp_rows:
+            hcp_per_code = np.diff(join.hcp_offsets)
+            claims_per_code = join.claims_per_code()
+            both = (hcp_per_code > 0) & (claims_per_code > 0)
+            hcp_joined = hcp_per_code[both].sum()
+            self.hcp_joined_fraction = hcp_joined / self.hcp_rows
+            self.claims_per_provider = claims_per_code[both].sum() / hcp_joined if hcp_joined else 0.0
+
+    def provider_selectivity(self, key: str, column: Optional[str], value, approximate: bool = False) -> float:
+        if not self.hcp_rows:
+            return 1.0
+        if key == 'name_contains':
+            matched = self.name_counts[self.name_matcher.match_table(value)[:-1]].sum()
+            return min(1.0, matched / self.hcp_rows)
+        if column in self.posting_counts:
+            counts = self.posting_counts[column]
+            matched = sum(counts.get(v, 0) for v in self.provider_index.resolve(column, value, approximate))
+            return min(1.0, matched / self.hcp_rows)
+        if column in self.value_frequencies:
+            return float(self.value_frequencies[column].get(value, 0.0))
+        if column in self.sorted_values:
+            values = self.sorted_values[column]
+            if key.endswith('_max'):
+                matched = np.searchsorted(values, value, side='right')
+            else:
+                matched = len(values) - np.searchsorted(values, value, side='left')
+            return matched / self.hcp_rows
+        return DEFAULT_RANGE_SELECTIVITY
+
+    def substring_selectivity(self, columns: List[str], patterns: List[str]) -> float:
+        """Largest single-column selectivity: the drug columns describe the same product, so they overlap"""
+        if not self.claims_rows:
+            return DEFAULT_SUBSTRING_SELECTIVITY
+        patterns = [str(p).lower() for p in patterns]
+        best, known = 0.0, False
+        for col in columns:
+            if col not in self.claims_distinct:
+                continue
+            known = True
+            lowered, counts = self.claims_distinct[col]
+            if len(lowered) > EXACT_MATCH_MAX_DISTINCT:
+                best = max(best, DEFAULT_SUBSTRING_SELECTIVITY)
+                continue
+            matched = sum(count for value, count in zip(lowered, counts) if any(p in value for p in patterns))
+            best = max(best, matched / self.claims_rows)
+        # The executor skips filters on columns the table does not have
+        return best if known else 1.0
+
+    def date_selectivity(self, start: datetime, end: datetime) -> float:
+        """Share of claims in [start, end], prorating the histogram's boundary months by days covered"""
+        if self.date_histogram is None or not self.claims_rows:
+            return DEFAULT_DATE_SELECTIVITY
+        if self.date_histogram.empty:
+            return 0.0
+        month_starts = self.date_histogram.index.to_numpy(dtype='datetime64[ns]')
+        month_ends = (month_starts.astype('datetime64[M]') + 1).astype('datetime64[ns]')
+        overlap = (np.minimum(month_ends, np.datetime64(end, 'ns')) -
+                   np.maximum(month_starts, np.datetime64(start, 'ns'))).astype(np.int64)
+        covered = np.clip(overlap / (month_ends - month_starts).astype(np.int64), 0.0, 1.0)
+        return float((covered * self.date_histogram.to_numpy()).sum() / self.claims_rows)
+
+
+class PlanOptimizer:
+    """Orders filter predicates and picks the join side from table statistics.
+
+    Each predicate gets a selectivity estimate and a cost that depends on how many rows
+    reach it. Predicates are ordered greedily: at each step the one that discards the
+    most rows per unit of cost runs next. Estimates assume predicates are independent.
+    Reordering never changes results, since every predicate narrows the same sorted
+    position array.
+    """
+
+    def __init__(self, executor):
+        self.stats = TableStats(executor)
+        self.indexed_filters = dict(executor.INDEXED_FILTERS)
+        self.range_filters = {key: column for key, column, _ in executor.RANGE_FILTERS}
+        self.matched_claims_filters = dict(executor.MATCHED_CLAIMS_FILTERS)
+        self.has_date_index = executor.date_index is not None
+
+    # Provider predicates
+
+    def provider_predicates(self, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        predicates = []
+        if _active(filters, 'name_contains', scalar=False):
+            predicates.append(self._predicate('providers', 'name_contains', filters['name_contains'], 'name'))
+        approximate = bool((filters or {}).get('approximate_names'))
+        for key, column in self.indexed_filters.items():
+            if _active(filters, key, scalar=False):
+                predicates.append(self._predicate('providers', key, filters[key], column, approximate))
+        for key, column in self.range_filters.items():
+            if _active(filters, key, scalar=True):
+                predicates.append(self._predicate('providers', key, filters[key], column))
+        return predicates
+
+    def _provider_cost(self, predicate: Dict[str, Any], rows_in: float) -> float:
+        n = self.stats.hcp_rows
+        if predicate['filter'] == 'name_contains':
+            # Trigram lookups, then one match-table entry per distinct name
+            return INDEX_TABLE_COST * self.stats.distinct_counts.get('name', n) + GATHER_COST * rows_in
+        if predicate['filter'] in self.indexed_filters:
+            return INDEX_TABLE_COST * n + GATHER_COST * rows_in
+        return GATHER_COST * rows_in
+
+    # Claims predicates
+
+    def _date_window(self, months) -> Tuple[datetime, datetime]:
+        end = datetime.now()
+        return end - timedelta(days=months * 30), end
+
+    def claims_predicates(self, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        predicates = []
+        if _active(filters, 'date_range_months', scalar=False):
+            predicates.append(self._predicate('claims', 'date_range_months', filters['date_range_months'], 'SERVICE_DATE_DD'))
+        for key, columns in self.matched_claims_filters.items():
+            if _active(filters, key, scalar=False):
+                predicates.append(self._predicate('claims', key, filters[key], columns))
+        return predicates
+
+    def _claims_cost(self, predicate: Dict[str, Any], rows_in: float, full_table: bool) -> float:
+        if predicate['filter'] == 'date_range_months':
+            if not self.has_date_index:
+                return GATHER_COST * rows_in
+            window = predicate['selectivity'] * self.stats.claims_rows
+            # A slice of the date index over the whole table; otherwise intersected with the candidates
+            return SORT_COST * window if full_table else SORT_COST * (window + rows_in)
+        distinct = sum(self.stats.distinct_counts.get(col, 0) for col in predicate['column'])
+        return SUBSTRING_DISTINCT_COST * distinct * len(predicate['value']) + GATHER_COST * len(predicate['column']) * rows_in
+
+    def _predicate(self, table: str, key: str, value, column, approximate: bool = False) -> Dict[str, Any]:
+        if table == 'providers':
+            selectivity = self.stats.provider_selectivity(key, column, value, approximate)
+        elif key == 'date_range_months':
+            selectivity = self.stats.date_selectivity(*self._date_window(value))
+        else:
+            selectivity = self.stats.substring_selectivity(column, value)
+        return {'table': table, 'filter': key, 'value': value, 'column': column, 'selectivity': selectivity}
+
+    def _order(self, predicates: List[Dict[str, Any]], rows: float, cost_of) -> Tuple[List[Dict[str, Any]], float, float]:
+        """Greedy order: next is the predicate removing the most rows per unit of cost"""
+        remaining, ordered, total = list(predicates), [], 0.0
+        full_table = True
+        while remaining:
+            def rank(predicate):
+                cost = cost_of(predicate, rows, full_table)
+                return (rows * (1 - predicate['selectivity'])) / cost if cost > 0 else float('inf')
+            best = max(remaining, key=rank)
+            remaining.remove(best)
+            cost = cost_of(best, rows, full_table)
+            rows_out = rows * best['selectivity']
+            ordered.append(dict(best, rows_in=rows, rows_out=rows_out, cost=cost))
+            total += cost
+            rows, full_table = rows_out, False
+        return ordered, rows, total
+
+    def order_provider_filters(self, filters: Optional[Dict[str, Any]], rows: int,
+                               predicates: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        if predicates is None:
+            predicates = self.provider_predicates(filters)
+        ordered, _, _ = self._provider_side(predicates, rows)
+        return [predicate['filter'] for predicate in ordered]
+
+    def order_claims_filters(self, filters: Optional[Dict[str, Any]], rows: int, full_table: bool,
+                             predicates: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        if predicates is None:
+            predicates = self.claims_predicates(filters)
+        ordered, _, _ = self._claims_side(predicates, rows, full_table)
+        return [predicate['filter'] for predicate in ordered]
+
+    # Whole plans
+
+    def predicates(self, plan: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """A plan's predicates with their selectivities, per table.
+
+        Estimating a substring filter scans its columns' distinct values, so a plan builds these
+        once and passes them to join_side and to the filter ordering of each step.
+        """
+        return {'providers': self.provider_predicates(plan.get('filters')),
+                'claims': self.claims_predicates(plan.get('claims_filters'))}
+
+    def _provider_side(self, predicates: List[Dict[str, Any]], rows: float):
+        return self._order(predicates, rows, lambda p, r, _: self._provider_cost(p, r))
+
+    def _claims_side(self, predicates: List[Dict[str, Any]], rows: float, full_table: bool):
+        # Only the first predicate can see the whole table; on a subset every predicate pays per row
+        return self._order(predicates, rows, lambda p, r, first: self._claims_cost(p, r, first and full_table))
+
+    def _claims_survival(self, claims_selectivity: float) -> float:
+        """Chance that a provider with claims keeps at least one of them after the claims filters"""
+        return 1 - (1 - min(claims_selectivity, 1.0)) ** max(self.stats.claims_per_provider, 1.0)
+
+    def optimize(self, plan: Dict[str, Any], predicates: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+        """Physical plan: the chosen join side, ordered steps with row estimates, and the cost of each side"""
+        stats = self.stats
+        query_type = plan.get('query_type', 'hcp')
+        if predicates is None:
+            predicates = self.predicates(plan)
+        hcp_predicates, claims_predicates = predicates['providers'], predicates['claims']
+
+        if query_type == 'aggregate':
+            query_type = 'hcp_with_claims_metrics'
+        if query_type not in ('hcp_with_claims', 'hcp_with_claims_metrics', 'claims_by_doctor', 'claims_only'):
+            steps, rows, cost = self._provider_side(hcp_predicates, stats.hcp_rows)
+            return {'query_type': 'hcp', 'drive': 'providers', 'steps': steps, 'rows': rows, 'cost': cost, 'costs': {}}
+
+        if not stats.claims_known:
+            return self._provider_side_only(query_type, hcp_predicates, claims_predicates)
+
+        if query_type == 'claims_only':
+            steps, rows, cost = self._claims_side(claims_predicates, stats.claims_rows, True)
+            return {'query_type': query_type, 'drive': 'claims', 'steps': steps, 'rows': rows, 'cost': cost, 'costs': {}}
+
+        claims_selectivity = float(np.prod([p['selectivity'] for p in claims_predicates]))
+        options = {}
+
+        # Providers first: filter doctors, gather their claims, filter those
+        hcp_steps, hcp_rows, hcp_cost = self._provider_side(hcp_predicates, stats.hcp_rows)
+        joined_claims = hcp_rows * stats.hcp_joined_fraction * stats.claims_per_provider
+        join_step = {'table': 'join', 'filter': 'claims of providers', 'rows_in': hcp_rows,
+                     'rows_out': joined_claims, 'cost': GATHER_COST * (hcp_rows + joined_claims)}
+        claims_steps, claims_rows, claims_cost = self._claims_side(claims_predicates, joined_claims, False)
+        steps = hcp_steps + [join_step] + claims_steps
+        rows = claims_rows
+        if query_type != 'claims_by_doctor':
+            rows = hcp_rows * stats.hcp_joined_fraction * self._claims_survival(claims_selectivity)
+            steps.append({'table': 'join', 'filter': 'providers with claims', 'rows_in': claims_rows,
+                          'rows_out': rows, 'cost': GATHER_COST * (claims_rows + hcp_rows)})
+        options['providers'] = (steps, rows)
+
+        # Claims first: filter claims, then keep those (or the providers) on the other side of the join
+        claims_steps, claims_rows, claims_cost = self._claims_side(claims_predicates, stats.claims_rows, True)
+        if query_type != 'claims_by_doctor':
+            joined_hcp = stats.hcp_rows * stats.hcp_joined_fraction * self._claims_survival(claims_selectivity)
+            join_step = {'table': 'join', 'filter': 'prescribers of claims', 'rows_in': claims_rows,
+                         'rows_out': joined_hcp, 'cost': GATHER_COST * (claims_rows + joined_hcp)}
+            hcp_steps, rows, hcp_cost = self._provider_side(hcp_predicates, joined_hcp)
+            steps = claims_steps + [join_step] + hcp_steps
+        else:
+            # claims_by_doctor still resolves the doctors first, then semi-joins the filtered claims to them
+            rows = claims_rows * (joined_claims / stats.claims_rows if stats.claims_rows else 0.0)
+            join_step = {'table': 'join', 'filter': 'claims of providers', 'rows_in': claims_rows,
+                         'rows_out': rows, 'cost': GATHER_COST * (claims_rows + hcp_rows)}
+            steps = hcp_steps + claims_steps + [join_step]
+        options['claims'] = (steps, rows)
+
+        costs = {side: sum(step['cost'] for step in side_steps) for side, (side_steps, _) in options.items()}
+        drive = min(costs, key=costs.get)
+        steps, rows = options[drive]
+        return {'query_type': query_type, 'drive': drive, 'steps': steps, 'rows': rows, 'cost': costs[drive], 'costs': costs}
+
+    def _provider_side_only(self, query_type: str, hcp_predicates, claims_predicates) -> Dict[str, Any]:
+        """Physical plan when the claims have no statistics: provider filters are estimated, claims filters only listed"""
+        steps = []
+        if query_type != 'claims_only':
+            steps, _, _ = self._provider_side(hcp_predicates, self.stats.hcp_rows)
+        for predicate in claims_predicates:
+            steps.append({'table': 'claims', 'filter': predicate['filter'], 'value': predicate['value'],
+                          'rows_in': None, 'rows_out': None})
+        drive = 'claims' if query_type == 'claims_only' else 'providers'
+        return {'query_type': query_type, 'drive': drive, 'steps': steps, 'rows': None, 'cost': None, 'costs': {}}
+
+    def join_side(self, plan: Dict[str, Any], predicates: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> str:
+        return self.optimize(plan, predicates)['drive']
+
+    def explain(self, plan: Dict[str, Any]) -> str:
+        physical = self.optimize(plan)
+        if physical['rows'] is None:
+            lines = [f"{physical['query_type']}: drive from {physical['drive']}, "
+                     f"no claims statistics (claims are not loaded), so claims steps are not estimated"]
+        else:
+            lines = [f"{physical['query_type']}: drive from {physical['drive']}, est. {physical['rows']:,.0f} rows, cost {physical['cost']:,.0f}"]
+        for side, cost in physical['costs'].items():
+            lines.append(f"  {side + ' first':<16} cost {cost:,.0f}")
+        for number, step in enumerate(physical['steps'], 1):
+            label = step['filter'] if 'value' not in step else f"{step['filter']}={step['value']}"
+            selectivity = f"sel {step['selectivity']:.4f}" if 'selectivity' in step else ' ' * 10
+            estimate = '?' if step['rows_in'] is None else f"{step['rows_in']:>12,.0f} -> {step['rows_out']:,.0f}"
+            lines.append(f"  {number}. {step['table']:<9} {label:<45} {selectivity}  {estimate:>12}")
+        return '\n'.join(lines)
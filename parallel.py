@@ -0,0 +1,159 @@
+import io
+import multiprocessing
+import os
+import pickle
+import weakref
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+from executor import PlanExecutor
+from tracing import span
+
+# Numeric arrays at least this large go to workers through shared memory rather than the pickle
+SHARED_MIN_BYTES = 1 << 16
+
+# What a worker process filters with, set by its pool's initializer. Each pool's workers
+# are their own processes, so two executors' pools never see each other's.
+_worker_tables: Optional[Dict[str, Any]] = None
+_worker_blocks: List[shared_memory.SharedMemory] = []
+
+
+class _SharedPickler(pickle.Pickler):
+    """Pickles large numeric arrays as the name of a shared memory block holding a copy"""
+
+    def __init__(self, file, blocks: List[shared_memory.SharedMemory]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.blocks = blocks
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < SHARED_MIN_BYTES:
+            return None
+        block = shared_memory.SharedMemory(create=True, size=obj.nbytes)
+        self.blocks.append(block)
+        np.ndarray(obj.shape, obj.dtype, buffer=block.buf)[...] = obj
+        return block.name, obj.dtype.str, obj.shape
+
+
+class _SharedUnpickler(pickle.Unpickler):
+    """Maps the arrays _SharedPickler put in shared memory, read-only and without copying"""
+
+    def persistent_load(self, pid):
+        name, dtype, shape = pid
+        block = shared_memory.SharedMemory(name=name)
+        # The arrays point into the mapping, so it stays open for the life of the worker
+        _worker_blocks.append(block)
+        array = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        return array
+
+
+def _release_blocks(blocks: List[shared_memory.SharedMemory]):
+    for block in blocks:
+        block.close()
+        block.unlink()
+    blocks.clear()
+
+
+def _init_worker(payload: bytes):
+    global _worker_tables
+    _worker_tables = _SharedUnpickler(io.BytesIO(payload)).load()
+
+
+def _filter_partition(partition, order: List[str], filters: Dict[str, Any], now: datetime) -> np.ndarray:
+    tables = _worker_tables
+    rows = tables['partitions'][partition] if isinstance(partition, int) else partition
+    return PlanExecutor._run_claims_filters(rows, order, filters, tables['claims_df'], tables['claims_matcher'],
+                                            tables['date_index'], now)
+
+
+class ParallelPlanExecutor(PlanExecutor):
+    """PlanExecutor that evaluates claims filters over prescriber partitions in a process pool.
+
+    Claims are split into `workers` partitions by prescriber NPI code. A filter over at
+    least `min_parallel_rows` rows fans out one task per partition and the surviving
+    positions are merged back in table order, so results match the serial path exactly.
+
+    Workers come from the forkserver start method (spawn where that is unavailable), not from
+    forking a parent that may be running server threads. They receive only what filtering
+    reads (the claims matcher, the date index and the partitions) through the pool's
+    initializer; its code and position arrays are copied once into shared memory blocks
+    that every worker maps, so the pickle carries block names and the distinct values.
+    """
+
+    def __init__(self, csv_path: str = "data/providers.csv", claims_path: Optional[str] = "data/Mounjaro Claim Sample.csv",
+                 snapshot_dir: Optional[str] = ".snapshots", workers: Optional[int] = None,
+                 min_parallel_rows: int = 200_000):
+        super().__init__(csv_path, claims_path, snapshot_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.min_parallel_rows = min_parallel_rows
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._blocks: List[shared_memory.SharedMemory] = []
+        # Unlinks the blocks if the executor is dropped without close()
+        weakref.finalize(self, _release_blocks, self._blocks)
+        self._partition_claims()
+
+    def _partition_claims(self):
+        n = len(self.claims_df)
+        if self.join_index is not None:
+            keys = self.join_index.claims_codes % self.workers
+        else:
+            keys = np.arange(n) % self.workers
+        order = np.argsort(keys, kind='stable')
+        bounds = np.searchsorted(keys[order], np.arange(self.workers + 1))
+        self.partition_of = keys
+        self.partitions: List[np.ndarray] = [order[bounds[p]:bounds[p + 1]] for p in range(self.workers)]
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._pool is None:
+            if self.workers < 2:
+                return None
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            tables = {'claims_df': pd.DataFrame(columns=self.claims_df.columns), 'claims_matcher': self.claims_matcher,
+                      'date_index': self.date_index, 'partitions': self.partitions}
+            payload = io.BytesIO()
+            _SharedPickler(payload, self._blocks).dump(tables)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_worker, initargs=(payload.getvalue(),))
+        return self._pool
+
+    def append_claims(self, claims) -> int:
+        added = super().append_claims(claims)
+        if added:
+            # Workers hold the tables as they were; the next parallel filter starts fresh ones
+            self.close()
+            self._partition_claims()
+        return added
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        _release_blocks(self._blocks)
+
+    def _apply_claims_filters(self, rows: np.ndarray, filters: Dict[str, Any],
+                              claims_df: Optional[pd.DataFrame] = None,
+                              claims_matcher=None, now: Optional[datetime] = None,
+                              predicates: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+        pool = self._get_pool() if claims_df is None and len(rows) >= self.min_parallel_rows else None
+        if pool is None:
+            return super()._apply_claims_filters(rows, filters, claims_df, claims_matcher, now, predicates)
+
+        now = now or datetime.now()
+        # Ordered here once, for the whole row set, rather than by every worker
+        full_table = len(rows) == len(self.claims_df)
+        order = self.optimizer.order_claims_filters(filters, len(rows), full_table, predicates)
+        if full_table:
+            # Whole table: workers already hold their partition's rows
+            tasks = list(range(self.workers))
+        else:
+            keys = self.partition_of[rows]
+            tasks = [rows[keys == p] for p in range(self.workers)]
+
+        with span('claims_filter:partitions', rows_in=len(rows), workers=len(tasks)) as stage:
+            parts = list(pool.map(_filter_partition, tasks, [order] * len(tasks), [filters] * len(tasks),
+                                  [now] * len(tasks)))
+            return stage.output(np.sort(np.concatenate(parts)) if parts else rows[:0])
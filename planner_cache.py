@@ -0,0 +1,175 @@
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+STOPWORDS = {'a', 'an', 'the', 'please', 'show', 'me', 'list', 'find', 'give', 'get', 'all', 'of', 'for', 'who', 'that'}
+NEGATIONS = {'not', 'no', 'never', 'without', 'except', 'excluding'}
+US_STATES = {
+    'alabama': 'al', 'alaska': 'ak', 'arizona': 'az', 'arkansas': 'ar', 'california': 'ca', 'colorado': 'co',
+    'connecticut': 'ct', 'delaware': 'de', 'district columbia': 'dc', 'florida': 'fl', 'georgia': 'ga',
+    'hawaii': 'hi', 'idaho': 'id', 'illinois': 'il', 'indiana': 'in', 'iowa': 'ia', 'kansas': 'ks',
+    'kentucky': 'ky', 'louisiana': 'la', 'maine': 'me', 'maryland': 'md', 'massachusetts': 'ma',
+    'michigan': 'mi', 'minnesota': 'mn', 'mississippi': 'ms', 'missouri': 'mo', 'montana': 'mt',
+    'nebraska': 'ne', 'nevada': 'nv', 'new hampshire': 'nh', 'new jersey': 'nj', 'new mexico': 'nm',
+    'new york': 'ny', 'north carolina': 'nc', 'north dakota': 'nd', 'ohio': 'oh', 'oklahoma': 'ok',
+    'oregon': 'or', 'pennsylvania': 'pa', 'rhode island': 'ri', 'south carolina': 'sc', 'south dakota': 'sd',
+    'tennessee': 'tn', 'texas': 'tx', 'utah': 'ut', 'vermont': 'vt', 'virginia': 'va', 'washington': 'wa',
+    'west virginia': 'wv', 'wisconsin': 'wi', 'wyoming': 'wy',
+}
+# Abbreviations that are also everyday words (or MD, PA for the professions) only count spelled out
+AMBIGUOUS_STATES = {'in', 'or', 'me', 'hi', 'ok', 'oh', 'al', 'la', 'ma', 'pa', 'md', 'de', 'co', 'id'}
+# Longest names first, so "west virginia" is not also read as "virginia"
+STATE_PATTERN = re.compile(r"\b(" + '|'.join(sorted(US_STATES, key=len, reverse=True)) + r")\b")
+STATE_ABBREVIATIONS = set(US_STATES.values()) - AMBIGUOUS_STATES
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, strip punctuation and filler words, collapse whitespace"""
+    tokens = re.findall(r"[a-z0-9]+", text.lower())
+    return ' '.join(token for token in tokens if token not in STOPWORDS)
+
+
+def _guard_tokens(normalized: str) -> List[str]:
+    """Tokens that must agree for a similar question to reuse a plan: numbers, negations and
+    US states (by abbreviation, whether spelled out or abbreviated)"""
+    states = [US_STATES[name] for name in STATE_PATTERN.findall(normalized)]
+    tokens = STATE_PATTERN.sub(' ', normalized).split()
+    states += [token for token in tokens if token in STATE_ABBREVIATIONS]
+    return sorted([token for token in tokens if token.isdigit() or token in NEGATIONS] + states)
+
+
+class PlannerCache:
+    """Cache of planner responses keyed on the user's question.
+
+    Lookups first try an exact match on the normalized question, then a TF-IDF cosine
+    similarity over all stored questions. A similar question is only reused when it
+    mentions the same numbers, negations and states ("more than 30 publications" must not
+    answer "more than 20", "did not prescribe" answer "prescribed", nor "in Texas" answer
+    "in Ohio"). Entries persist to a
+    JSON file and are evicted least-recently-used.
+    """
+
+    def __init__(self, path: Optional[str] = ".planner_cache.json", max_entries: int = 1000,
+                 similarity_threshold: float = 0.85):
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectorizer = None
+        self._matrix = None
+        self._keys: List[str] = []
+        self._load()
+
+    def get(self, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+            else:
+                entry = self._most_similar(key)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                self.similar_hits += 1
+            entry['last_used'] = time.time()
+            entry['hits'] += 1
+            return entry['response']
+
+    def put(self, query: str, response: str):
+        key = normalize_query(query)
+        with self._lock:
+            now = time.time()
+            self.entries[key] = {'query': query, 'response': response, 'created': now, 'last_used': now, 'hits': 0}
+            while len(self.entries) > self.max_entries:
+                oldest = min(self.entries, key=lambda k: self.entries[k]['last_used'])
+                del self.entries[oldest]
+            self._matrix = None
+            self._save()
+
+    def forget(self, query: str):
+        """Drop the entry a query resolves to, e.g. after its response failed to parse"""
+        key = normalize_query(query)
+        with self._lock:
+            if self.entries.pop(key, None) is None:
+                entry = self._most_similar(key)
+                if entry is not None:
+                    self.entries = {k: v for k, v in self.entries.items() if v is not entry}
+            self._matrix = None
+            self._save()
+
+    def _most_similar(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.entries or not key:
+            return None
+        if self._matrix is None:
+            self._fit()
+        if self._matrix is None:
+            return None
+        scores = self._similarities(key)
+        guard = _guard_tokens(key)
+        for index in scores.argsort()[::-1]:
+            if scores[index] < self.similarity_threshold:
+                break
+            if _guard_tokens(self._keys[index]) == guard:
+                return self.entries[self._keys[index]]
+        return None
+
+    def _similarities(self, key: str) -> np.ndarray:
+        """Cosine similarity of a question to every stored one.
+
+        Terms the vectorizer has never seen still count towards the question's norm, at the
+        idf of an unseen term; otherwise "Neurologists in Nevada" would look identical to a
+        stored "Neurologists in California" once "nevada" dropped out of the vocabulary.
+        """
+        query = self._vectorizer.transform([key])
+        unseen = sum(1 for term in self._vectorizer.build_analyzer()(key) if term not in self._vectorizer.vocabulary_)
+        unseen_idf = np.log(len(self._keys) + 1) + 1
+        norm = np.sqrt(query.multiply(query).sum() + unseen * unseen_idf ** 2)
+        if norm == 0:
+            return np.zeros(len(self._keys))
+        return (self._matrix @ query.T).toarray().ravel() / norm
+
+    def _fit(self):
+        # sklearn is only imported once a similarity lookup actually happens
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.preprocessing import normalize
+
+        self._keys = [key for key in self.entries if key]
+        if not self._keys:
+            return
+        self._vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, norm=None, token_pattern=r"[a-z0-9]+")
+        self._matrix = normalize(self._vectorizer.fit_transform(self._keys))
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f).get('entries', {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable planner cache {self.path}: {e}")
+            self.entries = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'exact_hits': self.exact_hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+        }
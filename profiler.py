@@ -0,0 +1,302 @@
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from executor import PlanExecutor
+from join_index import NpiJoinIndex
+from quiet import quietly
+from rollups import PrescriberRollup
+from tracing import Trace
+
+
+# Executor functions whose CPU time counts toward each stage; stage names are the trace span categories
+STAGE_FUNCTIONS = {
+    'filter': [PlanExecutor._apply_filters],
+    'claims_filter': [PlanExecutor._apply_claims_filters],
+    'order': [PlanExecutor._order_rows, PlanExecutor._apply_ordering],
+    'join': [NpiJoinIndex.claims_rows_for, NpiJoinIndex.claims_of, NpiJoinIndex.claims_count_for,
+             NpiJoinIndex.prescriber_codes, NpiJoinIndex.hcp_rows_for_codes, NpiJoinIndex.hcp_rows_with_codes],
+    'rollup': [PrescriberRollup.metrics],
+    'project': [PlanExecutor._take],
+}
+STAGE_CODES = {
+    (code.co_filename, code.co_firstlineno, code.co_name): stage
+    for stage, functions in STAGE_FUNCTIONS.items() for code in (function.__code__ for function in functions)
+}
+
+
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds into collapsed-stack counts.
+
+    Only stacks inside PlanExecutor.execute_plan are kept, rooted at the name of the plan
+    being sampled, so one profile covers a whole plan file. `folded()` is the format of
+    flamegraph.pl, inferno and speedscope: one "root;frame;...;frame count" line per stack.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.counts: Counter = Counter()
+        self._root = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextlib.contextmanager
+    def sampling(self, root: str):
+        self._root = root
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        entry = PlanExecutor.execute_plan.__code__
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                if code is entry:
+                    self.counts[';'.join([self._root] + stack[::-1])] += 1
+                    break
+                frame = frame.f_back
+
+    def folded(self) -> str:
+        return '\n'.join(f"{stack} {count}" for stack, count in sorted(self.counts.items())) + '\n'
+
+
+def _stage_totals(trace: Trace, field: str) -> Dict[str, float]:
+    """Sum of a span field per stage category (filter, claims_filter, order, join, ...) in one trace"""
+    totals: Dict[str, float] = {}
+    for span in trace.spans:
+        stage = span.name.split(':')[0]
+        value = span.duration_ns / 1e6 if field == 'ms' else span.alloc_bytes
+        if stage != 'execute' and value is not None:
+            totals[stage] = totals.get(stage, 0) + value
+    return totals
+
+
+def profile_plan(executor: PlanExecutor, name: str, plan: Dict[str, Any], repeat: int = 5,
+                 sampler: Optional[StackSampler] = None, top: int = 10) -> Dict[str, Any]:
+    """Wall time per stage over `repeat` runs, then one run under cProfile and one under tracemalloc.
+
+    Stage wall times come from the trace spans (median across runs). Stage CPU time is the
+    cumulative process time of the STAGE_FUNCTIONS under cProfile: it includes what a stage
+    calls (order includes the takes of its sort keys) and the profiler's own overhead, so it
+    ranks stages against each other rather than matching wall time. Allocations are the net
+    bytes each stage's spans left allocated. The stack sampler runs during the timed runs only.
+    """
+    quietly(executor.execute_plan, plan)
+
+    seconds, stage_runs = [], []
+    rows = 0
+    with sampler.sampling(name) if sampler else contextlib.nullcontext():
+        for _ in range(repeat):
+            trace = Trace(name)
+            started = time.perf_counter()
+            result_df = quietly(trace.run, executor.execute_plan, plan)
+            seconds.append(time.perf_counter() - started)
+            rows = len(result_df)
+            stage_runs.append(_stage_totals(trace, 'ms'))
+
+    profiler = cProfile.Profile(time.process_time)
+    profiler.runcall(_quietly, executor.execute_plan, plan)
+    stats = pstats.Stats(profiler).stats
+    stage_cpu: Dict[str, float] = {}
+    for key, (_, calls, own, cumulative, _) in stats.items():
+        if key in STAGE_CODES:
+            stage_cpu[STAGE_CODES[key]] = stage_cpu.get(STAGE_CODES[key], 0.0) + cumulative * 1000
+    functions = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        trace = Trace(name)
+        quietly(trace.run, executor.execute_plan, plan)
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    stage_alloc = _stage_totals(trace, 'alloc')
+
+    ms = np.array(seconds) * 1000
+    stages = sorted(set().union(*stage_runs, stage_cpu, stage_alloc))
+    return {
+        'rows': rows,
+        'median_ms': float(np.median(ms)),
+        'min_ms': float(ms.min()),
+        'peak_alloc_bytes': int(peak),
+        'stages': {
+            stage: {
+                'wall_ms': float(np.median([run.get(stage, 0.0) for run in stage_runs])),
+                'cpu_ms': stage_cpu.get(stage),
+                'alloc_bytes': stage_alloc.get(stage),
+            }
+            for stage in stages
+        },
+        'top_functions': [
+            {'function': f"{os.path.basename(file)}:{line}({function})", 'calls': calls,
+             'own_ms': own * 1000, 'total_ms': cumulative * 1000}
+            for (file, line, function), (_, calls, own, cumulative, _) in functions
+        ],
+    }
+
+
+def run_profile(executor: PlanExecutor, plans: List[Tuple[str, Dict[str, Any]]], repeat: int = 5,
+                interval: float = 0.005, top: int = 10) -> Tuple[Dict[str, Any], StackSampler]:
+    """Profile every (name, plan); returns the report and the sampler holding the collapsed stacks"""
+    sampler = StackSampler(interval)
+    results = {}
+    for name, plan in plans:
+        results[name] = profile_plan(executor, name, plan, repeat, sampler, top)
+        print_plan_profile(name, results[name], top)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'dataset': {'providers': len(executor.hcp_df), 'claims': len(executor.claims_df)},
+        'plans': results,
+    }
+    return report, sampler
+
+
+def print_plan_profile(name: str, result: Dict[str, Any], top: int = 5):
+    print(f"\n🔬 {name}: {result['rows']} rows, median {result['median_ms']:.2f} ms "
+          f"(min {result['min_ms']:.2f}), peak {result['peak_alloc_bytes'] / 1024:.1f} KiB allocated")
+    print(f"   {'stage':<16} {'wall ms':>10} {'cProfile ms':>12} {'alloc KiB':>10}")
+    for stage, values in sorted(result['stages'].items(), key=lambda item: -item[1]['wall_ms']):
+        cpu = '' if values['cpu_ms'] is None else f"{values['cpu_ms']:.2f}"
+        alloc = '' if values['alloc_bytes'] is None else f"{values['alloc_bytes'] / 1024:.1f}"
+        print(f"   {stage:<16} {values['wall_ms']:>10.2f} {cpu:>12} {alloc:>10}")
+    for function in result['top_functions'][:top]:
+        print(f"   {function['own_ms']:>9.2f} ms own {function['total_ms']:>9.2f} ms total "
+              f"{function['calls']:>7}x  {function['function']}")
+
+
+def compare_profiles(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.25,
+                     min_ms: float = 1.0) -> List[str]:
+    """Print each shared plan's fastest run, head vs base; returns the plans slower by more than threshold.
+
+    The fastest of the repeated runs is the least noisy figure, so that is what is gated on. A
+    plan must also be `min_ms` slower, so sub-millisecond noise never fails the gate. The stages
+    of a regressed plan are listed (median wall ms) to show where the time went.
+    """
+    if base['dataset'] != head['dataset']:
+        print("⚠️ The baseline was profiled on a dataset of a different size")
+
+    regressions = []
+    print(f"{'plan':<40} {'base ms':>10} {'head ms':>10} {'change':>8}")
+    for name in base['plans']:
+        if name not in head['plans']:
+            continue
+        before, after = base['plans'][name]['min_ms'], head['plans'][name]['min_ms']
+        change = (after - before) / before if before else 0.0
+        regressed = change > threshold and after - before > min_ms
+        print(f"{name:<40} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{' ⚠️' if regressed else ''}")
+        if not regressed:
+            continue
+        regressions.append(name)
+        base_stages, head_stages = base['plans'][name]['stages'], head['plans'][name]['stages']
+        for stage in sorted(set(base_stages) | set(head_stages)):
+            stage_before = base_stages.get(stage, {}).get('wall_ms', 0.0)
+            stage_after = head_stages.get(stage, {}).get('wall_ms', 0.0)
+            print(f"   {stage:<37} {stage_before:>10.2f} {stage_after:>10.2f} {stage_after - stage_before:>+8.2f}")
+    return regressions
+
+
+def load_plans(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Read a JSONL of plans: each line a plan, or an object with "plan" and a "name" (or "query", as in batch files).
+
+    Unnamed plans are called plan<line>; names are what baselines are compared by.
+    """
+    plans, names = [], set()
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict) and isinstance(item.get('plan'), dict):
+                plan, name = item['plan'], str(item.get('name') or item.get('query') or f"plan{number}")
+            elif isinstance(item, dict) and ('query_type' in item or 'filters' in item):
+                plan, name = item, f"plan{number}"
+            else:
+                print(f"⚠️ Skipping line {number}: no plan to run")
+                continue
+            while name in names:
+                name = f"{name}#{number}"
+            names.add(name)
+            plans.append((name, plan))
+    return plans
+
+
+def run_profile_cli(argv: List[str]):
+    parser = argparse.ArgumentParser(prog='main.py profile',
+                                     description='Profile plan execution by stage and check it against a baseline')
+    parser.add_argument('plans', help='JSONL file: a plan per line, or {"name": ..., "plan": {...}}')
+    parser.add_argument('--providers', default='data/providers.csv')
+    parser.add_argument('--claims', default='data/Mounjaro Claim Sample.csv')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per plan')
+    parser.add_argument('--interval', type=float, default=0.005, help='seconds between stack samples')
+    parser.add_argument('--top', type=int, default=5, help='functions listed per plan, by own CPU time')
+    parser.add_argument('--flamegraph', help='write collapsed stacks here (flamegraph.pl, inferno, speedscope)')
+    parser.add_argument('--out', help='write the profile report JSON here')
+    parser.add_argument('--baseline', help='profile report to compare against; regressions exit with status 1')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to --baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.25, help='relative slowdown flagged as a regression')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='smallest absolute slowdown flagged as a regression')
+    args = parser.parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        parser.error('--save-baseline needs --baseline')
+
+    plans = load_plans(args.plans)
+    executor = PlanExecutor(args.providers, args.claims)
+    report, sampler = run_profile(executor, plans, args.repeat, args.interval, args.top)
+
+    if args.flamegraph:
+        with open(args.flamegraph, 'w') as f:
+            f.write(sampler.folded())
+        print(f"\n🔥 {sum(sampler.counts.values())} stack samples → {args.flamegraph}")
+    paths = [args.out] + ([args.baseline] if args.save_baseline else [])
+    for path in filter(None, paths):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved profile to {path}")
+
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        print()
+        regressions = compare_profiles(base, report, args.threshold, args.min_ms)
+        if regressions:
+            print(f"❌ {len(regressions)} plans regressed over {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
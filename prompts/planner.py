@@ -63,7 +63,7 @@ PLAN_SCHEMA = """
   "properties": {
     "query_type": {
       "type": "string",
-      "enum": ["hcp", "claims_by_doctor", "claims_only", "hcp_with_claims"]
+      "enum": ["hcp", "claims_by_doctor", "claims_only", "hcp_with_claims", "hcp_with_claims_metrics"]
     },
     "filters": {
       "type": "object",
@@ -78,7 +78,8 @@ PLAN_SCHEMA = """
         "publications_max": { "type": ["integer","null"] },
         "clinical_trials_min": { "type": ["integer","null"] },
         "has_linkedin": { "type": ["boolean","null"] },
-        "has_twitter": { "type": ["boolean","null"] }
+        "has_twitter": { "type": ["boolean","null"] },
+        "approximate_names": { "type": ["boolean","null"] }
       },
       "additionalProperties": false
     },
@@ -130,13 +131,20 @@ QUERY TYPE DETECTION (be intelligent about the user's intent):
 - "all [drug] claims" → query_type: "claims_only" (direct claims query)
 - "doctors with claims at [pharmacy]" → query_type: "hcp_with_claims" (find claims first, then doctors)
 - "doctors who prescribed [drug]" → query_type: "hcp_with_claims" (find claims first, then doctors)
+- "top prescribers of [drug]", "doctors by prescription volume / patients / paid amount" → query_type: "hcp_with_claims_metrics" (doctors with per-prescriber claim metrics)
 - Standard doctor queries → query_type: "hcp"
 
 INTELLIGENT FILTERING:
 - For claims_by_doctor: Use doctor name to find NPI, then find claims
 - For hcp_with_claims: Filter claims first, then find matching doctors
 - For claims_only: Direct claims filtering
+- For hcp_with_claims_metrics: Like hcp_with_claims, and each doctor also gets metrics over their matching claims:
+  total_prescriptions (claim count), unique_patients (distinct PATIENT_ID), total_paid_amt (sum of TOTAL_PAID_AMT)
+  and total_days_supply (sum of DAYS_SUPPLY_VAL). Project the metrics you order by.
 - Extract actual values from queries (names, drugs, pharmacies, etc.)
+- hospital_any and system_any match whole hospital/system names. Set approximate_names: true only when the user
+  gives part of a name or is unsure of it; then names containing the value, or failing that the closest ones, match.
+  It also lets a claims_by_doctor name_contains that no doctor's name contains match the closest names instead
 
 RULES:
 - Output ONLY valid JSON conforming to the Plan Schema
@@ -200,6 +208,20 @@ Query: "Show all Mounjaro claims in last 6 months"
   "plan_notes": "Direct query on Claims data for Mounjaro prescriptions in last 6 months"
 }}
 
+Query: "Top 10 Mounjaro prescribers in the last year by number of patients"
+{{
+  "query_type": "hcp_with_claims_metrics",
+  "filters": {{}},
+  "claims_filters": {{
+    "drug_any": ["Mounjaro", "Tirzepatide"],
+    "date_range_months": 12
+  }},
+  "projection": ["npi", "name", "specialties", "states", "unique_patients", "total_prescriptions", "total_paid_amt"],
+  "order_by": ["unique_patients DESC", "total_prescriptions DESC"],
+  "limit": 10,
+  "plan_notes": "Aggregate Mounjaro claims from the last 12 months per prescriber, join onto doctors and rank by distinct patients"
+}}
+
 ---------------------
 HCP DATA DICTIONARY
 ---------------------
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Iterable
+from list_columns import list_items
+from ngram_index import NgramIndex
+
+
+class ProviderIndex:
+    """Inverted indexes (lowercased value -> sorted row positions) over the provider table.
+
+    The free-text columns also get a trigram index over their distinct values, so a plan that
+    asks for approximate names can resolve a value with no exact entry to the values
+    containing it or, failing that, the closest ones.
+    """
+
+    ARRAY_COLUMNS = ['specialties', 'states', 'hospital_names', 'system_names']
+    SCALAR_COLUMNS = ['org_type', 'best_hospital_name']
+    SEARCH_COLUMNS = ['hospital_names', 'system_names', 'best_hospital_name']
+
+    def __init__(self, hcp_df: pd.DataFrame):
+        self.size = len(hcp_df)
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+
+        for col in self.ARRAY_COLUMNS:
+            if col in hcp_df.columns:
+                self.postings[col] = self._build_postings(*list_items(hcp_df[col]))
+
+        for col in self.SCALAR_COLUMNS:
+            if col in hcp_df.columns:
+                values = hcp_df[col].reset_index(drop=True).dropna()
+                self.postings[col] = self._build_postings(values.index.to_numpy(dtype=np.int64), values)
+
+        self.ngrams: Dict[str, NgramIndex] = {
+            col: NgramIndex(list(self.postings[col])) for col in self.SEARCH_COLUMNS if col in self.postings
+        }
+
+    @staticmethod
+    def _build_postings(positions: np.ndarray, values: pd.Series) -> Dict[str, np.ndarray]:
+        if values.empty:
+            return {}
+        # Lowercase each distinct value once rather than every occurrence
+        codes, uniques = pd.factorize(values.astype(str))
+        lowered_codes, uniques = pd.factorize(pd.Index(uniques, dtype=object).str.lower())
+        codes = lowered_codes[codes]
+        # Positions arrive in row order, so a stable sort by value keeps each posting list sorted;
+        # a value listed twice by one provider only needs the repeat dropped
+        order = np.argsort(codes, kind='stable')
+        sorted_codes, sorted_positions = codes[order], positions[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_positions[1:] != sorted_positions[:-1])
+        sorted_codes, sorted_positions = sorted_codes[first], sorted_positions[first]
+        bounds = np.searchsorted(sorted_codes, np.arange(len(uniques) + 1))
+
+        postings = {}
+        for code, value in enumerate(uniques):
+            postings[value] = sorted_positions[bounds[code]:bounds[code + 1]]
+        return postings
+
+    def resolve(self, column: str, values: Iterable[str], approximate: bool = False) -> List[str]:
+        """Indexed values the given ones stand for: themselves (lowercased), or with `approximate`
+        an exact entry, else every entry containing it, else the closest"""
+        ngrams = self.ngrams.get(column) if approximate else None
+        if ngrams is None:
+            return [str(value).lower() for value in values]
+        postings = self.postings.get(column, {})
+        resolved = []
+        for value in values:
+            key = str(value).lower()
+            if key in postings:
+                resolved.append(key)
+                continue
+            ids = ngrams.contains(key)
+            if not len(ids):
+                ids = ngrams.closest(key)
+            resolved.extend(ngrams.values[i] for i in ids)
+        return resolved
+
+    def rows_any(self, column: str, values: Iterable[str]) -> np.ndarray:
+        """Union of the posting lists for any of the given values (case-insensitive)"""
+        postings = self.postings.get(column, {})
+        hits: List[np.ndarray] = [postings[v.lower()] for v in values if v.lower() in postings]
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+        if len(hits) == 1:
+            return hits[0]
+        return np.unique(np.concatenate(hits))
+
+    def mask_any(self, column: str, values: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.rows_any(column, values)] = True
+        return mask
@@ -0,0 +1,8 @@
+import contextlib
+import io
+
+
+def quietly(fn, *args, **kwargs):
+    """Call fn without the executor's progress prints"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
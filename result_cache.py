@@ -0,0 +1,113 @@
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+import pandas as pd
+
+# Plan keys whose values are matched case-insensitively and as sets by the executor
+CASE_INSENSITIVE_SECTIONS = ['filters', 'claims_filters']
+IGNORED_KEYS = ['plan_notes']
+
+
+def canonical_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Normal form of a plan: empty values dropped, filter values lowercased, sorted and deduplicated"""
+    canonical = {'query_type': plan.get('query_type') or 'hcp'}
+    for key, value in plan.items():
+        if key in IGNORED_KEYS or key == 'query_type' or _is_empty(value):
+            continue
+        if key in CASE_INSENSITIVE_SECTIONS and isinstance(value, dict):
+            section = {}
+            for name, filter_value in value.items():
+                if _is_empty(filter_value):
+                    continue
+                if isinstance(filter_value, list):
+                    filter_value = sorted({str(v).lower() for v in filter_value})
+                section[name] = filter_value
+            if section:
+                canonical[key] = section
+        else:
+            canonical[key] = value
+    return canonical
+
+
+def _is_empty(value) -> bool:
+    return value is None or (isinstance(value, (list, dict, str)) and len(value) == 0)
+
+
+def plan_cache_key(plan: Dict[str, Any]) -> str:
+    canonical = canonical_plan(plan)
+    if (canonical.get('claims_filters') or {}).get('date_range_months'):
+        # Windows are relative to now, but service dates are whole days, so results only move daily
+        canonical['as_of'] = date.today().isoformat()
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+class PlanResultCache:
+    """LRU cache of plan results, bounded by entry count and by result bytes.
+
+    Entries are tagged with the data version they were computed against; a lookup
+    under a different version drops everything.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[pd.DataFrame, int]]' = OrderedDict()
+        self._data_version: Optional[str] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str, data_version: Optional[str]) -> Optional[pd.DataFrame]:
+        with self._lock:
+            self._check_version(data_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, data_version: Optional[str], result_df: pd.DataFrame):
+        size = int(result_df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(data_version)
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result_df, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _check_version(self, data_version: Optional[str]):
+        if data_version != self._data_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._data_version = data_version
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
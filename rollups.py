@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+from growable import GrowableArray, SortedRuns
+
+METRICS = ['total_prescriptions', 'unique_patients', 'total_paid_amt', 'total_days_supply']
+# Claims columns the metrics are computed from, besides the prescriber NPI
+ROLLUP_COLUMNS = ['PATIENT_ID', 'TOTAL_PAID_AMT', 'DAYS_SUPPLY_VAL']
+PATIENT_BITS = 32
+
+
+class PrescriberRollup:
+    """Per-prescriber claim metrics over the join index's NPI code space.
+
+    Totals over every claim are computed once when the tables load and updated from
+    the new rows alone when claims are appended; metrics over a filtered subset of
+    claims are a few bincounts over the surviving rows. Distinct patients are counted
+    from unique (prescriber code, patient code) pairs. Every metric array has a trailing
+    zero slot, so indexing it with code -1 (no NPI) yields zero.
+    """
+
+    # Patients first seen in appends are looked up in a small index of their own until they
+    # amount to this share of the patients known at load (or at the last merge)
+    NEW_PATIENTS_MAX_RATIO = 0.125
+
+    def __init__(self, claims_df: pd.DataFrame, claims_codes: np.ndarray, num_codes: int):
+        self.num_codes = num_codes
+        self.claims_codes = claims_codes
+        self._patients = pd.Index([], dtype=object)
+        self._new_patients = pd.Index([], dtype=object)
+        self._patient_codes = GrowableArray(self._encode_patients(claims_df))
+        self._paid = GrowableArray(self._amounts(claims_df, 'TOTAL_PAID_AMT', np.float64))
+        self._days = GrowableArray(self._amounts(claims_df, 'DAYS_SUPPLY_VAL', np.int64))
+        self.pairs = SortedRuns(self._pairs(self.claims_codes, self.patient_codes))
+        self.totals = self.metrics(None)
+
+    @property
+    def patient_codes(self) -> np.ndarray:
+        return self._patient_codes.values
+
+    @property
+    def paid(self) -> np.ndarray:
+        return self._paid.values
+
+    @property
+    def days(self) -> np.ndarray:
+        return self._days.values
+
+    def _encode_patients(self, claims_df: pd.DataFrame) -> np.ndarray:
+        """Patient codes for new rows; patients not seen before get the next free codes"""
+        if 'PATIENT_ID' not in claims_df.columns:
+            return np.full(len(claims_df), -1, dtype=np.int64)
+        codes, uniques = pd.factorize(claims_df['PATIENT_ID'])
+        uniques = pd.Index(np.asarray(uniques, dtype=object))
+        mapped = self._patients.get_indexer(uniques)
+        fallback = mapped < 0
+        mapped[fallback] = self._new_patients.get_indexer(uniques[fallback])
+        mapped[fallback & (mapped >= 0)] += len(self._patients)
+        unseen = mapped < 0
+        known = len(self._patients) + len(self._new_patients)
+        mapped[unseen] = known + np.arange(unseen.sum())
+        self._new_patients = self._new_patients.append(uniques[unseen])
+        if len(self._new_patients) > self.NEW_PATIENTS_MAX_RATIO * len(self._patients):
+            self._patients = self._patients.append(self._new_patients)
+            self._new_patients = pd.Index([], dtype=object)
+        # Code -1 (missing) picks the trailing -1
+        return np.append(mapped, -1)[codes].astype(np.int64)
+
+    @staticmethod
+    def _amounts(claims_df: pd.DataFrame, column: str, dtype) -> np.ndarray:
+        if column not in claims_df.columns:
+            return np.zeros(len(claims_df), dtype=dtype)
+        values = pd.to_numeric(claims_df[column], errors='coerce')
+        # Missing amounts (rejected claims) add nothing, as in a pandas sum
+        return values.fillna(0).to_numpy(dtype=dtype)
+
+    @staticmethod
+    def _pairs(codes: np.ndarray, patients: np.ndarray) -> np.ndarray:
+        """Sorted distinct (prescriber code, patient code) pairs packed into one int64"""
+        known = (codes >= 0) & (patients >= 0)
+        return np.unique((codes[known] << PATIENT_BITS) | patients[known])
+
+    def metrics(self, rows: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+        """Metric arrays indexed by prescriber code, over `rows` (all claims when None)"""
+        if rows is None:
+            codes, patients, paid, days = self.claims_codes, self.patient_codes, self.paid, self.days
+        else:
+            codes, patients = self.claims_codes[rows], self.patient_codes[rows]
+            paid, days = self.paid[rows], self.days[rows]
+
+        pairs = self._pairs(codes, patients)
+        joined = codes >= 0
+        codes, paid, days = codes[joined], paid[joined], days[joined]
+        return {
+            'total_prescriptions': np.bincount(codes, minlength=self.num_codes + 1),
+            'unique_patients': np.bincount(pairs >> PATIENT_BITS, minlength=self.num_codes + 1),
+            # np.bincount of no codes at all comes back int64 even with weights
+            'total_paid_amt': np.bincount(codes, weights=paid, minlength=self.num_codes + 1).astype(np.float64),
+            'total_days_supply': np.bincount(codes, weights=days, minlength=self.num_codes + 1).astype(np.int64),
+        }
+
+    def extend(self, new_claims: pd.DataFrame, claims_codes: np.ndarray, num_codes: int):
+        """Fold appended claims into the totals.
+
+        `claims_codes` covers old and new rows; codes from `num_codes` on are NPIs the
+        join index had not seen before the append.
+        """
+        if num_codes > self.num_codes:
+            for name, values in self.totals.items():
+                # Existing codes keep their slots; the trailing zero slot moves to the end
+                self.totals[name] = np.append(values[:-1], np.zeros(num_codes - self.num_codes + 1, dtype=values.dtype))
+        self.num_codes = num_codes
+
+        start = len(self.patient_codes)
+        self.claims_codes = claims_codes
+        self._patient_codes.append(self._encode_patients(new_claims))
+        self._paid.append(self._amounts(new_claims, 'TOTAL_PAID_AMT', np.float64))
+        self._days.append(self._amounts(new_claims, 'DAYS_SUPPLY_VAL', np.int64))
+
+        delta = self.metrics(np.arange(start, len(self.patient_codes)))
+        pairs = self._pairs(claims_codes[start:], self.patient_codes[start:])
+        fresh = pairs[~self.pairs.contains(pairs)]
+        delta['unique_patients'] = np.bincount(fresh >> PATIENT_BITS, minlength=num_codes + 1)
+        for name in METRICS:
+            self.totals[name] = self.totals[name] + delta[name]
+        self.pairs.insert(fresh)
@@ -0,0 +1,361 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class RequestTimeout(Exception):
+    """A request ran out of time; `pending` is the work it left running, if any"""
+
+    def __init__(self, message: str, pending: Optional[Future] = None):
+        super().__init__(message)
+        self.pending = pending
+
+
+class ReadWriteLock:
+    """Many concurrent readers (queries) or one writer (a claims append); waiting writers go first"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writing = False
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+
+    def release_write(self):
+        with self._cond:
+            self._writing = False
+            self._cond.notify_all()
+
+
+class QueryService:
+    """A warm executor and planner behind bounded thread pools.
+
+    Planner calls run on `planner_concurrency` threads and plan execution on `workers`
+    threads. At most `workers + max_pending` requests are admitted at once; the next one
+    is turned away immediately (HTTP 503 with Retry-After) rather than queued without
+    bound. Every request has a deadline of `timeout` seconds covering planning and
+    execution, after which it gets HTTP 504. Python threads cannot be interrupted, so work
+    already running when its deadline passes finishes in the background and keeps its
+    admission slot until then; work still queued at its deadline is skipped.
+
+    Claims appends are off unless `append_dir` is given, and then only take files inside it.
+    """
+
+    def __init__(self, executor, planner=None, workers: int = 4, planner_concurrency: int = 8,
+                 max_pending: int = 16, timeout: float = 30.0, max_rows: int = 100,
+                 append_dir: Optional[str] = None):
+        self.executor = executor
+        self.planner = planner
+        self.append_dir = os.path.realpath(append_dir) if append_dir else None
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.execute_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='execute')
+        self.planner_pool = ThreadPoolExecutor(max_workers=planner_concurrency, thread_name_prefix='planner')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._data_lock = ReadWriteLock()
+        self._stats_lock = threading.Lock()
+        self.counters = {'admitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'timed_out': 0, 'in_flight': 0}
+
+    def _count(self, name: str, delta: int = 1):
+        with self._stats_lock:
+            self.counters[name] += delta
+
+    def handle(self, kind: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Serve one request; returns (HTTP status, JSON body)"""
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            return 503, {'error': 'Server is saturated, retry later'}
+
+        self._count('admitted')
+        self._count('in_flight')
+        outstanding: Optional[Future] = None
+        try:
+            deadline = time.monotonic() + float(payload.get('timeout') or self.timeout)
+            body = self._serve(kind, payload, deadline)
+            self._count('completed')
+            return 200, body
+        except RequestTimeout as e:
+            outstanding = e.pending
+            self._count('timed_out')
+            return 504, {'error': str(e)}
+        except PermissionError as e:
+            self._count('failed')
+            return 403, {'error': str(e)}
+        except (KeyError, ValueError, TypeError, FileNotFoundError) as e:
+            self._count('failed')
+            return 400, {'error': f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            self._count('failed')
+            return 500, {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            if outstanding is not None and not outstanding.done():
+                # Keep the slot until the abandoned work actually stops using a thread
+                outstanding.add_done_callback(lambda _: self._release())
+            else:
+                self._release()
+
+    def _release(self):
+        self._count('in_flight', -1)
+        self._slots.release()
+
+    def _serve(self, kind: str, payload: Dict[str, Any], deadline: float):
+        from agent import extract_json_plan
+        from tracing import Trace
+
+        if kind == 'append':
+            return self._await(self.execute_pool, self.append_claims, deadline, payload['path'])
+
+        trace = Trace(kind)
+        timings = {}
+        plan = payload.get('plan')
+        if kind == 'query':
+            if self.planner is None:
+                raise ValueError("This server has no planner; POST a plan to /plan instead")
+            started = time.perf_counter()
+            response = self._await(self.planner_pool, trace.run, deadline, self.planner.process_message, payload['query'])
+            try:
+                plan = json.loads(extract_json_plan(response))
+            except json.JSONDecodeError:
+                if hasattr(self.planner, 'forget'):
+                    self.planner.forget(payload['query'])
+                raise ValueError("The planner did not return a valid JSON plan")
+            timings['plan_seconds'] = time.perf_counter() - started
+        if not isinstance(plan, dict):
+            raise ValueError("Expected a JSON plan object")
+
+        if kind == 'explain':
+            return {'plan': plan, 'explain': self._await(self.execute_pool, self._execute, deadline, self.executor.explain, plan)}
+
+        started = time.perf_counter()
+        result_df = self._await(self.execute_pool, trace.run, deadline, self._execute, self.executor.execute_plan, plan)
+        timings['execute_seconds'] = time.perf_counter() - started
+
+        max_rows = int(payload.get('max_rows', self.max_rows))
+        body = {
+            'row_count': len(result_df),
+            'columns': list(result_df.columns),
+            'rows': json.loads(result_df.head(max_rows).to_json(orient='records', date_format='iso', default_handler=str)),
+            **timings,
+        }
+        if kind == 'query':
+            body['plan'] = plan
+        if payload.get('trace'):
+            body['trace'] = trace.to_dict()
+        return body
+
+    def _await(self, pool: ThreadPoolExecutor, fn: Callable, deadline: float, *args):
+        """Run fn on a pool and wait for it until the deadline"""
+        def guarded():
+            if time.monotonic() > deadline:
+                raise RequestTimeout("Deadline passed while queued")
+            return fn(*args)
+
+        future = pool.submit(guarded)
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            future.cancel()
+            raise RequestTimeout("Request exceeded its deadline", future)
+
+    def _execute(self, fn: Callable, plan: Dict[str, Any]):
+        """Run fn(plan) against the executor under the read lock, so no append happens meanwhile"""
+        self._data_lock.acquire_read()
+        try:
+            return fn(plan)
+        finally:
+            self._data_lock.release_read()
+
+    def _append_path(self, path: str) -> str:
+        if self.append_dir is None:
+            raise PermissionError("Appends are disabled; start the server with --append-dir to allow them")
+        resolved = os.path.realpath(os.path.join(self.append_dir, path))
+        if os.path.commonpath([resolved, self.append_dir]) != self.append_dir:
+            raise PermissionError(f"{path} is outside the append directory")
+        return resolved
+
+    def append_claims(self, path: str) -> Dict[str, Any]:
+        """Appends wait for running queries and hold new ones back until the indexes are consistent"""
+        path = self._append_path(path)
+        self._data_lock.acquire_write()
+        try:
+            added = self.executor.append_claims(path)
+        finally:
+            self._data_lock.release_write()
+        return {'added': added, 'data_version': self.executor.data_version}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.counters)
+        stats['data_version'] = self.executor.data_version
+        if self.executor.result_cache is not None:
+            stats['result_cache'] = self.executor.result_cache.stats()
+        planner_cache = getattr(self.planner, 'cache', None)
+        if planner_cache is not None:
+            stats['planner_cache'] = planner_cache.stats()
+        return stats
+
+    def close(self):
+        self.execute_pool.shutdown(wait=False, cancel_futures=True)
+        self.planner_pool.shutdown(wait=False, cancel_futures=True)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """JSON over HTTP: POST /plan, /query, /explain and /append; GET /health"""
+
+    protocol_version = 'HTTP/1.1'
+    ROUTES = {'/plan': 'plan', '/query': 'query', '/explain': 'explain', '/append': 'append'}
+
+    @property
+    def service(self) -> QueryService:
+        return self.server.service
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, self.service.stats())
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError("Expected a JSON object")
+        except ValueError as e:
+            self._reply(400, {'error': f"Invalid JSON body: {e}"})
+            return
+
+        if self.path in self.ROUTES:
+            status, body = self.service.handle(self.ROUTES[self.path], payload)
+            self._reply(status, body)
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+
+    def _reply(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+
+class QueryHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service: QueryService, verbose: bool = False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, QueryHandler)
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        # Headers and body go out in separate writes; without this, Nagle's algorithm and
+        # delayed ACKs add ~40 ms to every keep-alive response
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return request, client_address
+
+
+class QueryUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, path: str, service: QueryService, verbose: bool = False):
+        self.service = service
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, QueryHandler)
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('unix', 0)
+
+
+def run_server_cli(argv):
+    parser = argparse.ArgumentParser(prog='main.py serve', description='Serve plans and queries from a warm executor')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket path instead of TCP')
+    parser.add_argument('--workers', type=int, default=4, help='plan execution threads')
+    parser.add_argument('--planner-concurrency', type=int, default=8, help='concurrent planner calls')
+    parser.add_argument('--max-pending', type=int, default=16, help='admitted requests waiting for a thread before 503s')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request deadline in seconds')
+    parser.add_argument('--stub', action='store_true', help='serve /query with the stub planner instead of the LLM')
+    parser.add_argument('--providers', default='data/providers.csv')
+    parser.add_argument('--claims', default='data/Mounjaro Claim Sample.csv')
+    parser.add_argument('--append-dir', help='allow POST /append of claims files under this directory (off by default)')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    from executor import PlanExecutor
+    from result_cache import PlanResultCache
+
+    if args.stub:
+        from batch import StubPlanner
+        planner = StubPlanner()
+    else:
+        from agent import Agent
+        from planner_cache import PlannerCache
+        planner = Agent(cache=PlannerCache())
+
+    started = time.perf_counter()
+    executor = PlanExecutor(args.providers, args.claims, result_cache=PlanResultCache())
+    print(f"🔥 Executor warm in {time.perf_counter() - started:.2f}s")
+
+    service = QueryService(executor, planner, workers=args.workers, planner_concurrency=args.planner_concurrency,
+                           max_pending=args.max_pending, timeout=args.timeout, append_dir=args.append_dir)
+    if args.unix:
+        server = QueryUnixServer(args.unix, service, args.verbose)
+        where = f"unix:{args.unix}"
+    else:
+        server = QueryHTTPServer((args.host, args.port), service, args.verbose)
+        where = f"http://{args.host}:{server.server_address[1]}"
+
+    print(f"🚀 Serving on {where} ({args.workers} workers, {args.max_pending} pending, {args.timeout:g}s timeout)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Goodbye!")
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
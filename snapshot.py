@@ -0,0 +1,172 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, List, Optional
+
+# Bump whenever _preprocess_data changes what ends up in the tables, so stale snapshots are rebuilt
+SNAPSHOT_VERSION = 4
+
+
+class SnapshotStore:
+    """Parquet snapshots of the preprocessed tables, keyed by source file hash.
+
+    A snapshot lives in <root>/<key>/ where key is derived from the SHA-256 of both
+    source files and SNAPSHOT_VERSION. The manifest also records each source's size
+    and mtime, so an unchanged file is recognised without re-hashing it.
+    """
+
+    version = SNAPSHOT_VERSION
+
+    def __init__(self, root: str = ".snapshots"):
+        self.root = root
+
+    def key_for(self, paths: List[str]) -> str:
+        sources = self._read_sources_index()
+        digests = []
+        for path in paths:
+            stat = os.stat(path)
+            entry = sources.get(os.path.abspath(path))
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                digests.append(entry['sha256'])
+                continue
+            digest = self._hash_file(path)
+            sources[os.path.abspath(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+            digests.append(digest)
+        self._write_sources_index(sources)
+
+        combined = hashlib.sha256(f"v{self.version}:".encode() + ':'.join(digests).encode())
+        return combined.hexdigest()[:24]
+
+    def load(self, key: str, columns: Optional[Dict[str, List[str]]] = None) -> Optional[Dict[str, pd.DataFrame]]:
+        """Read every table of a snapshot, restricted to `columns[name]` where given"""
+        manifest = self.manifest(key)
+        if manifest is None:
+            return None
+        try:
+            tables = {}
+            for name in manifest['tables']:
+                wanted = (columns or {}).get(name)
+                tables[name] = self.read_columns(key, name, wanted, manifest)
+            return tables
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable snapshot {os.path.join(self.root, key)}: {e}")
+            return None
+    
+    def manifest(self, key: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.root, key, 'manifest.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def read_columns(self, key: str, name: str, columns: Optional[List[str]] = None,
+                     manifest: Optional[Dict] = None) -> pd.DataFrame:
+        manifest = manifest or self.manifest(key)
+        meta = manifest['tables'][name]
+        if columns is not None:
+            columns = [col for col in meta['columns'] if col in columns]
+        table = pq.read_table(os.path.join(self.root, key, f"{name}.parquet"), columns=columns, memory_map=True)
+        # Fixed-width binary and Arrow list columns come back as pandas Arrow arrays; the rest as numpy-backed columns
+        df = table.to_pandas(
+            types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_fixed_size_binary(t) or pa.types.is_list(t) else None,
+            ignore_metadata=True,
+        )
+        return self._restore(df, meta)
+
+    def save(self, key: str, tables: Dict[str, pd.DataFrame], sources: List[str]) -> bool:
+        directory = os.path.join(self.root, key)
+        staging = f"{directory}.tmp{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            os.makedirs(staging, exist_ok=True)
+            manifest = {
+                'version': self.version,
+                'sources': [os.path.abspath(path) for path in sources],
+                'tables': {},
+            }
+            for name, df in tables.items():
+                df.to_parquet(os.path.join(staging, f"{name}.parquet"), index=False)
+                manifest['tables'][name] = self._describe(df)
+            with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+        except Exception as e:
+            print(f"⚠️ Could not write snapshot: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+        self._prune(keep=key, sources=manifest['sources'])
+        return True
+
+    @staticmethod
+    def _describe(df: pd.DataFrame) -> Dict[str, List[str]]:
+        list_columns = [
+            col for col in df.columns
+            if df[col].dtype == object and df[col].map(lambda x: isinstance(x, list)).any()
+        ]
+        object_columns = [col for col in df.columns if df[col].dtype == object and col not in list_columns]
+        return {'columns': list(df.columns), 'list_columns': list_columns, 'object_columns': object_columns}
+
+    @staticmethod
+    def _restore(df: pd.DataFrame, meta: Dict[str, List[str]]) -> pd.DataFrame:
+        # Parquet hands back lists as ndarrays and missing strings as None; restore the in-memory forms
+        for col in meta['list_columns']:
+            if col in df.columns:
+                df[col] = [list(x) if isinstance(x, np.ndarray) else x for x in df[col]]
+        for col in meta['object_columns']:
+            if col in df.columns:
+                df[col] = df[col].where(df[col].notna(), np.nan)
+        return df
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _read_sources_index(self) -> Dict[str, Dict]:
+        try:
+            with open(os.path.join(self.root, 'sources.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_sources_index(self, sources: Dict[str, Dict]):
+        """Best effort: if the index cannot be written, the next key_for just hashes the sources again"""
+        tmp_path = None
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            # A temporary file of its own, so concurrent writers never share or truncate one another's
+            with tempfile.NamedTemporaryFile('w', dir=self.root, prefix='sources.', suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                json.dump(sources, f)
+            os.replace(tmp_path, os.path.join(self.root, 'sources.json'))
+        except OSError as e:
+            print(f"⚠️ Could not write the snapshot sources index: {e}")
+            if tmp_path is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp_path)
+
+    def _prune(self, keep: str, sources: List[str]):
+        """Drop older snapshots built from the same source files"""
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if entry == keep or not os.path.isdir(path):
+                continue
+            try:
+                with open(os.path.join(path, 'manifest.json')) as f:
+                    superseded = json.load(f).get('sources') == sources
+            except (OSError, ValueError):
+                superseded = False
+            if superseded:
+                shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,138 @@
+import importlib
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, List, Optional, Tuple
+
+# The heavy dependencies, imported one at a time ahead of the modules that use them so that the
+# report shows what an import costs; each is only counted once
+DATA_MODULES = ['numpy', 'pandas', 'pyarrow']
+PLANNER_MODULES = ['openai']
+
+
+class StartupTimer:
+    """Wall time of each startup stage, as offsets from when the CLI started"""
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.stages: List[Tuple[str, float, float, str]] = []   # name, start, duration, thread
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter() - start)
+
+    def mark(self, name: str):
+        """A point in time, e.g. the first prompt being shown"""
+        self._record(name, time.perf_counter(), 0.0)
+
+    def _record(self, name: str, start: float, duration: float):
+        with self._lock:
+            self.stages.append((name, start - self.origin, duration, threading.current_thread().name))
+
+    def report(self) -> str:
+        lines = [f"{'stage':<28} {'at ms':>9} {'took ms':>9}  thread"]
+        for name, start, duration, thread in sorted(self.stages, key=lambda stage: stage[1]):
+            lines.append(f"{name:<28} {start * 1000:>9.1f} {duration * 1000:>9.1f}  {thread}")
+        return '\n'.join(lines)
+
+
+class WarmStart:
+    """Import the planner and the executor and load the data on a background thread.
+
+    The CLI shows its prompt straight away and the work happens while the first query is being
+    typed: the executor and its data first (pandas, pyarrow, the snapshot), since that is the
+    long pole, then the planner (openai, the planner cache; its OpenAI client is still only
+    created on first use). Both loads are mostly imports, which hold the GIL, so a second
+    thread would only interleave them and push the data back. Each is a Future, and whatever
+    asks for one before it is ready waits for it. The thread is a daemon so quitting early
+    does not wait for the load to finish.
+    """
+
+    def __init__(self, providers_path: str, claims_path: str, timer: Optional[StartupTimer] = None):
+        self.providers_path = providers_path
+        self.claims_path = claims_path
+        self.timer = timer or StartupTimer()
+        self.agent: Future = Future()
+        self.executor: Future = Future()
+        self._thread = threading.Thread(target=self._run, name='warm-start', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for future, load in ((self.executor, self._load_executor), (self.agent, self._load_agent)):
+            try:
+                future.set_result(load())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _import(self, modules: List[str]):
+        for module in modules:
+            try:
+                with self.timer.stage(f"import {module}"):
+                    importlib.import_module(module)
+            except ImportError:
+                # Reported by whichever module actually needs it
+                pass
+
+    def _load_agent(self):
+        self._import(PLANNER_MODULES)
+        with self.timer.stage('import agent'):
+            from agent import Agent
+            from planner_cache import PlannerCache
+        with self.timer.stage('planner cache'):
+            return Agent(cache=PlannerCache())
+
+    def _load_executor(self):
+        self._import(DATA_MODULES)
+        with self.timer.stage('import executor'):
+            from executor import PlanExecutor
+            from result_cache import PlanResultCache
+        with self.timer.stage('load data'):
+            return PlanExecutor(self.providers_path, self.claims_path, result_cache=PlanResultCache())
+
+    def _wait(self, future: Future, what: str) -> Any:
+        if not future.done():
+            print(f"⏳ Still loading {what}...")
+        return future.result()
+
+    def get_agent(self):
+        return self._wait(self.agent, 'the planner')
+
+    def get_executor(self):
+        return self._wait(self.executor, 'the data')
+
+    def wait(self):
+        """Block until everything is loaded, raising what failed to load"""
+        self.agent.result()
+        self.executor.result()
+
+    def report(self) -> str:
+        """Startup stages, plus the executor's own load breakdown once it is loaded"""
+        lines = [self.timer.report()]
+        if not self.executor.done():
+            lines.append("(still loading)")
+        elif self.executor.exception() is None:
+            lines += ["", "Data load stages:", self.executor.result().load_trace.report()]
+        return '\n'.join(lines)
+
+
+def run_startup_cli(argv: List[str], origin: Optional[float] = None):
+    """`main.py startup`: time a cold start up to the prompt and then to fully loaded, without the REPL"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='main.py startup', description=run_startup_cli.__doc__)
+    parser.add_argument('--providers', default='data/providers.csv')
+    parser.add_argument('--claims', default='data/Mounjaro Claim Sample.csv')
+    args = parser.parse_args(argv)
+
+    timer = StartupTimer(origin)
+    warm = WarmStart(args.providers, args.claims, timer)
+    timer.mark('prompt ready')
+    warm.wait()
+    timer.mark('fully loaded')
+    print(f"🚀 Startup\n{warm.report()}")
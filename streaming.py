@@ -0,0 +1,329 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from executor import PlanExecutor
+from claims_match import ClaimsMatcher
+from columnar_store import ColumnarStore
+from join_index import NpiJoinIndex
+from rollups import PrescriberRollup, ROLLUP_COLUMNS
+from tracing import span
+
+
+def scan_csv_dtypes(path: str, chunksize: int = 100_000) -> Dict[str, Any]:
+    """The dtype each column of a CSV gets when it is read whole, found chunk by chunk.
+
+    Type inference per chunk depends on where chunks split: a code column with a few text
+    values is text in the chunks that have one and float elsewhere, an integer column with
+    gaps is float only in chunks with a gap. Reading every chunk with these dtypes gives
+    it the types a full load gives the whole table.
+    """
+    seen: Dict[str, set] = {}
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        for col, dtype in chunk.dtypes.items():
+            seen.setdefault(col, set()).add(dtype)
+    dtypes = {}
+    for col, kinds in seen.items():
+        if any(kind == object for kind in kinds):
+            dtypes[col] = str
+        elif any(pd.api.types.is_float_dtype(kind) for kind in kinds):
+            dtypes[col] = np.float64
+        elif len(kinds) == 1:
+            dtypes[col] = kinds.pop()
+    return dtypes
+
+
+class StreamingPlanExecutor(PlanExecutor):
+    """PlanExecutor that streams the claims file chunk by chunk instead of loading it.
+
+    Providers are loaded and indexed as usual. Claims plans read the claims CSV in
+    chunks, push the doctor NPI join and the claims filters into every chunk, and merge
+    the survivors with bounded memory: a limit without order_by stops reading as soon as
+    enough rows are found, and order_by + limit keeps only a running top-k.
+    """
+
+    # Whether chunks hold consecutive rows of the file, one after another
+    chunks_in_row_order = True
+
+    def __init__(self, csv_path: str = "data/providers.csv", claims_path: str = "data/Mounjaro Claim Sample.csv",
+                 snapshot_dir: Optional[str] = ".snapshots", chunksize: int = 100_000):
+        super().__init__(csv_path, None, snapshot_dir)
+        self.claims_path = claims_path
+        self.chunksize = chunksize
+        # The file's schema, so a plan can read just the columns it needs from it
+        self.claims_columns = list(pd.read_csv(claims_path, nrows=0).columns)
+        self._claims_dtypes: Optional[Dict[str, Any]] = None
+
+    def claims_dtypes(self) -> Dict[str, Any]:
+        """Whole-file column types of the claims CSV, scanned once on first use"""
+        with self._lazy_lock:
+            if self._claims_dtypes is None:
+                with span('load:claims_dtypes'):
+                    self._claims_dtypes = scan_csv_dtypes(self.claims_path, self.chunksize)
+            return self._claims_dtypes
+
+    def append_claims(self, claims) -> int:
+        """Not supported: claims are streamed from claims_path on every query, so there is
+        no resident table to grow. Append the rows to that file instead; the next query sees them.
+        """
+        raise ValueError(f"Claims are streamed from {self.claims_path}; append to that file instead")
+
+    def _claims_chunks(self, plan: Dict[str, Any],
+                       npis: Optional[List[str]] = None) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+        """Yield (chunk, surviving positions) for each chunk of claims the plan has to look at"""
+        filters = plan.get('claims_filters')
+        now = datetime.now()
+        predicates = self.optimizer.claims_predicates(filters)
+        match_columns = [
+            col for filter_key, columns in self.MATCHED_CLAIMS_FILTERS
+            if filters and filters.get(filter_key) for col in columns
+        ]
+        for chunk in self._read_claims(plan, npis, now):
+            rows = self._all_rows(chunk)
+            if npis is not None:
+                rows = np.flatnonzero(chunk['PRESCRIBER_NPI_NBR'].isin(npis).to_numpy())
+            if filters and len(rows):
+                rows = self._apply_claims_filters(rows, filters, chunk, ClaimsMatcher(chunk, match_columns), now, predicates)
+            yield chunk, rows
+
+    def _read_claims(self, plan: Dict[str, Any], npis: Optional[List[str]], now: datetime) -> Iterator[pd.DataFrame]:
+        """Preprocessed chunks of the claims file, labelled by row position in the preprocessed file.
+
+        Only the columns the plan reads are parsed, and results carry the same index a fully
+        loaded PlanExecutor would give them.
+        """
+        # Preprocessing drops rows without a prescriber NPI, so that column is always read
+        wanted = set(self._plan_columns(plan)['claims']) | {'PRESCRIBER_NPI_NBR'}
+        usecols = [col for col in self.claims_columns if col in wanted]
+        dtypes = self.claims_dtypes()
+        offset = 0
+        reader = pd.read_csv(self.claims_path, chunksize=self.chunksize, usecols=usecols,
+                             dtype={col: dtypes[col] for col in usecols if col in dtypes})
+        while True:
+            with span('load:chunk') as stage:
+                chunk = next(reader, None)
+                if chunk is None:
+                    break
+                chunk = stage.output(self._preprocess_claims(chunk.reset_index(drop=True)))
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+    def _merge_chunks(self, chunks: Iterator[Tuple[pd.DataFrame, np.ndarray]], plan: Dict[str, Any]) -> pd.DataFrame:
+        limit = plan.get('limit')
+        result_df = None
+        found = 0
+        hidden = []
+        if plan.get('projection') and plan.get('order_by'):
+            # Chunk results keep their sort keys until the merge is done, projected or not
+            hidden = [col for col, _ in self._sort_specs(plan['order_by'])
+                      if col not in plan['projection'] and col in self.claims_columns]
+            plan = dict(plan, projection=list(plan['projection']) + hidden)
+
+        for chunk, rows in chunks:
+            part = self._materialize(chunk, rows, plan)
+            found += len(rows)
+            if result_df is None or (result_df.empty and not part.empty):
+                result_df = part
+            elif not part.empty:
+                result_df = self._concat_parts([result_df, part])
+            if limit and not self.chunks_in_row_order:
+                # Ties and the limit go to the rows a full scan would see first
+                result_df = result_df.sort_index(kind='stable')
+
+            if plan.get('order_by') and limit:
+                # top-k of the union is the top-k of every chunk's own top-k; earlier rows win ties
+                result_df = self._apply_ordering(result_df, plan['order_by'], limit)
+            elif limit and len(result_df) >= limit:
+                result_df = result_df.head(limit)
+                # Chunks come by first row, so once one starts past the rows kept, none after it has earlier rows
+                if self.chunks_in_row_order or chunk.index.min() > result_df.index.max():
+                    break
+
+        if result_df is None:
+            return pd.DataFrame()
+        if not limit and not self.chunks_in_row_order:
+            result_df = result_df.sort_index(kind='stable')
+        if plan.get('order_by') and not limit:
+            result_df = self._apply_ordering(result_df, plan['order_by'])
+        result_df = result_df.drop(columns=[col for col in hidden if col in result_df.columns])
+        print(f"💊 Streamed {found} matching claims")
+        return result_df
+
+    @staticmethod
+    def _concat_parts(parts: List[pd.DataFrame]) -> pd.DataFrame:
+        """Concatenate chunks' results, resolving per-chunk dtype differences of all-missing columns.
+
+        A column with no values in one chunk (REJECT_REASON_4_CD, say) is read as float there
+        and as text elsewhere; it takes the dtype of the first chunk that has values (the last
+        chunk's if none has), which is what pandas does today and what it warns it will stop doing.
+        """
+        parts = list(parts)
+        for col in parts[0].columns:
+            if not all(col in part.columns for part in parts) or len({part[col].dtype for part in parts}) == 1:
+                continue
+            missing = [part[col].isna().all() for part in parts]
+            dtype = next((part[col].dtype for part, empty in zip(parts, missing) if not empty), parts[-1][col].dtype)
+            for i, empty in enumerate(missing):
+                if empty and parts[i][col].dtype != dtype:
+                    try:
+                        parts[i] = parts[i].astype({col: dtype})
+                    except (TypeError, ValueError):
+                        pass
+        return pd.concat(parts)
+
+    def _execute_claims_only(self, plan: Dict[str, Any]) -> pd.DataFrame:
+        return self._merge_chunks(self._claims_chunks(plan), plan)
+
+    def _execute_claims_by_doctor(self, plan: Dict[str, Any]) -> pd.DataFrame:
+        hcp_rows = self._resolve_doctors(plan)
+        if len(hcp_rows) == 0:
+            return pd.DataFrame()
+
+        doctor_npis = self.hcp_df['npi'].to_numpy()[hcp_rows].tolist()
+        return self._merge_chunks(self._claims_chunks(plan, doctor_npis), plan)
+
+    def _execute_hcp_with_claims(self, plan: Dict[str, Any]) -> pd.DataFrame:
+        print(f"🔍 Streaming claims with filters: {plan.get('claims_filters')}")
+
+        prescriber_npis = set()
+        found = 0
+        for chunk, rows in self._claims_chunks(plan):
+            if 'PRESCRIBER_NPI_NBR' not in chunk.columns:
+                print("❌ No prescriber NPI column in claims data")
+                return pd.DataFrame()
+            found += len(rows)
+            prescriber_npis.update(pd.unique(chunk['PRESCRIBER_NPI_NBR'].to_numpy()[rows]))
+
+        print(f"💊 Found {found} matching claims")
+        if found == 0:
+            print("❌ No claims found matching the criteria")
+            return pd.DataFrame()
+
+        print(f"🔗 Found {len(prescriber_npis)} unique prescriber NPIs")
+        rows = np.flatnonzero(self.hcp_df['npi'].isin(list(prescriber_npis)).to_numpy())
+        print(f"👨‍⚕️ Found {len(rows)} doctors with matching claims")
+
+        if plan.get('filters'):
+            rows = self._apply_filters(rows, plan['filters'])
+            print(f"🔍 After HCP filtering: {len(rows)} doctors")
+
+        return self._materialize(self.hcp_df, rows, plan)
+
+    def _execute_hcp_with_claims_metrics(self, plan: Dict[str, Any]) -> pd.DataFrame:
+        """Metrics over one pass of the claims: the matching claims' NPI, patient and amount columns are
+        gathered chunk by chunk, then rolled up exactly as a loaded claims table would be"""
+        rows = self._all_rows(self.hcp_df)
+        npis = None
+        if plan.get('filters'):
+            # A doctor's metrics only depend on their own claims, so only those need to be read
+            rows = self._apply_filters(rows, plan['filters'])
+            npis = self.hcp_df['npi'].to_numpy()[rows].tolist()
+        print(f"🔍 Streaming claims with filters: {plan.get('claims_filters')}")
+
+        columns = ['PRESCRIBER_NPI_NBR'] + ROLLUP_COLUMNS
+        parts = [chunk.iloc[claims_rows][[col for col in columns if col in chunk.columns]]
+                 for chunk, claims_rows in self._claims_chunks(plan, npis)]
+        # Row groups do not come strictly in row order; put the claims back in it so sums add up in the same order
+        claims = self._concat_parts(parts).sort_index(kind='stable') if parts else pd.DataFrame(columns=columns)
+        print(f"💊 Found {len(claims)} matching claims")
+
+        with span('rollup', rows_in=len(claims)):
+            join_index = NpiJoinIndex(self.hcp_df['npi'], claims['PRESCRIBER_NPI_NBR'])
+            metrics = PrescriberRollup(claims, join_index.claims_codes, len(join_index.keys)).totals
+        return self._metrics_result(plan, rows, metrics, join_index.hcp_codes)
+
+
+class ColumnarPlanExecutor(StreamingPlanExecutor):
+    """StreamingPlanExecutor over a partitioned Parquet copy of the claims file (see ColumnarStore).
+
+    The first run converts the CSV; later runs find the store by the file's hash. Each query
+    pushes its service date window, its substring filters and the NPIs it joins on down to
+    the row-group statistics, and reads just the plan's columns of the row groups that may
+    hold a match. Row groups come by first row, not strictly in row order, so the merge keeps
+    its running result in row order. Without a usable store it streams the CSV instead.
+    """
+
+    chunks_in_row_order = False
+
+    def __init__(self, csv_path: str = "data/providers.csv", claims_path: str = "data/Mounjaro Claim Sample.csv",
+                 snapshot_dir: Optional[str] = ".snapshots", store_dir: str = ".columnar", chunksize: int = 100_000):
+        super().__init__(csv_path, claims_path, snapshot_dir, chunksize)
+        self.claims_store = ColumnarStore(store_dir)
+        self.claims_key = self.claims_store.key_for([claims_path])
+        self.claims_manifest = self.claims_store.manifest(self.claims_key)
+        if self.claims_manifest is None:
+            with self.load_trace.span('columnar:build') as stage:
+                self.claims_manifest = self.claims_store.build(
+                    self.claims_key, claims_path, self._preprocess_claims, self._concat_parts, chunksize,
+                    self.claims_dtypes())
+                if self.claims_manifest is not None:
+                    stage.output(self.claims_manifest['rows'])
+                    print(f"🗂️ Converted {self.claims_manifest['rows']} claims into "
+                          f"{len(self.claims_manifest['row_groups'])} row groups")
+        self.chunks_in_row_order = self.claims_manifest is None
+
+    def _pushdown(self, plan: Dict[str, Any], now: datetime) -> Tuple[Optional[Tuple[datetime, datetime]], List[Tuple[Sequence[str], Sequence[str]]]]:
+        """The plan's claims filters as ColumnarStore.prune arguments: a service date window and substring matches"""
+        filters = plan.get('claims_filters') or {}
+        window = None
+        if filters.get('date_range_months'):
+            window = (now - timedelta(days=filters['date_range_months'] * 30), now)
+        matches = [(columns, filters[key]) for key, columns in self.MATCHED_CLAIMS_FILTERS if filters.get(key)]
+        return window, matches
+
+    def _read_claims(self, plan: Dict[str, Any], npis: Optional[List[str]], now: datetime) -> Iterator[pd.DataFrame]:
+        if self.claims_manifest is None:
+            yield from super()._read_claims(plan, npis, now)
+            return
+
+        wanted = set(self._plan_columns(plan)['claims']) | {'PRESCRIBER_NPI_NBR'}
+        columns = [col for col in self.claims_columns if col in wanted]
+        all_groups = self.claims_manifest['row_groups']
+        with span('columnar:prune', rows_in=len(all_groups)) as stage:
+            window, matches = self._pushdown(plan, now)
+            groups = stage.output(self.claims_store.prune(self.claims_key, self.claims_manifest, window, npis, matches))
+            read, total = self.claims_store.bytes_of(groups, columns), self.claims_store.bytes_of(all_groups)
+            stage.set(bytes_read=read, bytes_total=total)
+        print(f"📦 Reading {len(groups)} of {len(all_groups)} row groups "
+              f"({read / 2 ** 20:.1f} of {total / 2 ** 20:.1f} MiB on disk)")
+
+        for group in groups:
+            with span('load:row_group') as stage:
+                chunk = stage.output(self.claims_store.read_row_group(self.claims_key, self.claims_manifest, group, columns))
+            yield chunk
+
+    def _execute_hcp_with_claims(self, plan: Dict[str, Any]) -> pd.DataFrame:
+        if self.claims_manifest is None or not plan.get('filters'):
+            return super()._execute_hcp_with_claims(plan)
+
+        # Filter doctors first and push their NPIs into the claims scan
+        print(f"🔍 Looking for doctors with filters: {plan.get('filters')}")
+        rows = self._apply_filters(self._all_rows(self.hcp_df), plan['filters'])
+        npis = self.hcp_df['npi'].to_numpy()[rows].tolist()
+
+        prescriber_npis = set()
+        found = 0
+        for chunk, claims_rows in self._claims_chunks(plan, npis):
+            found += len(claims_rows)
+            prescriber_npis.update(pd.unique(chunk['PRESCRIBER_NPI_NBR'].to_numpy()[claims_rows]))
+        print(f"💊 Found {found} matching claims for {len(rows)} doctors")
+
+        if found == 0:
+            # Empty, with the projected provider columns; telling whether any other doctor's claims
+            # match (claims-first would return no columns then) would take a second full scan
+            print("❌ No claims found matching the criteria")
+            return self._materialize(self.hcp_df, rows[:0], plan)
+
+        rows = rows[pd.Series(npis, dtype=object).isin(prescriber_npis).to_numpy()]
+        print(f"👨‍⚕️ Found {len(rows)} doctors with matching claims")
+        return self._materialize(self.hcp_df, rows, plan)
+
+    def explain(self, plan: Dict[str, Any]) -> str:
+        text = super().explain(plan)
+        if self.claims_manifest is None or plan.get('query_type', 'hcp') == 'hcp':
+            return text
+        window, matches = self._pushdown(plan, datetime.now())
+        groups = self.claims_store.prune(self.claims_key, self.claims_manifest, window, None, matches)
+        return (f"{text}\n  prunes claims to {len(groups)} of {len(self.claims_manifest['row_groups'])} row groups "
+                f"before any NPI pushdown")
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from quiet import quietly
+from tests.reference import ReferenceExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    """A small synthetic providers/claims pair resampled from the sample files, with claims joined to providers
+    and service dates running up to this month"""
+    from bench.synthetic import SyntheticDataGenerator
+
+    out_dir = str(tmp_path_factory.mktemp('dataset'))
+    generator = SyntheticDataGenerator(os.path.join(ROOT, 'data/providers.csv'),
+                                       os.path.join(ROOT, 'data/Mounjaro Claim Sample.csv'), seed=7)
+    manifest = quietly(generator.generate, out_dir, num_providers=120, num_claims=3000, months=36, joined_fraction=0.7)
+    return manifest['providers_path'], manifest['claims_path']
+
+
+@pytest.fixture(scope='session')
+def reference(dataset):
+    return ReferenceExecutor(*dataset)
@@ -0,0 +1,77 @@
+import random
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from tests.reference import METRICS
+
+PROVIDER_COLUMNS = ['npi', 'name', 'specialties', 'states', 'num_publications', 'num_clinical_trials', 'org_type',
+                    'conditions', 'city_states']
+CLAIM_COLUMNS = ['RX_CLAIM_NBR', 'PATIENT_ID', 'SERVICE_DATE_DD', 'NDC_GENERIC_NM', 'NDC_PREFERRED_BRAND_NM',
+                 'TOTAL_PAID_AMT', 'PRESCRIBER_NPI_NBR', 'PAYER_PAYER_NM', 'PHARMACY_NPI_NM', 'DAYS_SUPPLY_VAL',
+                 'DISPENSE_NBR', 'TRANSACTION_DT', 'REJECT_REASON_1_CD', 'NDC', 'PAYER_ID']
+QUERY_TYPES = ['hcp', 'claims_only', 'claims_by_doctor', 'hcp_with_claims', 'hcp_with_claims_metrics']
+
+
+def _distinct(hcp_df: pd.DataFrame, column: str) -> List[str]:
+    return sorted({item for items in hcp_df[column] for item in items})
+
+
+def random_plans(hcp_df: pd.DataFrame, claims_df: pd.DataFrame, count: int, seed: int = 0,
+                 query_types: List[str] = QUERY_TYPES) -> List[Dict[str, Any]]:
+    """Random plans whose filter values are drawn from the data, so most of them select rows"""
+    rnd = random.Random(seed)
+    pools = {key: _distinct(hcp_df, column) for key, column in [
+        ('specialty_any', 'specialties'), ('state_any', 'states'),
+        ('hospital_any', 'hospital_names'), ('system_any', 'system_names'),
+    ]}
+    pools['org_type_any'] = sorted(hcp_df['org_type'].dropna().unique())
+    names = hcp_df['name'].dropna().tolist()
+    drugs = sorted(claims_df['NDC_PREFERRED_BRAND_NM'].dropna().unique()) + ['tirzep', 'zzz']
+    payers = sorted(claims_df['PAYER_PAYER_NM'].dropna().unique()) + ['health', 'zzz']
+    pharmacies = sorted(claims_df['PHARMACY_NPI_NM'].dropna().unique()) + ['pharmacy']
+
+    plans = []
+    for _ in range(count):
+        query_type = rnd.choice(query_types)
+        chance = rnd.choice([0.1, 0.35])
+        filters: Dict[str, Any] = {}
+        for key, pool in pools.items():
+            if pool and rnd.random() < chance:
+                picked = rnd.sample(pool, min(len(pool), rnd.randint(1, 3)))
+                filters[key] = [value.lower() if rnd.random() < 0.3 else value for value in picked]
+        if rnd.random() < 0.25:
+            filters['name_contains'] = [rnd.choice(names).split()[rnd.randint(0, 1)][:4].lower()]
+        if rnd.random() < 0.3:
+            filters['publications_min'] = rnd.choice([0, 5, 30])
+        if rnd.random() < 0.15:
+            filters['publications_max'] = rnd.choice([10, 100])
+        if rnd.random() < 0.15:
+            filters['has_linkedin'] = rnd.choice([True, False])
+
+        claims_filters: Dict[str, Any] = {}
+        if rnd.random() < 0.4:
+            claims_filters['drug_any'] = [value.lower() for value in rnd.sample(drugs, 1)]
+        if rnd.random() < 0.3:
+            claims_filters['payer_any'] = [rnd.choice(payers)[:8]]
+        if rnd.random() < 0.2:
+            claims_filters['pharmacy_any'] = [rnd.choice(pharmacies)[:6]]
+        if rnd.random() < 0.3:
+            claims_filters['date_range_months'] = rnd.choice([3, 12, 36])
+
+        if query_type == 'hcp_with_claims_metrics':
+            columns = ['npi', 'name'] + METRICS
+        elif query_type in ('hcp', 'hcp_with_claims'):
+            columns = PROVIDER_COLUMNS
+        else:
+            columns = CLAIM_COLUMNS
+        projection = rnd.sample(columns, rnd.randint(2, len(columns))) if rnd.random() < 0.9 else []
+        order_by = []
+        if rnd.random() < 0.8:
+            sortable = [col for col in projection or columns if col not in ('specialties', 'states', 'conditions', 'city_states')]
+            order_by = [f"{col} {rnd.choice(['ASC', 'DESC'])}" for col in rnd.sample(sortable, min(len(sortable), rnd.randint(1, 2)))]
+        plans.append({
+            'query_type': query_type, 'filters': filters, 'claims_filters': claims_filters or None,
+            'projection': projection, 'order_by': order_by, 'limit': rnd.choice([5, 50, None]),
+        })
+    return plans
@@ -0,0 +1,153 @@
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+LIST_COLUMNS = ['specialties', 'states', 'hospital_names', 'system_names', 'conditions', 'affiliations', 'city_states']
+METRICS = ['total_prescriptions', 'unique_patients', 'total_paid_amt', 'total_days_supply']
+
+
+def _parse_list(value) -> List[Any]:
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or value == '':
+        return []
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def _contains_any(values: pd.Series, needles: List[str]) -> pd.Series:
+    needles = [needle.lower() for needle in needles]
+    return values.map(lambda x: pd.notna(x) and any(needle in str(x).lower() for needle in needles)).astype(bool)
+
+
+def _lists_any(values: pd.Series, wanted: List[str]) -> pd.Series:
+    wanted = {value.lower() for value in wanted}
+    return values.map(lambda items: any(str(item).lower() in wanted for item in items)).astype(bool)
+
+
+class ReferenceExecutor:
+    """Plans executed the plain pandas way: copy the table, filter row by row, stable sort, head.
+
+    This is what the executor computed before it worked on positional row arrays, indexes
+    and compact encodings; every faster path must return the same frames.
+    """
+
+    def __init__(self, providers_path: str, claims_path: str):
+        self.hcp_df = pd.read_csv(providers_path)
+        self.hcp_df['name'] = self.hcp_df['first_name'] + ' ' + self.hcp_df['last_name']
+        self.hcp_df['npi'] = self.hcp_df['type_1_npi'].astype(str)
+        for col in LIST_COLUMNS:
+            if col in self.hcp_df.columns:
+                self.hcp_df[col] = self.hcp_df[col].map(_parse_list).astype(object)
+
+        claims_df = pd.read_csv(claims_path, low_memory=False)
+        for col in ['SERVICE_DATE_DD', 'DATE_PRESCRIPTION_WRITTEN_DD']:
+            claims_df[col] = pd.to_datetime(claims_df[col], errors='coerce')
+        claims_df['PRESCRIBER_NPI_NBR'] = claims_df['PRESCRIBER_NPI_NBR'].fillna(0).astype(float).astype(int).astype(str)
+        self.claims_df = claims_df[claims_df['PRESCRIBER_NPI_NBR'] != '0'].reset_index(drop=True)
+
+    def execute_plan(self, plan: Dict[str, Any], now: Optional[datetime] = None) -> pd.DataFrame:
+        query_type = plan.get('query_type', 'hcp')
+        filters, claims_filters = plan.get('filters') or {}, plan.get('claims_filters') or {}
+
+        if query_type == 'claims_only':
+            result_df = self._claims_filter(self.claims_df.copy(), claims_filters, now)
+        elif query_type == 'claims_by_doctor':
+            doctors = self._filter(self.hcp_df.copy(), filters)
+            if doctors.empty:
+                return pd.DataFrame()
+            result_df = self.claims_df[self.claims_df['PRESCRIBER_NPI_NBR'].isin(doctors['npi'])]
+            result_df = self._claims_filter(result_df, claims_filters, now)
+        elif query_type == 'hcp_with_claims':
+            claims_df = self._claims_filter(self.claims_df.copy(), claims_filters, now)
+            if claims_df.empty:
+                return pd.DataFrame()
+            result_df = self.hcp_df[self.hcp_df['npi'].isin(claims_df['PRESCRIBER_NPI_NBR'].unique())]
+            result_df = self._filter(result_df, filters)
+        elif query_type == 'hcp_with_claims_metrics':
+            result_df = self._metrics(filters, claims_filters, now)
+        else:
+            result_df = self._filter(self.hcp_df.copy(), filters)
+
+        # Sort keys need not be projected; metrics come busiest prescriber first unless ordered otherwise
+        order_by = plan.get('order_by')
+        if query_type == 'hcp_with_claims_metrics' and not order_by:
+            order_by = ['total_prescriptions DESC']
+        if order_by:
+            result_df = self._order(result_df, order_by)
+        if plan.get('projection'):
+            result_df = result_df[[col for col in plan['projection'] if col in result_df.columns]]
+        if plan.get('limit'):
+            result_df = result_df.head(plan['limit'])
+        return result_df
+
+    def _metrics(self, filters: Dict[str, Any], claims_filters: Dict[str, Any], now: Optional[datetime]) -> pd.DataFrame:
+        claims_df = self._claims_filter(self.claims_df.copy(), claims_filters, now)
+        totals = claims_df.groupby('PRESCRIBER_NPI_NBR').agg(
+            total_prescriptions=('PATIENT_ID', 'size'), unique_patients=('PATIENT_ID', 'nunique'),
+            total_paid_amt=('TOTAL_PAID_AMT', 'sum'), total_days_supply=('DAYS_SUPPLY_VAL', 'sum'),
+        )
+        doctors = self._filter(self.hcp_df.copy(), filters)
+        return doctors.join(totals, on='npi', how='inner')
+
+    @staticmethod
+    def _filter(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
+        if filters.get('name_contains'):
+            df = df[_contains_any(df['name'], filters['name_contains'])]
+        for key, column in [('specialty_any', 'specialties'), ('state_any', 'states'),
+                            ('hospital_any', 'hospital_names'), ('system_any', 'system_names')]:
+            if filters.get(key):
+                df = df[_lists_any(df[column], filters[key])]
+        if filters.get('org_type_any'):
+            wanted = {value.lower() for value in filters['org_type_any']}
+            df = df[df['org_type'].map(lambda x: pd.notna(x) and x.lower() in wanted).astype(bool)]
+        if filters.get('publications_min') is not None:
+            df = df[df['num_publications'] >= filters['publications_min']]
+        if filters.get('publications_max') is not None:
+            df = df[df['num_publications'] <= filters['publications_max']]
+        if filters.get('clinical_trials_min') is not None:
+            df = df[df['num_clinical_trials'] >= filters['clinical_trials_min']]
+        for key in ('has_linkedin', 'has_twitter'):
+            if filters.get(key) is not None:
+                df = df[df[key] == filters[key]]
+        return df
+
+    @staticmethod
+    def _claims_filter(df: pd.DataFrame, filters: Dict[str, Any], now: Optional[datetime]) -> pd.DataFrame:
+        if filters.get('pharmacy_any'):
+            df = df[_contains_any(df['PHARMACY_NPI_NM'], filters['pharmacy_any'])]
+        if filters.get('payer_any'):
+            df = df[_contains_any(df['PAYER_PAYER_NM'], filters['payer_any'])]
+        if filters.get('drug_any'):
+            mask = pd.Series(False, index=df.index)
+            for col in ['NDC_GENERIC_NM', 'NDC_PREFERRED_BRAND_NM', 'NDC_DESC']:
+                mask |= _contains_any(df[col], filters['drug_any'])
+            df = df[mask]
+        if filters.get('date_range_months'):
+            end_date = now or datetime.now()
+            start_date = end_date - timedelta(days=filters['date_range_months'] * 30)
+            df = df[(df['SERVICE_DATE_DD'] >= start_date) & (df['SERVICE_DATE_DD'] <= end_date)]
+        return df
+
+    @staticmethod
+    def _order(df: pd.DataFrame, order_by: List[str]) -> pd.DataFrame:
+        columns, ascending = [], []
+        for spec in order_by:
+            parts = spec.split()
+            if parts and parts[0] in df.columns and parts[0] not in columns:
+                columns.append(parts[0])
+                ascending.append(len(parts) < 2 or parts[1].upper() == 'ASC')
+        return df.sort_values(by=columns, ascending=ascending, kind='stable') if columns else df
+
+
+def assert_same_result(got: pd.DataFrame, expected: pd.DataFrame, plan: Dict[str, Any]):
+    """Same rows, in the same order, with the same values; an empty result may come back without columns"""
+    if expected.empty:
+        assert got.empty, f"expected no rows for {plan}, got {len(got)}"
+        return
+    pd.testing.assert_frame_equal(got, expected, obj=json.dumps(plan, default=str))
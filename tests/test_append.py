@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from executor import PlanExecutor
+from quiet import quietly
+from streaming import StreamingPlanExecutor
+from tests.plans import random_plans
+from tests.reference import assert_same_result
+
+
+@pytest.fixture(scope='module')
+def split(dataset, tmp_path_factory):
+    """The claims file cut into a base file and two batches; the second batch repeats rows already loaded"""
+    providers_path, claims_path = dataset
+    claims = pd.read_csv(claims_path, dtype=str, keep_default_na=False)
+    out_dir = tmp_path_factory.mktemp('append')
+    cut, second = int(len(claims) * 0.7), int(len(claims) * 0.85)
+    paths = {name: str(out_dir / f"{name}.csv") for name in ('base', 'first', 'second')}
+    claims.iloc[:cut].to_csv(paths['base'], index=False)
+    claims.iloc[cut:second].to_csv(paths['first'], index=False)
+    pd.concat([claims.iloc[second:], claims.iloc[cut:cut + 20]]).to_csv(paths['second'], index=False)
+    return providers_path, paths, len(claims) - cut
+
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_appends_match_full_reload(split, dataset, tmp_path, snapshot):
+    providers_path, paths, new_rows = split
+    snapshot_dir = str(tmp_path) if snapshot else None
+    if snapshot:
+        quietly(PlanExecutor, providers_path, paths['base'], snapshot_dir=snapshot_dir)
+    appended = quietly(PlanExecutor, providers_path, paths['base'], snapshot_dir=snapshot_dir)
+    # Materialize a lazy column before the appends, so they have to extend it too
+    quietly(appended.execute_plan, {'query_type': 'claims_only', 'projection': ['TRANSACTION_DT'], 'limit': 5})
+    version = appended.data_version
+
+    added = quietly(appended.append_claims, paths['first']) + quietly(appended.append_claims, paths['second'])
+    reloaded = quietly(PlanExecutor, *dataset, snapshot_dir=None)
+
+    assert added == new_rows
+    assert appended.data_version != version
+    assert len(appended.claims_df) == len(reloaded.claims_df)
+    for plan in random_plans(reloaded.hcp_df, quietly(reloaded.execute_plan, {'query_type': 'claims_only'}), 120, seed=4):
+        assert_same_result(quietly(appended.execute_plan, plan), quietly(reloaded.execute_plan, plan), plan)
+
+
+def test_many_small_appends_match_full_reload(split, dataset, tmp_path):
+    # Enough appends that sorted runs merge, appended join rows get regrouped and buffers grow several times
+    providers_path, paths, new_rows = split
+    appended = quietly(PlanExecutor, providers_path, paths['base'], snapshot_dir=None)
+    claims = pd.concat([pd.read_csv(paths[name], dtype=str, keep_default_na=False) for name in ('first', 'second')])
+    added = 0
+    for at in range(0, len(claims), 25):
+        claims.iloc[at:at + 25].to_csv(tmp_path / 'batch.csv', index=False)
+        added += quietly(appended.append_claims, str(tmp_path / 'batch.csv'))
+    # A batch of claims that are all loaded already adds nothing
+    assert quietly(appended.append_claims, paths['first']) == 0
+    reloaded = quietly(PlanExecutor, *dataset, snapshot_dir=None)
+
+    assert added == new_rows
+    for plan in random_plans(reloaded.hcp_df, quietly(reloaded.execute_plan, {'query_type': 'claims_only'}), 120, seed=5):
+        assert_same_result(quietly(appended.execute_plan, plan), quietly(reloaded.execute_plan, plan), plan)
+
+
+def test_streaming_executor_rejects_appends(split, dataset):
+    streaming = quietly(StreamingPlanExecutor, *dataset, snapshot_dir=None)
+    with pytest.raises(ValueError, match='append to that file'):
+        streaming.append_claims(split[1]['first'])
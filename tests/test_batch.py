@@ -0,0 +1,147 @@
+import asyncio
+import json
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import batch
+from batch import ResultWriter, StubPlanner, run_batch
+from executor import PlanExecutor
+from quiet import quietly
+
+PLANS = {
+    'internists': {'query_type': 'hcp', 'filters': {'specialty_any': ['Internal Medicine']},
+                      'projection': ['npi', 'name'], 'order_by': ['name ASC']},
+    'mounjaro claims': {'query_type': 'claims_only', 'claims_filters': {'drug_any': ['mounjaro']},
+                        'projection': ['PRESCRIBER_NPI_NBR', 'SERVICE_DATE_DD'], 'limit': 40},
+    'busiest prescribers': {'query_type': 'hcp_with_claims_metrics', 'projection': ['npi', 'total_prescriptions'],
+                            'limit': 5},
+}
+COLUMNS = ['index', 'query', 'plan', 'row_count', 'rows', 'error', 'attempts', 'plan_seconds', 'execute_seconds', 'trace']
+
+
+@pytest.fixture(scope='module')
+def executor(dataset):
+    return quietly(PlanExecutor, *dataset, snapshot_dir=None)
+
+
+class CountingPlanner(StubPlanner):
+    """StubPlanner that records how many calls are in flight at once"""
+
+    def __init__(self, latency: float):
+        super().__init__(PLANS, latency)
+        self.in_flight = self.peak = 0
+        self._lock = threading.Lock()
+
+    def process_message(self, message: str) -> str:
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            return super().process_message(message)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class FlakyPlanner(StubPlanner):
+    """Fails each query's first `failures[query]` calls: a transient error, then a response that is not JSON"""
+
+    def __init__(self, failures):
+        super().__init__(PLANS)
+        self.failures = dict(failures)
+        self.calls = {query: 0 for query in failures}
+        self.forgotten = []
+
+    def process_message(self, message: str) -> str:
+        self.calls[message] += 1
+        if self.calls[message] <= self.failures[message]:
+            if self.calls[message] % 2:
+                raise ConnectionError('planner unavailable')
+            return 'Sorry, I could not produce a plan'
+        return super().process_message(message)
+
+    def forget(self, message: str):
+        self.forgotten.append(message)
+
+
+def run(queries, planner, executor, path, **kwargs):
+    writer = ResultWriter(str(path), parquet_batch=2)
+    try:
+        return quietly(asyncio.run, run_batch(queries, planner, executor, writer, **kwargs))
+    finally:
+        writer.close()
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return sorted((json.loads(line) for line in f), key=lambda record: record['index'])
+
+
+def test_planner_calls_stay_within_the_concurrency_limit(executor, tmp_path):
+    planner = CountingPlanner(latency=0.05)
+    queries = list(PLANS) * 6
+    started = time.perf_counter()
+    summary = run(queries, planner, executor, tmp_path / 'out.jsonl', concurrency=3, workers=2)
+
+    assert planner.peak == 3
+    assert summary['succeeded'] == len(queries) and summary['failed'] == 0
+    # 18 calls of 50ms, three at a time
+    assert time.perf_counter() - started < 18 * 0.05
+
+
+def test_transient_errors_are_retried_with_exponential_backoff(executor, tmp_path, monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(batch.asyncio, 'sleep', sleep)
+    monkeypatch.setattr(batch.random, 'random', lambda: 0.5)
+    planner = FlakyPlanner({'internists': 0, 'mounjaro claims': 3, 'busiest prescribers': 4})
+    summary = run(list(PLANS), planner, executor, tmp_path / 'out.jsonl', retries=3, backoff=0.1)
+    records = read_jsonl(tmp_path / 'out.jsonl')
+
+    assert [record['attempts'] for record in records[:2]] == [1, 4]
+    assert records[1]['error'] is None and records[1]['row_count'] == len(quietly(executor.execute_plan, PLANS['mounjaro claims']))
+    # Out of retries: four calls, then the error is recorded rather than raised
+    assert planner.calls['busiest prescribers'] == 4
+    assert records[2]['error'].startswith('JSONDecodeError') and records[2]['plan'] is None
+    assert summary == {**summary, 'succeeded': 2, 'failed': 1, 'retries': 6}
+    assert sorted(delays) == pytest.approx([0.1, 0.1, 0.2, 0.2, 0.4, 0.4])
+    # A response that did not parse is dropped from the planner cache before it is asked again
+    assert sorted(planner.forgotten) == ['busiest prescribers', 'busiest prescribers', 'mounjaro claims']
+
+
+@pytest.mark.parametrize('suffix', ['jsonl', 'parquet'])
+def test_output_holds_one_record_per_query(executor, tmp_path, suffix):
+    queries = list(PLANS) + ['not a known query']
+    path = tmp_path / f'out.{suffix}'
+    summary = run(queries, StubPlanner(PLANS), executor, path, max_rows=10)
+
+    if suffix == 'parquet':
+        table = pq.read_table(path)
+        assert table.column_names == COLUMNS
+        assert table.num_rows == len(queries) and pq.ParquetFile(path).num_row_groups == 2
+        records = table.to_pandas().sort_values('index').to_dict(orient='records')
+        for record in records:
+            record['plan'], record['rows'], record['trace'] = (json.loads(record[key]) for key in ('plan', 'rows', 'trace'))
+    else:
+        records = read_jsonl(path)
+        assert all(list(record) == COLUMNS for record in records)
+
+    assert summary['succeeded'] == len(queries)
+    assert [record['query'] for record in records] == queries
+    for record in records:
+        plan = PLANS.get(record['query'], StubPlanner.DEFAULT_PLAN)
+        expected = quietly(executor.execute_plan, plan)
+        assert record['plan'] == plan and record['error'] is None and record['attempts'] == 1
+        assert record['row_count'] == len(expected)
+        assert len(record['rows']) == min(len(expected), 10)
+        assert list(record['rows'][0]) == list(expected.columns)
+        assert record['trace']['spans']
@@ -0,0 +1,41 @@
+import pytest
+
+from executor import PlanExecutor
+from quiet import quietly
+from tests.plans import random_plans
+from tests.reference import assert_same_result
+from tracing import Trace
+
+
+@pytest.fixture(scope='module', params=['in_memory', 'snapshot'])
+def executor(request, dataset, tmp_path_factory):
+    if request.param == 'in_memory':
+        return quietly(PlanExecutor, *dataset, snapshot_dir=None)
+    snapshot_dir = str(tmp_path_factory.mktemp('snapshots'))
+    quietly(PlanExecutor, *dataset, snapshot_dir=snapshot_dir)
+    # The second load reads the snapshot, leaving unreferenced columns on disk until a projection asks for them
+    loaded = quietly(PlanExecutor, *dataset, snapshot_dir=snapshot_dir)
+    assert loaded.lazy_provider_columns and loaded.lazy_claims_columns
+    return loaded
+
+
+def test_random_plans_match_reference(executor, reference):
+    for plan in random_plans(reference.hcp_df, reference.claims_df, 200, seed=1):
+        assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+
+
+def test_repeated_plans_match_reference(executor, reference):
+    # Lazy columns are materialized and list columns parsed by the first run; the second must not change
+    plans = random_plans(reference.hcp_df, reference.claims_df, 40, seed=2)
+    for _ in range(2):
+        for plan in plans:
+            assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+
+
+def test_trace_stays_with_the_caller(executor):
+    trace = Trace('query')
+    result_df = quietly(trace.run, executor.execute_plan, {'query_type': 'claims_only', 'limit': 5})
+    assert 'trace' not in result_df.attrs
+    assert [span.name for span in trace.spans][:1] == ['execute']
+    # Without an active trace nothing is recorded anywhere
+    assert quietly(executor.execute_plan, {'query_type': 'claims_only', 'limit': 5}).attrs == {}
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from executor import PlanExecutor
+from ngram_index import NgramIndex
+from quiet import quietly
+from tests.reference import assert_same_result
+
+SEARCHED = ['name', 'hospital_names', 'system_names']
+
+
+@pytest.fixture(scope='module')
+def executor(dataset):
+    return quietly(PlanExecutor, *dataset, snapshot_dir=None)
+
+
+def distinct(reference, column):
+    values = reference.hcp_df[column].explode() if column != 'name' else reference.hcp_df[column]
+    return sorted(set(values.dropna().str.lower()))
+
+
+def substrings(values, count, seed):
+    """Patterns cut from the values at every length, including ones spanning a space or shorter than a trigram"""
+    rnd = random.Random(seed)
+    patterns = []
+    for _ in range(count):
+        value = rnd.choice(values)
+        length = rnd.randint(1, min(len(value), 12))
+        start = rnd.randint(0, len(value) - length)
+        patterns.append(value[start:start + length])
+    return patterns + [values[0][:4] + ' ', ' ' + values[-1][-3:], 'zzq', 'a  b', '']
+
+
+def misspell(value):
+    """Swap two different adjacent letters near the middle of the value's longest word"""
+    word = max(value.split(), key=len)
+    at = next(i for i in sorted(range(1, len(word)), key=lambda i: abs(i - len(word) // 2)) if word[i - 1] != word[i])
+    return value.replace(word, word[:at - 1] + word[at] + word[at - 1] + word[at + 1:], 1)
+
+
+@pytest.mark.parametrize('column', SEARCHED)
+def test_substring_lookups_match_a_scan(reference, column):
+    values = distinct(reference, column)
+    index = NgramIndex(values[:len(values) // 2])
+    # Built in two steps, as appends would
+    index.add(values[len(values) // 2:])
+    for pattern in substrings(values, 300, seed=len(column)):
+        expected = [i for i, value in enumerate(values) if pattern.lower() in value]
+        assert index.contains(pattern.upper()).tolist() == expected, pattern
+
+
+@pytest.mark.parametrize('column', SEARCHED)
+def test_misspelled_values_rank_first(reference, column):
+    values = distinct(reference, column)
+    index = NgramIndex(values)
+    for value in random.Random(3).sample(values, 20):
+        assert values[index.similar(misspell(value), limit=1)[0][0]] == value
+
+
+def test_name_hospital_and_system_filters_are_exact(executor, reference):
+    rnd = random.Random(21)
+    hospitals, systems = distinct(reference, 'hospital_names'), distinct(reference, 'system_names')
+    plans = []
+    for pattern in substrings(distinct(reference, 'name'), 60, seed=21):
+        plans.append({'query_type': rnd.choice(['hcp', 'claims_by_doctor']), 'filters': {'name_contains': [pattern]},
+                      'order_by': ['npi ASC'] if rnd.random() < 0.5 else []})
+    for key, values in (('hospital_any', hospitals), ('system_any', systems)):
+        for value in rnd.sample(values, 15):
+            # Whole names in any case match; a part or a misspelling matches nothing without approximate_names
+            for asked in (value.upper(), value[:len(value) // 2], misspell(value)):
+                plans.append({'query_type': rnd.choice(['hcp', 'claims_by_doctor']), 'filters': {key: [asked]}})
+    for plan in plans:
+        assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+
+
+def test_approximate_hospital_and_system_names(executor, reference):
+    for key, column in (('hospital_any', 'hospital_names'), ('system_any', 'system_names')):
+        values = distinct(reference, column)
+        for value in random.Random(4).sample(values, 10):
+            word = max(value.split(), key=len)
+            # A part stands for every name containing it, a misspelling for the closest name
+            for asked, meant in ((word, [v for v in values if word in v]), (misspell(value), [value])):
+                plan = {'query_type': 'hcp', 'filters': {key: [asked], 'approximate_names': True}}
+                expected = reference.execute_plan({'query_type': 'hcp', 'filters': {key: meant}})
+                assert_same_result(quietly(executor.execute_plan, plan), expected, plan)
+
+
+def test_misspelled_doctor_resolves_only_with_approximate_names(executor, reference):
+    prescribers = set(reference.claims_df['PRESCRIBER_NPI_NBR'])
+    doctors = reference.hcp_df[reference.hcp_df['npi'].isin(prescribers)]
+    for name in random.Random(5).sample(sorted(doctors['name']), 10):
+        plan = {'query_type': 'claims_by_doctor', 'filters': {'name_contains': [misspell(name)]}}
+        assert quietly(executor.execute_plan, plan).empty and reference.execute_plan(plan).empty
+
+        approximate = {**plan, 'filters': {**plan['filters'], 'approximate_names': True}}
+        expected = reference.execute_plan({**plan, 'filters': {'name_contains': [name]}})
+        assert_same_result(quietly(executor.execute_plan, approximate), expected, approximate)
@@ -0,0 +1,40 @@
+import pytest
+
+from executor import PlanExecutor
+from optimizer import TableStats
+from quiet import quietly
+from tests.plans import random_plans
+from tests.reference import assert_same_result
+
+JOINED_QUERY_TYPES = ['claims_by_doctor', 'hcp_with_claims', 'hcp_with_claims_metrics']
+
+
+@pytest.fixture(scope='module')
+def executor(dataset):
+    return quietly(PlanExecutor, *dataset, snapshot_dir=None)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_join_sides_return_the_same_rows(executor, reference, monkeypatch, seed):
+    plans = random_plans(reference.hcp_df, reference.claims_df, 40, seed=100 + seed, query_types=JOINED_QUERY_TYPES)
+    for plan in plans:
+        results = {}
+        for side in ('providers', 'claims'):
+            monkeypatch.setattr(executor.optimizer, 'join_side', lambda plan, predicates=None: side)
+            results[side] = quietly(executor.execute_plan, plan)
+        expected = reference.execute_plan(plan)
+        assert_same_result(results['providers'], expected, plan)
+        assert_same_result(results['claims'], expected, plan)
+
+
+def test_selectivities_are_estimated_once_per_plan(executor, reference, monkeypatch):
+    calls = []
+    estimate = TableStats.substring_selectivity
+    monkeypatch.setattr(TableStats, 'substring_selectivity', lambda self, *args: calls.append(args) or estimate(self, *args))
+    plan = {
+        'query_type': 'hcp_with_claims', 'filters': {'publications_min': 1},
+        'claims_filters': {'drug_any': ['mounjaro'], 'payer_any': ['health']},
+        'projection': ['npi', 'name'], 'order_by': ['npi ASC'], 'limit': None,
+    }
+    quietly(executor.execute_plan, plan)
+    assert len(calls) == 2
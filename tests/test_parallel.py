@@ -0,0 +1,35 @@
+import pytest
+
+import parallel
+from parallel import ParallelPlanExecutor
+from quiet import quietly
+from tests.plans import random_plans
+from tests.reference import assert_same_result
+
+
+@pytest.fixture(scope='module')
+def executor(dataset):
+    # The test tables are small; share every non-empty array so the workers really map them
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(parallel, 'SHARED_MIN_BYTES', 1)
+        executor = quietly(ParallelPlanExecutor, *dataset, snapshot_dir=None, workers=2, min_parallel_rows=0)
+        executor._get_pool()
+    yield executor
+    executor.close()
+
+
+def test_partitioned_claims_filters_match_reference(executor, reference):
+    plans = random_plans(reference.hcp_df, reference.claims_df, 60, seed=3,
+                         query_types=['claims_only', 'claims_by_doctor', 'hcp_with_claims', 'hcp_with_claims_metrics'])
+    for plan in plans:
+        assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+
+
+def test_workers_map_the_arrays_from_shared_memory(executor):
+    assert executor._blocks
+    names = [block.name for block in executor._blocks]
+    executor.close()
+    assert not executor._blocks
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            parallel.shared_memory.SharedMemory(name=name)
@@ -0,0 +1,98 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from agent import Agent
+from planner_cache import PlannerCache, normalize_query
+
+QUESTIONS = [
+    'Cardiologists in Texas with more than 30 publications',
+    'Neurologists in Ohio who prescribed Mounjaro in the last 12 months',
+    'Top 10 endocrinologists by total paid amount',
+    'Oncologists in California with clinical trials',
+]
+
+
+class StubClient:
+    """The chat.completions.create interface, answering every question with a plan that names it"""
+
+    def __init__(self):
+        self.questions = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages):
+        question = messages[-1]['content']
+        self.questions.append(question)
+        content = json.dumps({'query_type': 'hcp', 'plan_notes': question})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def planned_for(response: str) -> str:
+    return json.loads(response)['plan_notes']
+
+
+def best_similarity(cache: PlannerCache, question: str) -> float:
+    cache._fit()
+    return cache._similarities(normalize_query(question)).max()
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = Agent(client=StubClient(), cache=PlannerCache(str(tmp_path / 'cache.json')))
+    for question in QUESTIONS:
+        agent.process_message(question)
+    return agent
+
+
+def test_rephrasing_with_filler_words_is_an_exact_hit(agent):
+    response = agent.process_message('Please show me all the cardiologists in Texas, with more than 30 publications!')
+
+    assert planned_for(response) == QUESTIONS[0]
+    assert agent._client.questions == QUESTIONS
+    assert agent.cache.stats()['exact_hits'] == 1
+
+
+def test_similar_question_above_threshold_reuses_the_plan(agent):
+    response = agent.process_message('Cardiologists in Texas with more than 30 publications listed')
+
+    assert planned_for(response) == QUESTIONS[0]
+    assert agent.cache.stats()['similar_hits'] == 1
+    assert len(agent._client.questions) == len(QUESTIONS)
+
+
+def test_question_below_threshold_goes_to_the_planner(agent):
+    question = 'Oncologists in California with clinical trials and a linkedin profile'
+    assert best_similarity(agent.cache, question) < agent.cache.similarity_threshold
+    misses = agent.cache.stats()['misses']
+
+    assert planned_for(agent.process_message(question)) == question
+    assert agent.cache.stats()['misses'] == misses + 1
+    # The new plan is cached for next time
+    assert planned_for(agent.process_message(question)) == question
+    assert agent._client.questions[-1] == question
+
+
+def test_cache_persists_across_instances(agent, tmp_path):
+    reloaded = PlannerCache(str(tmp_path / 'cache.json'))
+    assert planned_for(reloaded.get(QUESTIONS[2])) == QUESTIONS[2]
+
+
+@pytest.mark.parametrize('question', [
+    'Cardiologists in Ohio with more than 30 publications',
+    'Top 10 endocrinologists by total paid amount in Texas',
+    'Cardiologists in Texas with more than 20 publications',
+    'Neurologists in Ohio who prescribed Mounjaro in the last 6 months',
+    'Neurologists in Ohio who never prescribed Mounjaro in the last 12 months',
+])
+def test_different_numbers_states_or_negations_never_reuse_a_plan(tmp_path, question):
+    # A lower threshold, so that only the guard tokens stand between these and a cached plan
+    agent = Agent(client=StubClient(), cache=PlannerCache(str(tmp_path / 'cache.json'), similarity_threshold=0.7))
+    for cached in QUESTIONS:
+        agent.process_message(cached)
+    assert best_similarity(agent.cache, question) >= agent.cache.similarity_threshold
+
+    assert planned_for(agent.process_message(question)) == question
+    assert agent.cache.stats()['similar_hits'] == 0
+    # The same wording with matching guard tokens would have been reused
+    assert planned_for(agent.process_message('Cardiologists in Texas with more than 30 recent publications')) == QUESTIONS[0]
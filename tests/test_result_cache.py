@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from executor import PlanExecutor
+from quiet import quietly
+from result_cache import PlanResultCache
+from tests.plans import random_plans
+from tests.reference import ReferenceExecutor, assert_same_result
+
+
+@pytest.fixture
+def executor(dataset):
+    return quietly(PlanExecutor, *dataset, snapshot_dir=None, result_cache=PlanResultCache())
+
+
+def variant(plan):
+    """The same plan as a planner might phrase it again: other case and order, empty filters spelled out"""
+    filters = {key: [str(v).upper() for v in reversed(value)] if isinstance(value, list) else value
+               for key, value in (plan.get('filters') or {}).items()}
+    filters.update(specialty_any=filters.get('specialty_any') or None, state_any=filters.get('state_any') or [])
+    return {**plan, 'filters': filters, 'plan_notes': 'asked again'}
+
+
+def test_cached_results_match_reference(executor, reference):
+    plans = random_plans(reference.hcp_df, reference.claims_df, 80, seed=11)
+    for plan in plans:
+        assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+    misses = executor.result_cache.stats()['misses']
+
+    for plan in plans:
+        assert_same_result(quietly(executor.execute_plan, variant(plan)), reference.execute_plan(variant(plan)), plan)
+    stats = executor.result_cache.stats()
+    assert stats['misses'] == misses and stats['hits'] == len(plans)
+
+
+def test_hits_hand_out_copies(executor, reference):
+    plan = {'query_type': 'claims_only', 'projection': ['PRESCRIBER_NPI_NBR', 'TOTAL_PAID_AMT'], 'limit': 20}
+    first = quietly(executor.execute_plan, plan)
+    first['TOTAL_PAID_AMT'] = -1.0
+    first.drop(first.index[:5], inplace=True)
+    assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+
+
+def test_eviction_by_entries_and_bytes_keeps_results_exact(dataset, reference):
+    cache = PlanResultCache(max_entries=8, max_bytes=64 * 1024)
+    executor = quietly(PlanExecutor, *dataset, snapshot_dir=None, result_cache=cache)
+    plans = random_plans(reference.hcp_df, reference.claims_df, 30, seed=12)
+    for plan in plans * 2:
+        assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+
+    stats = cache.stats()
+    assert stats['evictions'] > 0
+    assert stats['entries'] <= 8 and stats['bytes'] <= 64 * 1024
+
+
+def test_appending_claims_invalidates_cached_results(dataset, tmp_path):
+    providers_path, claims_path = dataset
+    claims = pd.read_csv(claims_path, dtype=str, keep_default_na=False)
+    base, rest = str(tmp_path / 'base.csv'), str(tmp_path / 'rest.csv')
+    claims.iloc[:2000].to_csv(base, index=False)
+    claims.iloc[2000:].to_csv(rest, index=False)
+    executor = quietly(PlanExecutor, providers_path, base, snapshot_dir=None, result_cache=PlanResultCache())
+    plans = [{'query_type': 'claims_only', 'projection': ['RX_CLAIM_NBR', 'PRESCRIBER_NPI_NBR'], 'order_by': ['RX_CLAIM_NBR ASC']},
+             {'query_type': 'hcp_with_claims_metrics', 'projection': ['npi', 'total_prescriptions', 'total_paid_amt']}]
+    for plan in plans:
+        assert_same_result(quietly(executor.execute_plan, plan), ReferenceExecutor(providers_path, base).execute_plan(plan), plan)
+
+    quietly(executor.append_claims, rest)
+    full = ReferenceExecutor(providers_path, claims_path)
+    for plan in plans:
+        assert_same_result(quietly(executor.execute_plan, plan), full.execute_plan(plan), plan)
+    assert executor.result_cache.stats()['invalidations'] == 1
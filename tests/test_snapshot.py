@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import snapshot
+from executor import PlanExecutor
+from quiet import quietly
+from snapshot import SnapshotStore
+from tests.plans import random_plans
+from tests.reference import assert_same_result
+
+
+def test_snapshot_is_rebuilt_when_the_claims_file_changes(dataset, tmp_path):
+    providers_path, claims_path = dataset
+    claims_copy = str(tmp_path / 'claims.csv')
+    shutil.copy(claims_path, claims_copy)
+    snapshot_dir = str(tmp_path / 'snapshots')
+
+    first = quietly(PlanExecutor, providers_path, claims_copy, snapshot_dir=snapshot_dir)
+    assert quietly(PlanExecutor, providers_path, claims_copy, snapshot_dir=snapshot_dir).snapshot_key == first.snapshot_key
+
+    claims = pd.read_csv(claims_copy, dtype=str, keep_default_na=False)
+    claims.iloc[:len(claims) - 500].to_csv(claims_copy, index=False)
+    changed = quietly(PlanExecutor, providers_path, claims_copy, snapshot_dir=snapshot_dir)
+    fresh = quietly(PlanExecutor, providers_path, claims_copy, snapshot_dir=None)
+
+    assert changed.snapshot_key != first.snapshot_key
+    assert len(changed.claims_df) == len(fresh.claims_df) < len(first.claims_df)
+    for plan in random_plans(fresh.hcp_df, quietly(fresh.execute_plan, {'query_type': 'claims_only'}), 40, seed=6):
+        assert_same_result(quietly(changed.execute_plan, plan), quietly(fresh.execute_plan, plan), plan)
+
+
+def test_unwritable_sources_index_is_a_cache_miss(dataset, tmp_path, monkeypatch):
+    expected = SnapshotStore(str(tmp_path / 'expected')).key_for(list(dataset))
+
+    def refuse(*args, **kwargs):
+        raise PermissionError('read-only')
+
+    monkeypatch.setattr(snapshot.tempfile, 'NamedTemporaryFile', refuse)
+    executor = quietly(PlanExecutor, *dataset, snapshot_dir=str(tmp_path / 'snapshots'))
+    assert executor.snapshot_key == expected
+    assert not os.path.exists(tmp_path / 'snapshots' / 'sources.json')
+
+
+def test_concurrent_index_writes_do_not_collide(dataset, tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    with ThreadPoolExecutor(8) as pool:
+        keys = set(pool.map(lambda _: store.key_for(list(dataset)), range(32)))
+
+    assert len(keys) == 1
+    assert os.listdir(tmp_path) == ['sources.json']
+    with open(tmp_path / 'sources.json') as f:
+        assert set(json.load(f)) == {os.path.abspath(path) for path in dataset}
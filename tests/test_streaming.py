@@ -0,0 +1,41 @@
+import pytest
+
+import columnar_store
+from quiet import quietly
+from streaming import ColumnarPlanExecutor
+from tests.plans import random_plans
+from tests.reference import assert_same_result
+
+
+@pytest.fixture(scope='module')
+def executor(dataset, tmp_path_factory):
+    # Small row groups, so a scan has many to prune and read
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(columnar_store, 'ROW_GROUP_SIZE', 200)
+        return quietly(ColumnarPlanExecutor, *dataset, snapshot_dir=None,
+                       store_dir=str(tmp_path_factory.mktemp('columnar')))
+
+
+def test_doctor_first_plans_match_reference(executor, reference):
+    plans = [plan for plan in random_plans(reference.hcp_df, reference.claims_df, 150, seed=23,
+                                           query_types=['hcp_with_claims']) if plan['filters']]
+    for plan in plans:
+        assert_same_result(quietly(executor.execute_plan, plan), reference.execute_plan(plan), plan)
+
+
+def test_no_matching_claims_reads_the_claims_once(executor, reference, monkeypatch):
+    reads = []
+    read_row_group = executor.claims_store.read_row_group
+    monkeypatch.setattr(executor.claims_store, 'read_row_group', lambda *args: reads.append(args[2]) or read_row_group(*args))
+    # A doctor with claims, and a payer that other doctors' claims have but theirs do not
+    claims = reference.claims_df
+    npi = claims['PRESCRIBER_NPI_NBR'].value_counts().index[0]
+    payer = sorted(set(claims['PAYER_PAYER_NM'].dropna()) - set(claims.loc[claims['PRESCRIBER_NPI_NBR'] == npi, 'PAYER_PAYER_NM']))[0]
+    doctor = reference.hcp_df.loc[reference.hcp_df['npi'] == npi, 'name'].iloc[0]
+    plan = {'query_type': 'hcp_with_claims', 'filters': {'name_contains': [doctor]},
+            'claims_filters': {'payer_any': [payer]}, 'projection': ['npi', 'name']}
+
+    result = quietly(executor.execute_plan, plan)
+    assert result.empty and list(result.columns) == ['npi', 'name']
+    assert reference.execute_plan(plan).empty
+    assert reads and len(reads) == len({id(group) for group in reads})
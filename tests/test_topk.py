@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from topk import top_k_frame
+
+
+def _frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    """Few distinct values per column, so ties are common, with missing values in every column"""
+    df = pd.DataFrame({
+        'number': rng.integers(0, 5, rows).astype(float),
+        'integer': rng.integers(-3, 3, rows),
+        'text': rng.choice(['a', 'b', 'B', 'c', ''], rows).astype(object),
+        'date': pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 4, rows), unit='D'),
+        'category': pd.Categorical(rng.choice(['x', 'y', 'z'], rows)),
+    })
+    for col in ('number', 'text', 'date', 'category'):
+        df.loc[rng.random(rows) < 0.1, col] = None
+    return df
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_top_k_matches_stable_sort(seed):
+    rng = np.random.default_rng(seed)
+    df = _frame(rng, int(rng.integers(0, 300)))
+    columns = list(rng.choice(df.columns, size=int(rng.integers(1, 4)), replace=False))
+    ascending = [bool(value) for value in rng.integers(0, 2, len(columns))]
+    limit = [None, 0, 1, 7, 50, 1000][seed % 6]
+
+    expected = df.sort_values(by=columns, ascending=ascending, kind='stable')
+    expected = expected if limit is None else expected.head(limit)
+    got = df.take(top_k_frame(df, columns, ascending, limit))
+    pd.testing.assert_frame_equal(got, expected)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Optional, Sequence
+
+
+def sort_codes(values, ascending: bool = True) -> np.ndarray:
+    """A numpy array whose ascending order is the requested order of `values`, missing values last.
+
+    Numbers and datetimes are used as they are (negated or bit-inverted for DESC); anything
+    else is factorized with sorted uniques, so strings are compared once per distinct value.
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    array = values.array
+    if isinstance(array, pd.arrays.NumpyExtensionArray):
+        data = array.to_numpy()
+        kind = data.dtype.kind
+        if kind in 'biu':
+            data = data.view(np.uint8) if kind == 'b' else data
+            return data if ascending else ~data
+        if kind == 'f':
+            # NaN sorts and partitions last either way
+            return data if ascending else -data
+    elif isinstance(array, pd.arrays.TimedeltaArray) or (isinstance(array, pd.arrays.DatetimeArray) and array.tz is None):
+        data = array.asi8
+        missing = np.isnat(array.to_numpy())
+        data = data if ascending else ~data
+        return np.where(missing, np.iinfo(np.int64).max, data)
+
+    codes, uniques = pd.factorize(values, sort=True)
+    last = len(uniques)
+    if not ascending:
+        codes = np.where(codes < 0, -1, last - 1 - codes)
+    return np.where(codes < 0, last, codes)
+
+
+def top_k(fetch: Callable[[int, Optional[np.ndarray]], pd.Series], ascending: Sequence[bool],
+          size: int, limit: Optional[int] = None) -> np.ndarray:
+    """Positions of the first `limit` of `size` rows ordered by several keys (all rows when limit is None).
+
+    `fetch(i, positions)` returns sort key i at those positions (all rows when None).
+    Ties keep their input order, so the result is exactly a stable sort followed by
+    head(limit). Only the first key is read for every row: np.partition finds the
+    limit-th smallest first-key code, and just the rows up to and including it are
+    fetched on the other keys and fully sorted.
+    """
+    if size == 0 or not ascending:
+        return np.arange(size if limit is None else min(size, limit))
+
+    first = sort_codes(fetch(0, None), ascending[0])
+    candidates = np.arange(size)
+    if limit is not None and limit < size:
+        kth = np.partition(first, limit - 1)[limit - 1]
+        if not (first.dtype.kind == 'f' and np.isnan(kth)):
+            candidates = np.flatnonzero(first <= kth)
+
+    keys: List[np.ndarray] = [first[candidates]]
+    narrowed = candidates if len(candidates) < size else None
+    for i in range(1, len(ascending)):
+        keys.append(sort_codes(fetch(i, narrowed), ascending[i]))
+
+    # np.lexsort is stable and sorts on its last key first
+    order = candidates[np.lexsort(keys[::-1])]
+    return order if limit is None else order[:limit]
+
+
+def top_k_frame(df: pd.DataFrame, columns: Sequence[str], ascending: Sequence[bool],
+                limit: Optional[int] = None) -> np.ndarray:
+    """top_k over distinct columns of a frame; positions into df"""
+    def fetch(i: int, positions: Optional[np.ndarray]) -> pd.Series:
+        column = df[columns[i]]
+        return column if positions is None else column.take(positions)
+
+    return top_k(fetch, ascending, len(df), limit)
@@ -0,0 +1,196 @@
+import contextvars
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+_active: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+
+
+class Span:
+    """One timed stage: wall time, rows in and out, bytes it produced and, under tracemalloc, bytes allocated"""
+
+    __slots__ = ('name', 'start_ns', 'duration_ns', 'depth', 'thread', 'rows_in', 'rows_out', 'bytes',
+                 'alloc_bytes', 'attrs')
+
+    def __init__(self, name: str, start_ns: int, depth: int, rows_in: Optional[int], attrs: Dict[str, Any]):
+        self.name = name
+        self.start_ns = start_ns
+        self.duration_ns = 0
+        self.depth = depth
+        self.thread = threading.get_ident()
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes = None
+        self.alloc_bytes = None
+        self.attrs = attrs
+
+    def output(self, result):
+        """Record a stage's result: positional rows, a frame, or a plain row count"""
+        if isinstance(result, (int, np.integer)):
+            self.rows_out = int(result)
+        elif isinstance(result, pd.DataFrame):
+            self.rows_out = len(result)
+            self.bytes = int(result.memory_usage(index=False, deep=False).sum())
+        else:
+            self.rows_out = len(result)
+            self.bytes = getattr(result, 'nbytes', None)
+        return result
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name, 'start_ms': self.start_ns / 1e6, 'duration_ms': self.duration_ns / 1e6,
+            'depth': self.depth, 'thread': self.thread, 'rows_in': self.rows_in, 'rows_out': self.rows_out,
+            'bytes': self.bytes, 'alloc_bytes': self.alloc_bytes, **({'attrs': self.attrs} if self.attrs else {}),
+        }
+
+
+class _NullSpan:
+    """Stands in for a span when nothing is being traced"""
+
+    def output(self, result):
+        return result
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Spans recorded while a query is planned and executed.
+
+    Code reports stages with the module-level `span()`, which records into whichever
+    trace is active in the current thread or task and does nothing otherwise, so an
+    untraced query pays for one context-variable lookup per stage. The caller that
+    activated a trace (see run) holds on to it; results do not carry it.
+    """
+
+    def __init__(self, name: str = 'query'):
+        self.name = name
+        self.spans: List[Span] = []
+        self.origin_ns = time.perf_counter_ns()
+        self.wall_time = time.time()
+        self._depth = 0
+
+    @contextmanager
+    def activate(self) -> Iterator['Trace']:
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Call fn with this trace active, e.g. on a worker thread"""
+        with self.activate():
+            return fn(*args, **kwargs)
+
+    @contextmanager
+    def span(self, name: str, rows_in: Optional[int] = None, **attrs) -> Iterator[Span]:
+        span = Span(name, time.perf_counter_ns() - self.origin_ns, self._depth, rows_in, attrs)
+        self.spans.append(span)
+        allocated = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self._depth += 1
+        try:
+            yield span
+        finally:
+            self._depth -= 1
+            span.duration_ns = time.perf_counter_ns() - self.origin_ns - span.start_ns
+            if allocated is not None:
+                span.alloc_bytes = tracemalloc.get_traced_memory()[0] - allocated
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'wall_time': self.wall_time, 'spans': [span.to_dict() for span in self.spans]}
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.to_dict(), indent=2, default=str)
+        if path:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def chrome_events(self, pid: int = 1, tid: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Complete ("X") events for chrome://tracing and Perfetto; timestamps in microseconds"""
+        origin_us = self.wall_time * 1e6
+        events = []
+        for span in self.spans:
+            args = {key: value for key, value in span.to_dict().items()
+                    if key in ('rows_in', 'rows_out', 'bytes', 'alloc_bytes') and value is not None}
+            args.update(span.attrs)
+            events.append({
+                'name': span.name, 'cat': span.name.split(':')[0], 'ph': 'X', 'pid': pid,
+                'tid': span.thread if tid is None else tid,
+                'ts': origin_us + span.start_ns / 1e3, 'dur': span.duration_ns / 1e3, 'args': args,
+            })
+        return events
+
+    def to_chrome(self, path: Optional[str] = None) -> Dict[str, Any]:
+        return chrome_trace([self], path)
+
+    def summary(self) -> pd.DataFrame:
+        return summarize([self])
+
+    def report(self) -> str:
+        """Indented stage tree with timings and row counts"""
+        lines = []
+        for span in self.spans:
+            rows = ''
+            if span.rows_in is not None or span.rows_out is not None:
+                rows = f"  rows {'' if span.rows_in is None else span.rows_in}→{'' if span.rows_out is None else span.rows_out}"
+            size = f"  {span.bytes / 1024:.1f} KiB" if span.bytes else ''
+            lines.append(f"{'  ' * span.depth}{span.name:<{40 - 2 * span.depth}} {span.duration_ns / 1e6:>9.2f} ms{rows}{size}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def span(name: str, rows_in: Optional[int] = None, **attrs) -> Iterator[Any]:
+    """Record a stage into the active trace, if there is one"""
+    trace = _active.get()
+    if trace is None:
+        yield NULL_SPAN
+        return
+    with trace.span(name, rows_in, **attrs) as recorded:
+        yield recorded
+
+
+def chrome_trace(traces: Iterable[Trace], path: Optional[str] = None) -> Dict[str, Any]:
+    """Chrome trace JSON for several traces, one row (tid) per trace"""
+    events = []
+    for tid, trace in enumerate(traces, 1):
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': trace.name}})
+        events.extend(trace.chrome_events(pid=1, tid=tid))
+    document = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    if path:
+        with open(path, 'w') as f:
+            json.dump(document, f, default=str)
+    return document
+
+
+def summarize(traces: Iterable[Trace]) -> pd.DataFrame:
+    """Per-stage totals across traces: calls, wall time, rows and bytes, slowest total first"""
+    records = [span.to_dict() for trace in traces for span in trace.spans]
+    if not records:
+        return pd.DataFrame(columns=['stage', 'calls', 'total_ms', 'mean_ms', 'p95_ms', 'max_ms', 'rows_in', 'rows_out', 'bytes'])
+    spans = pd.DataFrame(records)
+    grouped = spans.groupby('name', sort=False)
+    summary = pd.DataFrame({
+        'calls': grouped.size(),
+        'total_ms': grouped['duration_ms'].sum(),
+        'mean_ms': grouped['duration_ms'].mean(),
+        'p95_ms': grouped['duration_ms'].quantile(0.95),
+        'max_ms': grouped['duration_ms'].max(),
+        'rows_in': grouped['rows_in'].sum(min_count=1),
+        'rows_out': grouped['rows_out'].sum(min_count=1),
+        'bytes': grouped['bytes'].sum(min_count=1),
+    })
+    return summary.rename_axis('stage').reset_index().sort_values('total_ms', ascending=False, ignore_index=True)